@@ -0,0 +1,539 @@
+#!/usr/bin/env python
+"""
+Single-pass analysis pipeline shared by `tune_analysis.py` and `fueling_analysis.py`.
+
+Running both scripts on the same logs parses every CSV twice, and
+`tune_analysis.analyze_datalog` used to copy the frame for each operating region
+and re-bin it with `pd.cut` per table. Here each log is loaded and
+glitch-filtered once into a `SharedLog`. The channels and derived columns
+(`Boost Error (kPa)`, lambda error, power mode/closed loop) are computed once as
+NumPy arrays, and the fuel-trim, boost, lambda and recommendation stages read
+them through boolean masks without copying the frame. The `fuel_base` stage
+reuses the same filtered frame for `clean_logs`/`bin_logs`/`classify_logs`,
+and both existing reports are written from one process.
+
+`tune_analysis.analyze_datalog` runs the same stages, so its results and
+console output are unchanged.
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data_quality import describe_glitches, reject_glitches
+from fueling_analysis import (
+    FUELING_CHANNELS,
+    RENAMED_COLUMNS,
+    PrepareOptions,
+    apply_fuel_base_modifications,
+    bin_logs,
+    classify_logs,
+    clean_logs,
+    generate_report,
+    load_logs,
+    load_tune,
+    split_loop_rows,
+    summarize_closed_loop,
+    summarize_open_loop,
+)
+from log_cache import DEFAULT_CACHE_DIR, LogCache
+from log_schema import EXACT, INTEGER, merge_channels
+from profiling import DISABLED, Profiler
+from tune_file import TuneFile
+
+
+# Datalog channels read by the tune analysis stages (original CSV headers).
+RPM = "Engine Speed (rpm)"
+LOAD = "Load (MAF) (g/rev)"
+STFT = "Fuel Trim - Short Term (%)"
+LTFT = "Fuel Trim - Long Term (%)"
+MAP = "Manifold Air Pressure - Filtered (kPa)"
+BOOST_TARGET = "Boost Target (kPa)"
+WG_DUTY = "Wastegate Duty Cycle (%)"
+LAMBDA_ACTUAL = "Air/Fuel Sensor #1 (λ)"
+LAMBDA_TARGET = "Power Mode - Fuel Ratio Target (λ)"
+
+# Channels (and their load precision, see log_schema.py) the stages read.
+# Everything feeding a reported mean or bin edge stays float64.
+PIPELINE_CHANNELS = {
+    "Time (s)": EXACT,
+    RPM: INTEGER,
+    LOAD: EXACT,
+    STFT: EXACT,
+    LTFT: EXACT,
+    MAP: EXACT,
+    BOOST_TARGET: EXACT,
+    WG_DUTY: EXACT,
+    LAMBDA_ACTUAL: EXACT,
+    LAMBDA_TARGET: EXACT,
+}
+
+TRIM_RPM_BINS = (0, 2000, 3000, 4000, 5000, 6000, 7000, 8000)
+TRIM_RPM_LABELS = ("0-2k", "2-3k", "3-4k", "4-5k", "5-6k", "6-7k", "7-8k")
+TRIM_LOAD_BINS = (0, 0.5, 1.0, 1.5, 2.0, 2.5, 3.0)
+TRIM_LOAD_LABELS = ("0-0.5", "0.5-1.0", "1.0-1.5", "1.5-2.0", "2.0-2.5", "2.5-3.0")
+BOOST_RPM_BINS = (0, 3000, 4000, 5000, 6000, 7000, 8000)
+
+# Manifold pressure above which a sample is under boost (kPa).
+BOOST_MIN_MAP_KPA = 100
+
+
+@dataclass
+class SharedLog:
+    """
+    Channels and derived columns of the analyzed rows, computed once.
+
+    `channels` holds each channel (keyed by its original CSV header) for the
+    rows with RPM and load above zero; `valid` marks those rows in `frame`.
+    `derived` columns and the operating-region `masks` share that row order.
+    """
+
+    frame: pd.DataFrame
+    valid: np.ndarray
+    channels: Dict[str, np.ndarray]
+    derived: Dict[str, np.ndarray] = field(default_factory=dict)
+    masks: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, names: Optional[Mapping[str, str]] = None) -> "SharedLog":
+        names = names or {}
+
+        def _column(channel: str) -> np.ndarray:
+            return frame[names.get(channel, channel)].to_numpy(dtype=float)
+
+        with np.errstate(invalid="ignore"):
+            valid = (_column(RPM) > 0) & (_column(LOAD) > 0)
+        channels = {
+            channel: _column(channel)[valid]
+            for channel in (RPM, LOAD, STFT, LTFT, MAP, BOOST_TARGET, WG_DUTY, LAMBDA_ACTUAL, LAMBDA_TARGET)
+        }
+        shared = cls(frame, valid, channels)
+        with np.errstate(invalid="ignore"):
+            power_mode = channels[LAMBDA_TARGET] < 1.0
+            shared.masks = {
+                "power_mode": power_mode,
+                "closed_loop": ~power_mode,
+                "boost": channels[MAP] > BOOST_MIN_MAP_KPA,
+            }
+        shared.derived = {
+            "Boost Error (kPa)": channels[MAP] - channels[BOOST_TARGET],
+            "Lambda Error": channels[LAMBDA_ACTUAL] - channels[LAMBDA_TARGET],
+        }
+        return shared
+
+    def rows(self) -> pd.DataFrame:
+        """The analyzed rows of `frame` with the derived columns attached."""
+        return self.frame[self.valid].assign(
+            **self.derived,
+            **{"Power Mode": self.masks["power_mode"], "Closed Loop": self.masks["closed_loop"]},
+        )
+
+
+def _mean(values: np.ndarray) -> float:
+    values = values[~np.isnan(values)]
+    return float(values.mean()) if len(values) else float("nan")
+
+
+def _std(values: np.ndarray) -> float:
+    values = values[~np.isnan(values)]
+    return float(values.std(ddof=1)) if len(values) > 1 else float("nan")
+
+
+def _abs_max(values: np.ndarray) -> float:
+    values = values[~np.isnan(values)]
+    return float(np.abs(values).max()) if len(values) else float("nan")
+
+
+def _interval_codes(values: np.ndarray, bins: Sequence[float]) -> np.ndarray:
+    """`pd.cut` bin codes for right-closed intervals; -1 outside the bins or NaN."""
+    codes = np.searchsorted(np.asarray(bins, dtype=float), values, side="left") - 1
+    codes[(codes < 0) | (codes >= len(bins) - 1) | np.isnan(values)] = -1
+    return codes
+
+
+def _group_means(codes: np.ndarray, values: np.ndarray, groups: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-group mean and non-NaN count of `values` (rows with code -1 are ignored).
+
+    Grouped on the bare arrays with pandas, whose compensated summation keeps
+    the means (and their 2-decimal rounding) identical to a DataFrame groupby.
+    """
+    keep = codes >= 0
+    grouped = pd.Series(values[keep]).groupby(codes[keep])
+    means = grouped.mean().reindex(range(groups)).to_numpy(dtype=float)
+    counts = grouped.count().reindex(range(groups), fill_value=0).to_numpy(dtype=np.int64)
+    return means, counts
+
+
+def fuel_trim_stage(shared: SharedLog, results: Dict[str, Any]) -> None:
+    """Overall trim statistics and RPM/load regions with significant trimming."""
+    print("\n=== FUEL TRIM ANALYSIS ===")
+    stft = shared.channels[STFT]
+    ltft = shared.channels[LTFT]
+    overall = {
+        "stft_mean": _mean(stft),
+        "stft_std": _std(stft),
+        "stft_max": _abs_max(stft),
+        "ltft_mean": _mean(ltft),
+        "ltft_std": _std(ltft),
+        "ltft_max": _abs_max(ltft),
+    }
+    results["fuel_trim_analysis"]["overall"] = overall
+    print(f"STFT: Mean={overall['stft_mean']:.2f}%, Std={overall['stft_std']:.2f}%, Max Abs={overall['stft_max']:.2f}%")
+    print(f"LTFT: Mean={overall['ltft_mean']:.2f}%, Std={overall['ltft_std']:.2f}%, Max Abs={overall['ltft_max']:.2f}%")
+
+    # Regions with significant trimming (>5% STFT or >3% LTFT), in bin order.
+    rpm_codes = _interval_codes(shared.channels[RPM], TRIM_RPM_BINS)
+    load_codes = _interval_codes(shared.channels[LOAD], TRIM_LOAD_BINS)
+    n_load = len(TRIM_LOAD_LABELS)
+    groups = len(TRIM_RPM_LABELS) * n_load
+    cells = np.where((rpm_codes >= 0) & (load_codes >= 0), rpm_codes * n_load + load_codes, -1)
+    observed = np.bincount(cells[cells >= 0], minlength=groups) > 0
+    stft_mean, stft_count = _group_means(cells, stft, groups)
+    ltft_mean, _ = _group_means(cells, ltft, groups)
+    load_mean, _ = _group_means(cells, shared.channels[LOAD], groups)
+    rpm_mean, _ = _group_means(cells, shared.channels[RPM], groups)
+    stft_mean, ltft_mean = np.round(stft_mean, 2), np.round(ltft_mean, 2)
+    load_mean, rpm_mean = np.round(load_mean, 2), np.round(rpm_mean, 2)
+
+    with np.errstate(invalid="ignore"):
+        significant = (np.abs(stft_mean) > 5) | (np.abs(ltft_mean) > 3)
+    problematic_regions = [
+        {
+            "rpm_bin": TRIM_RPM_LABELS[cell // n_load],
+            "load_bin": TRIM_LOAD_LABELS[cell % n_load],
+            "stft_mean": float(stft_mean[cell]),
+            "ltft_mean": float(ltft_mean[cell]),
+            "sample_count": int(stft_count[cell]),
+            "avg_rpm": float(rpm_mean[cell]),
+            "avg_load": float(load_mean[cell]),
+        }
+        for cell in np.flatnonzero(observed & (stft_count > 50) & significant)
+    ]
+    results["fuel_trim_analysis"]["problematic_regions"] = problematic_regions
+
+    print(f"\nFound {len(problematic_regions)} regions with significant fuel trimming:")
+    for region in problematic_regions[:10]:
+        print(f"  {region['rpm_bin']} RPM, {region['load_bin']} Load: STFT={region['stft_mean']:.1f}%, LTFT={region['ltft_mean']:.1f}% (n={region['sample_count']})")
+
+
+def boost_stage(shared: SharedLog, results: Dict[str, Any]) -> None:
+    """Boost error statistics, by RPM range under boost, and wastegate duty."""
+    print("\n=== BOOST CONTROL ANALYSIS ===")
+    error = shared.derived["Boost Error (kPa)"]
+    overall = {
+        "boost_error_mean": _mean(error),
+        "boost_error_std": _std(error),
+        "boost_error_max": _abs_max(error),
+    }
+    analysis = results["boost_control_analysis"]
+    analysis["overall"] = overall
+    print(f"Boost Error: Mean={overall['boost_error_mean']:.2f}kPa, Std={overall['boost_error_std']:.2f}kPa, Max Abs={overall['boost_error_max']:.2f}kPa")
+
+    boost = shared.masks["boost"]
+    samples = int(boost.sum())
+    if not samples:
+        return
+    print(f"\nBoost regions (MAP > 100kPa): {samples} samples")
+
+    boost_error = error[boost]
+    wg_duty = shared.channels[WG_DUTY][boost]
+    codes = _interval_codes(shared.channels[RPM][boost], BOOST_RPM_BINS)
+    groups = len(BOOST_RPM_BINS) - 1
+    observed = np.bincount(codes[codes >= 0], minlength=groups) > 0
+    error_mean, error_count = _group_means(codes, boost_error, groups)
+    duty_mean, _ = _group_means(codes, wg_duty, groups)
+    print("\nBoost Error by RPM Range:")
+    for group in np.flatnonzero(observed):
+        interval = f"({BOOST_RPM_BINS[group]}, {BOOST_RPM_BINS[group + 1]}]"
+        print(f"  {interval}: Error={np.round(error_mean[group], 2):.2f}kPa, WG Duty={np.round(duty_mean[group], 2):.1f}%, Samples={int(error_count[group])}")
+
+    with np.errstate(invalid="ignore"):
+        overboost = int((boost_error > 5).sum())
+        underboost = int((boost_error < -5).sum())
+    analysis["overboost_samples"] = overboost
+    analysis["underboost_samples"] = underboost
+    print(f"\nOverboost (>5kPa error): {overboost} samples ({100*overboost/samples:.1f}%)")
+    print(f"Underboost (<-5kPa error): {underboost} samples ({100*underboost/samples:.1f}%)")
+
+    wastegate = {
+        "duty_mean": _mean(wg_duty),
+        "duty_max": float(np.nanmax(wg_duty)),
+        "duty_min": float(np.nanmin(wg_duty)),
+    }
+    analysis["wastegate"] = wastegate
+    print(f"\nWastegate Duty: Mean={wastegate['duty_mean']:.1f}%, Min={wastegate['duty_min']:.1f}%, Max={wastegate['duty_max']:.1f}%")
+
+
+def lambda_stage(shared: SharedLog, results: Dict[str, Any]) -> None:
+    """Lambda error in power mode and lambda spread in closed loop."""
+    print("\n=== LAMBDA ANALYSIS ===")
+    power_mode = shared.masks["power_mode"]
+    if power_mode.any():
+        error = shared.derived["Lambda Error"][power_mode]
+        stats = {
+            "lambda_error_mean": _mean(error),
+            "lambda_error_std": _std(error),
+            "lambda_error_max": _abs_max(error),
+            "samples": int(power_mode.sum()),
+        }
+        results["lambda_analysis"]["power_mode"] = stats
+        print(f"Power Mode Lambda Error: Mean={stats['lambda_error_mean']:.3f}, Std={stats['lambda_error_std']:.3f}, Max Abs={stats['lambda_error_max']:.3f}")
+        print(f"Power Mode Samples: {stats['samples']}")
+
+    closed_loop = shared.masks["closed_loop"]
+    if closed_loop.any():
+        lambda_actual = shared.channels[LAMBDA_ACTUAL][closed_loop]
+        stats = {
+            "lambda_mean": _mean(lambda_actual),
+            "lambda_std": _std(lambda_actual),
+            "samples": int(closed_loop.sum()),
+        }
+        results["lambda_analysis"]["closed_loop"] = stats
+        print(f"Closed Loop Lambda: Mean={stats['lambda_mean']:.3f}, Std={stats['lambda_std']:.3f}")
+        print(f"Closed Loop Samples: {stats['samples']}")
+
+
+def recommendation_stage(shared: SharedLog, results: Dict[str, Any]) -> None:
+    """Turn the fuel trim, boost and lambda results into prioritized recommendations."""
+    print("\n=== GENERATING RECOMMENDATIONS ===")
+    fuel_trim = results["fuel_trim_analysis"]
+    overall = fuel_trim["overall"]
+    boost = results["boost_control_analysis"]
+    recommendations: List[Dict[str, str]] = []
+
+    # Fuel trim recommendations
+    if abs(overall["ltft_mean"]) > 2:
+        recommendations.append({
+            'category': 'Fuel Trim',
+            'priority': 'High',
+            'issue': f'Long-term fuel trim is {overall["ltft_mean"]:.1f}%, indicating systematic fueling error',
+            'recommendation': 'Adjust fuel_base table in problematic regions to reduce LTFT toward 0%'
+        })
+
+    if overall["stft_std"] > 3:
+        recommendations.append({
+            'category': 'Fuel Trim',
+            'priority': 'Medium',
+            'issue': f'Short-term fuel trim has high variability (std={overall["stft_std"]:.1f}%)',
+            'recommendation': 'Review fuel_base table for smoothness and consistency'
+        })
+
+    for region in fuel_trim["problematic_regions"][:5]:
+        recommendations.append({
+            'category': 'Fuel Trim',
+            'priority': 'High',
+            'issue': f'High fuel trimming at {region["avg_rpm"]:.0f} RPM, {region["avg_load"]:.2f} g/rev: STFT={region["stft_mean"]:.1f}%, LTFT={region["ltft_mean"]:.1f}%',
+            'recommendation': f'Adjust fuel_base table at {region["avg_rpm"]:.0f} RPM, {region["avg_load"]:.2f} g/rev by approximately {-(region["stft_mean"] + region["ltft_mean"]):.1f}%'
+        })
+
+    # Boost control recommendations (only when there were samples under boost)
+    total = int(shared.masks["boost"].sum())
+    if total:
+        if boost["overall"]["boost_error_std"] > 3:
+            recommendations.append({
+                'category': 'Boost Control',
+                'priority': 'High',
+                'issue': f'Boost control has high variability (std={boost["overall"]["boost_error_std"]:.2f}kPa)',
+                'recommendation': 'Review wastegate control parameters (wg_overboost_step, wg_underboost_step) and boost_target table'
+            })
+
+        if boost["overboost_samples"] > total * 0.1:  # More than 10% overboost
+            recommendations.append({
+                'category': 'Boost Control',
+                'priority': 'High',
+                'issue': f'Frequent overboost events ({100*boost["overboost_samples"]/total:.1f}% of boost samples)',
+                'recommendation': 'Increase wg_overboost_step values or reduce boost_target in affected regions'
+            })
+
+        if boost["underboost_samples"] > total * 0.1:  # More than 10% underboost
+            recommendations.append({
+                'category': 'Boost Control',
+                'priority': 'High',
+                'issue': f'Frequent underboost events ({100*boost["underboost_samples"]/total:.1f}% of boost samples)',
+                'recommendation': 'Increase wg_underboost_step values or adjust wg_base table to increase wastegate duty'
+            })
+
+        if boost["wastegate"]["duty_max"] > 90:
+            recommendations.append({
+                'category': 'Boost Control',
+                'priority': 'Medium',
+                'issue': f'Wastegate duty cycle reaching maximum ({boost["wastegate"]["duty_max"]:.1f}%)',
+                'recommendation': 'Review wg_max table - may need higher limits or mechanical wastegate adjustment'
+            })
+
+    # Lambda recommendations
+    power_mode = results["lambda_analysis"].get("power_mode")
+    if power_mode and abs(power_mode["lambda_error_mean"]) > 0.02:
+        recommendations.append({
+            'category': 'Lambda Control',
+            'priority': 'High',
+            'issue': f'Power mode lambda error: {power_mode["lambda_error_mean"]:.3f} (target vs actual)',
+            'recommendation': 'Adjust pe_initial and pe_safe tables to better match actual lambda'
+        })
+
+    results["recommendations"] = recommendations
+
+
+def run_datalog_stages(shared: SharedLog, profiler: Profiler = DISABLED) -> Dict[str, Any]:
+    """Run the fuel trim, boost, lambda and recommendation stages (the `tune_analysis` results)."""
+    results: Dict[str, Any] = {
+        "fuel_trim_analysis": {},
+        "boost_control_analysis": {},
+        "lambda_analysis": {},
+        "recommendations": [],
+    }
+    rows = int(shared.valid.sum())
+    for name, stage in (
+        ("fuel_trim", fuel_trim_stage),
+        ("boost", boost_stage),
+        ("lambda", lambda_stage),
+        ("recommendations", recommendation_stage),
+    ):
+        with profiler.stage(name, rows):
+            stage(shared, results)
+    return results
+
+
+def fuel_base_stage(
+    frame: pd.DataFrame,
+    tune_file: TuneFile,
+    min_samples: int,
+    options: PrepareOptions,
+    fast_quantiles: bool = False,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Open/closed-loop `fuel_base` summaries of an already glitch-filtered frame."""
+    tune = load_tune(tune_file)
+    cleaned, _ = clean_logs(frame, replace(options, reject_glitches=False))
+    logs = classify_logs(bin_logs(cleaned, tune), tune)
+    open_rows, closed_rows = split_loop_rows(logs)
+    return (
+        summarize_open_loop(open_rows, tune, min_samples, fast_quantiles=fast_quantiles),
+        summarize_closed_loop(closed_rows, tune, min_samples, fast_quantiles=fast_quantiles),
+    )
+
+
+def run_pipeline(
+    log_paths: List[Path],
+    tune_file: TuneFile,
+    min_samples: int = 5,
+    options: Optional[PrepareOptions] = None,
+    fast_quantiles: bool = False,
+    cache: Optional[LogCache] = None,
+) -> Tuple[Dict[str, Any], pd.DataFrame, pd.DataFrame]:
+    """
+    Load and glitch-filter the logs once, then run every stage on them.
+
+    Returns the `tune_analysis` results and the open/closed-loop `fuel_base`
+    summaries.
+    """
+    options = options or PrepareOptions()
+    frame = load_logs(log_paths, cache, merge_channels(FUELING_CHANNELS, PIPELINE_CHANNELS))
+    if options.reject_glitches:
+        frame, glitches = reject_glitches(frame, names=RENAMED_COLUMNS)
+        print(describe_glitches(glitches, len(frame)))
+
+    results = run_datalog_stages(SharedLog.from_frame(frame, RENAMED_COLUMNS))
+    open_summary, closed_summary = fuel_base_stage(frame, tune_file, min_samples, options, fast_quantiles)
+    return results, open_summary, closed_summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Produce the tune analysis and fueling reports from one pass over the datalogs. "
+            "See ECU_TUNE_FILE_MODEL.md for map structure details."
+        )
+    )
+    parser.add_argument("--tune", type=Path, required=True, help="Path to the JSON-formatted tune file.")
+    parser.add_argument("--logs", type=Path, nargs="+", required=True, help="One or more CSV datalog files to analyze.")
+    parser.add_argument(
+        "--analysis-report",
+        type=Path,
+        default=Path("tune_analysis_report.md"),
+        help="Path for the tune analysis report (default: tune_analysis_report.md).",
+    )
+    parser.add_argument("--output", type=Path, help="Optional path to save the Markdown fueling summary.")
+    parser.add_argument(
+        "--output-tune",
+        type=Path,
+        help="Optional path to save a modified tune file with updated fuel_base values.",
+    )
+    parser.add_argument(
+        "--modify-tune",
+        type=Path,
+        help="Optional tune file to modify. If not specified, uses --tune file as the source for modifications.",
+    )
+    parser.add_argument(
+        "--min-samples",
+        type=int,
+        default=5,
+        help="Minimum hits per cell before suggesting a change (default: 5).",
+    )
+    parser.add_argument(
+        "--change-limit",
+        type=float,
+        default=5.0,
+        help="Maximum percentage change allowed per cell (default: 5.0%%).",
+    )
+    parser.add_argument(
+        "--fast-quantiles",
+        action="store_true",
+        help="Estimate per-cell median/p95 from histogram sketches instead of exact percentiles.",
+    )
+    parser.add_argument(
+        "--no-glitch-filter",
+        action="store_true",
+        help="Keep sensor glitches (spikes, flatlines, out-of-range values) instead of masking them.",
+    )
+    parser.add_argument(
+        "--log-cache",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory for the parsed-datalog cache (default: {DEFAULT_CACHE_DIR}).",
+    )
+    parser.add_argument(
+        "--no-log-cache",
+        action="store_true",
+        help="Always parse datalog CSVs instead of using the parsed-datalog cache.",
+    )
+
+    args = parser.parse_args()
+
+    # Imported here: tune_analysis runs its stages from this module.
+    from tune_analysis import generate_report as generate_analysis_report
+
+    tune_file = TuneFile.load(args.tune)
+    cache = None if args.no_log_cache else LogCache(args.log_cache, RENAMED_COLUMNS)
+    results, open_summary, closed_summary = run_pipeline(
+        args.logs,
+        tune_file,
+        args.min_samples,
+        PrepareOptions(reject_glitches=not args.no_glitch_filter),
+        args.fast_quantiles,
+        cache,
+    )
+
+    args.analysis_report.parent.mkdir(parents=True, exist_ok=True)
+    generate_analysis_report(results, tune_file, args.analysis_report)
+    generate_report(open_summary, closed_summary, args.output)
+    if args.output_tune:
+        apply_fuel_base_modifications(
+            args.tune,
+            open_summary,
+            closed_summary,
+            args.output_tune,
+            change_limit_pct=args.change_limit,
+            modify_tune_path=args.modify_tune,
+            source_tune=tune_file,
+        )
+
+
+if __name__ == "__main__":
+    main()
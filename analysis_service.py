@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+"""
+Local HTTP/JSON analysis service with warm tune and log caches.
+
+Every CLI run pays the Python/pandas import cost and reparses the tune JSON and
+the datalog CSVs. This service stays resident and keeps parsed tunes, cleaned
+logs, logs binned per `fuel_base` axis set and finished summaries in LRU
+caches, so tooling can issue many what-if queries (different tunes,
+`min_samples`, options) against the same logs with only the tune-specific work
+repeated. Cache keys include file size and mtime, so edited files are reloaded.
+
+Endpoints (JSON bodies; paths are resolved on the server):
+
+- `GET  /health`: cache sizes and hit counts.
+- `POST /load_tune` `{"tune"}`: parse and cache a tune, return its fuel_base axes.
+- `POST /ingest_logs` `{"logs", options...}`: parse, clean and cache logs.
+- `POST /summarize` `{"tune", "logs", "min_samples", "fast_quantiles", options...}`:
+  open/closed-loop per-cell summaries as records.
+- `POST /apply_modifications` `{"tune", "logs", "output_tune", "change_limit",
+  "modify_tune", "min_samples", options...}`: write a modified tune.
+- `POST /clear_cache`: drop every cached tune and log.
+
+Options are the `PrepareOptions` fields (`align_lambda`, `max_lambda_lag`,
+`lag_rpm_bands`, `resample_period_s`, `dwell_weighting`, `interpolate_cells`,
+`reject_glitches`). Missing or mistyped fields get a 400 reply with a JSON error.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import astuple, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import pandas as pd
+
+from fueling_analysis import (
+    RENAMED_COLUMNS,
+    PrepareOptions,
+    TuneFuelBase,
+    apply_fuel_base_modifications,
+    bin_logs,
+    classify_logs,
+    clean_logs,
+    load_logs,
+    load_tune,
+    split_loop_rows,
+    spread_bilinear,
+    summarize_closed_loop,
+    summarize_open_loop,
+)
+from fueling_batch import axis_signature
+from log_cache import DEFAULT_CACHE_DIR, LogCache
+from tune_file import TuneFile
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_TUNE_CACHE_SIZE = 16
+DEFAULT_LOG_CACHE_SIZE = 8
+
+ENDPOINTS = frozenset(
+    {"/health", "/clear_cache", "/load_tune", "/ingest_logs", "/summarize", "/apply_modifications"}
+)
+
+
+class LruCache:
+    """Thread-safe least-recently-used cache with hit/miss counters."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+        value = factory()
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self), "hits": self.hits, "misses": self.misses}
+
+
+def _file_stamp(path: Path) -> Tuple[str, int, int]:
+    """Cache key component that changes whenever the file is rewritten."""
+    stat = path.stat()
+    return str(path.resolve()), stat.st_size, stat.st_mtime_ns
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _options_from(payload: Dict[str, Any]) -> PrepareOptions:
+    """Build `PrepareOptions` from a request body, rejecting mistyped fields with ValueError."""
+    names = {option.name for option in fields(PrepareOptions)}
+    values = {key: value for key, value in payload.items() if key in names}
+    for name, value in values.items():
+        if name == "max_lambda_lag":
+            valid = isinstance(value, int) and not isinstance(value, bool)
+        elif name == "lag_rpm_bands":
+            valid = value is None or (isinstance(value, list) and all(_is_number(band) for band in value))
+        elif name == "resample_period_s":
+            valid = value is None or _is_number(value)
+        else:
+            valid = isinstance(value, bool)
+        if not valid:
+            raise ValueError(f"Invalid value for option '{name}': {value!r}")
+    if values.get("lag_rpm_bands") is not None:
+        values["lag_rpm_bands"] = tuple(values["lag_rpm_bands"])
+    return PrepareOptions(**values)
+
+
+def _records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    return json.loads(df.to_json(orient="records")) if not df.empty else []
+
+
+class AnalysisService:
+    """Cached analysis operations behind the HTTP endpoints."""
+
+    def __init__(
+        self,
+        tune_cache_size: int = DEFAULT_TUNE_CACHE_SIZE,
+        log_cache_size: int = DEFAULT_LOG_CACHE_SIZE,
+        log_cache: Optional[LogCache] = None,
+    ) -> None:
+        self.tunes = LruCache(tune_cache_size)
+        self.logs = LruCache(log_cache_size)
+        self.binned = LruCache(log_cache_size * 2)
+        self.summaries = LruCache(tune_cache_size * 4)
+        self.log_cache = log_cache
+
+    def tune(self, path: Path) -> Tuple[TuneFile, TuneFuelBase]:
+        def _load() -> Tuple[TuneFile, TuneFuelBase]:
+            tune_file = TuneFile.load(path)
+            return tune_file, load_tune(tune_file)
+
+        return self.tunes.get_or_create(_file_stamp(path), _load)
+
+    def _log_key(self, paths: List[Path], options: PrepareOptions) -> Tuple:
+        return tuple(_file_stamp(path) for path in paths), astuple(options)
+
+    def cleaned_logs(self, paths: List[Path], options: PrepareOptions) -> pd.DataFrame:
+        return self.logs.get_or_create(
+            self._log_key(paths, options),
+            lambda: clean_logs(load_logs(paths, self.log_cache), options)[0],
+        )
+
+    def binned_logs(
+        self, paths: List[Path], options: PrepareOptions, tune: TuneFuelBase
+    ) -> pd.DataFrame:
+        return self.binned.get_or_create(
+            (self._log_key(paths, options), axis_signature(tune)),
+            lambda: bin_logs(self.cleaned_logs(paths, options), tune),
+        )
+
+    def summarize(
+        self,
+        tune_path: Path,
+        log_paths: List[Path],
+        min_samples: int = 5,
+        fast_quantiles: bool = False,
+        options: Optional[PrepareOptions] = None,
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        options = options or PrepareOptions()
+        _, tune = self.tune(tune_path)
+
+        def _summarize() -> Tuple[pd.DataFrame, pd.DataFrame]:
+            rows = classify_logs(self.binned_logs(log_paths, options, tune), tune)
+            open_rows, closed_rows = split_loop_rows(rows)
+            if options.interpolate_cells:
+                open_rows = spread_bilinear(open_rows, tune)
+                closed_rows = spread_bilinear(closed_rows, tune)
+            return (
+                summarize_open_loop(open_rows, tune, min_samples, fast_quantiles=fast_quantiles),
+                summarize_closed_loop(
+                    closed_rows, tune, min_samples, fast_quantiles=fast_quantiles
+                ),
+            )
+
+        key = (
+            _file_stamp(tune_path),
+            self._log_key(log_paths, options),
+            min_samples,
+            fast_quantiles,
+        )
+        return self.summaries.get_or_create(key, _summarize)
+
+    def handle(self, endpoint: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Dispatch one request; missing payload fields raise KeyError."""
+        if endpoint not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{endpoint}'.")
+        if endpoint == "/health":
+            return {
+                "status": "ok",
+                "tunes": self.tunes.stats(),
+                "logs": self.logs.stats(),
+                "binned": self.binned.stats(),
+                "summaries": self.summaries.stats(),
+            }
+        if endpoint == "/clear_cache":
+            for cache in (self.tunes, self.logs, self.binned, self.summaries):
+                cache.clear()
+            return {"status": "ok"}
+
+        options = _options_from(payload)
+        if endpoint == "/load_tune":
+            tune_file, tune = self.tune(Path(payload["tune"]))
+            return {
+                "name": tune_file.name,
+                "maps": len(tune_file),
+                "rpm_axis": tune.rpm_axis.tolist(),
+                "load_axis": tune.load_axis.tolist(),
+            }
+
+        log_paths = [Path(path) for path in payload["logs"]]
+        if endpoint == "/ingest_logs":
+            logs = self.cleaned_logs(log_paths, options)
+            return {"rows": len(logs), "files": [path.name for path in log_paths]}
+
+        min_samples = int(payload.get("min_samples", 5))
+        open_summary, closed_summary = self.summarize(
+            Path(payload["tune"]),
+            log_paths,
+            min_samples,
+            bool(payload.get("fast_quantiles", False)),
+            options,
+        )
+        if endpoint == "/summarize":
+            return {"open": _records(open_summary), "closed": _records(closed_summary)}
+
+        tune_path = Path(payload["tune"])
+        output_tune = Path(payload["output_tune"])
+        modify_tune = payload.get("modify_tune")
+        update = apply_fuel_base_modifications(
+            tune_path,
+            open_summary,
+            closed_summary,
+            output_tune,
+            change_limit_pct=float(payload.get("change_limit", 5.0)),
+            modify_tune_path=Path(modify_tune) if modify_tune else None,
+            source_tune=self.tune(tune_path)[0],
+        )
+        return {
+            "output_tune": str(output_tune),
+            "modifications": update.requested,
+        }
+
+
+def make_handler(service: AnalysisService) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, body: Dict[str, Any]) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _dispatch(self, payload: Dict[str, Any]) -> None:
+            if self.path not in ENDPOINTS:
+                self._reply(404, {"error": f"Unknown endpoint '{self.path}'."})
+                return
+            try:
+                self._reply(200, service.handle(self.path, payload))
+            except KeyError as exc:
+                self._reply(400, {"error": f"Missing field or map: {exc}"})
+            except (TypeError, ValueError, OSError) as exc:
+                self._reply(400, {"error": str(exc)})
+
+        def do_GET(self) -> None:
+            self._dispatch({})
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError as exc:
+                self._reply(400, {"error": f"Invalid JSON body: {exc}"})
+                return
+            if not isinstance(payload, dict):
+                self._reply(400, {"error": "JSON body must be an object."})
+                return
+            self._dispatch(payload)
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Serve fueling analysis over local HTTP/JSON with warm tune and log caches."
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Bind address (default: {DEFAULT_HOST}).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT}).")
+    parser.add_argument(
+        "--tune-cache-size",
+        type=int,
+        default=DEFAULT_TUNE_CACHE_SIZE,
+        help=f"Parsed tunes kept in memory (default: {DEFAULT_TUNE_CACHE_SIZE}).",
+    )
+    parser.add_argument(
+        "--log-cache-size",
+        type=int,
+        default=DEFAULT_LOG_CACHE_SIZE,
+        help=f"Cleaned log sets kept in memory (default: {DEFAULT_LOG_CACHE_SIZE}).",
+    )
+    parser.add_argument(
+        "--log-cache",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory for the on-disk parsed-datalog cache (default: {DEFAULT_CACHE_DIR}).",
+    )
+    parser.add_argument(
+        "--no-log-cache",
+        action="store_true",
+        help="Always parse datalog CSVs instead of using the on-disk cache.",
+    )
+
+    args = parser.parse_args()
+
+    service = AnalysisService(
+        args.tune_cache_size,
+        args.log_cache_size,
+        None if args.no_log_cache else LogCache(args.log_cache, RENAMED_COLUMNS),
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Analysis service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
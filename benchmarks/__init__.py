@@ -0,0 +1 @@
+"""Benchmarks for the datalog analysis stages (run from the repository root)."""
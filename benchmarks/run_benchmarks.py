@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+"""
+Time and memory benchmarks for the fueling analysis stages.
+
+For each requested log size a synthetic log and tune are generated (see
+`benchmarks/synthetic_logs.py`; files are reused from `--workdir` on later
+runs) and these stages run in order on them:
+
+    load_logs -> clean_logs -> bin_logs -> classify_loop_state ->
+    split_loop_rows -> summarize_open_loop / summarize_closed_loop ->
+    apply_fuel_base_modifications
+
+Each stage is timed `--repeat` times on the same input (best and median wall
+time are kept). A separate pass under `tracemalloc` records the peak memory
+each stage allocates on top of what was live when it started, so timing is
+not slowed by tracing. Results, with the Python/NumPy/pandas versions and
+git revision, are written as JSON; `--compare` prints the time ratios against
+an earlier result file.
+
+    python -m benchmarks.run_benchmarks --rows 10000 100000 1000000 --output benchmarks/results/run.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_logs import DEFAULT_PE_FRACTION, derive_tune, write_synthetic_log
+from fueling_analysis import (
+    apply_fuel_base_modifications,
+    bin_logs,
+    classify_loop_state,
+    clean_logs,
+    load_logs,
+    load_tune,
+    split_loop_rows,
+    summarize_closed_loop,
+    summarize_open_loop,
+)
+from tune_file import TuneFile
+from tune_writer import MapUpdate
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+DEFAULT_ROWS = (10_000, 100_000, 1_000_000)
+
+DEFAULT_WORKDIR = Path("benchmarks") / "data"
+
+# Stage timings slower than this ratio against --compare are flagged.
+REGRESSION_RATIO = 1.2
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).resolve().parent,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    return int(peak if sys.platform == "darwin" else peak * 1024)
+
+
+def _row_count(result: Any) -> int:
+    if isinstance(result, MapUpdate):
+        return result.requested
+    if isinstance(result, tuple):
+        return sum(_row_count(item) for item in result)
+    return len(result) if result is not None else 0
+
+
+def prepare_inputs(
+    workdir: Path, rows: int, pe_fraction: float, seed: int
+) -> Tuple[Path, Path]:
+    """Synthetic log and derived tune for one size, generated on first use."""
+    log_path = workdir / f"synthetic_{rows}_pe{pe_fraction:g}_s{seed}.csv"
+    tune_path = workdir / f"AF041_synthetic_s{seed}.tune"
+    if not log_path.exists():
+        print(f"Generating {log_path} ...")
+        partial = log_path.with_suffix(".partial")
+        write_synthetic_log(partial, rows, pe_fraction, seed)
+        partial.replace(log_path)
+    if not tune_path.exists():
+        derive_tune(seed).save(tune_path)
+    return log_path, tune_path
+
+
+def stage_plan(
+    log_path: Path, tune_path: Path, output_tune: Path, min_samples: int, fast_quantiles: bool
+) -> List[Tuple[str, Callable[[Dict[str, Any]], Any]]]:
+    """
+    Ordered (name, function) stages; each function reads its inputs from and
+    stores its result in a shared dict so the stages can be re-run in isolation.
+    """
+    tune_file = TuneFile.load(tune_path)
+    tune = load_tune(tune_file)
+
+    def _classify(state: Dict[str, Any]) -> Any:
+        return classify_loop_state(state["bin_logs"], tune)
+
+    def _split(state: Dict[str, Any]) -> Any:
+        binned = state["bin_logs"].assign(loop_state=state["classify_loop_state"])
+        return split_loop_rows(binned)
+
+    def _write_tune(state: Dict[str, Any]) -> Any:
+        output_tune.unlink(missing_ok=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return apply_fuel_base_modifications(
+                tune_path,
+                state["summarize_open_loop"],
+                state["summarize_closed_loop"],
+                output_tune,
+                source_tune=tune_file,
+            )
+
+    return [
+        ("load_logs", lambda state: load_logs([log_path])),
+        ("clean_logs", lambda state: clean_logs(state["load_logs"])[0]),
+        ("bin_logs", lambda state: bin_logs(state["clean_logs"], tune)),
+        ("classify_loop_state", _classify),
+        ("split_loop_rows", _split),
+        (
+            "summarize_open_loop",
+            lambda state: summarize_open_loop(
+                state["split_loop_rows"][0], tune, min_samples, fast_quantiles=fast_quantiles
+            ),
+        ),
+        (
+            "summarize_closed_loop",
+            lambda state: summarize_closed_loop(
+                state["split_loop_rows"][1], tune, min_samples, fast_quantiles=fast_quantiles
+            ),
+        ),
+        ("apply_fuel_base_modifications", _write_tune),
+    ]
+
+
+def run_size(
+    log_path: Path,
+    tune_path: Path,
+    output_tune: Path,
+    repeat: int,
+    min_samples: int,
+    fast_quantiles: bool,
+    trace_memory: bool,
+) -> Dict[str, Dict[str, Any]]:
+    """Benchmark every stage on one log; returns per-stage results."""
+    plan = stage_plan(log_path, tune_path, output_tune, min_samples, fast_quantiles)
+    state: Dict[str, Any] = {}
+    stages: Dict[str, Dict[str, Any]] = {}
+    for name, function in plan:
+        # The stage's inputs come from the previous stages, so each stage
+        # runs `repeat` times before the next one starts.
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function(state)
+            timings.append(time.perf_counter() - start)
+        state[name] = result
+        stages[name] = {
+            "best_s": min(timings),
+            "median_s": statistics.median(timings),
+            "rows_out": _row_count(result),
+        }
+
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            for name, function in plan:
+                baseline = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                function(state)
+                stages[name]["peak_bytes"] = tracemalloc.get_traced_memory()[1] - baseline
+        finally:
+            tracemalloc.stop()
+    return stages
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Per-stage best-time ratios (current / baseline) for sizes present in both."""
+    baseline_runs = {run["rows"]: run for run in baseline.get("runs", [])}
+    lines = [f"Compared with {baseline.get('git_revision') or 'baseline'} ({baseline.get('created', '?')}):"]
+    for key in ("pe_fraction", "seed", "fast_quantiles"):
+        if baseline.get(key) != current.get(key):
+            lines.append(f"  note: {key} differs ({baseline.get(key)} -> {current.get(key)}); inputs are not the same.")
+    for run in current["runs"]:
+        previous = baseline_runs.get(run["rows"])
+        if previous is None:
+            continue
+        lines.append(f"  {run['rows']} rows:")
+        for name, stage in run["stages"].items():
+            old = previous["stages"].get(name)
+            if not old or not old["best_s"]:
+                continue
+            ratio = stage["best_s"] / old["best_s"]
+            flag = "  <-- slower" if ratio > REGRESSION_RATIO else ""
+            lines.append(f"    {name:<30} {old['best_s']:9.4f}s -> {stage['best_s']:9.4f}s  x{ratio:5.2f}{flag}")
+    return lines
+
+
+def format_results(results: Dict[str, Any]) -> str:
+    lines = []
+    for run in results["runs"]:
+        lines.append(f"\n{run['rows']} rows ({run['log']}):")
+        lines.append(f"  {'stage':<30} {'best (s)':>10} {'median (s)':>11} {'rows out':>10} {'peak MB':>9}")
+        for name, stage in run["stages"].items():
+            peak = stage.get("peak_bytes")
+            peak_text = f"{peak / 1e6:9.1f}" if peak is not None else f"{'-':>9}"
+            lines.append(
+                f"  {name:<30} {stage['best_s']:10.4f} {stage['median_s']:11.4f} "
+                f"{stage['rows_out']:10d} {peak_text}"
+            )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the fueling analysis stages on synthetic datalogs and write the results as JSON."
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_ROWS),
+        help="Log sizes to benchmark, 10k to 50M rows (default: 10000 100000 1000000).",
+    )
+    parser.add_argument(
+        "--pe-fraction",
+        type=float,
+        default=DEFAULT_PE_FRACTION,
+        help=f"Share of samples in power-enrichment pulls (default: {DEFAULT_PE_FRACTION}).",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic logs and tune (default: 0).")
+    parser.add_argument(
+        "--workdir",
+        type=Path,
+        default=DEFAULT_WORKDIR,
+        help=f"Directory for the generated logs and tunes, reused between runs (default: {DEFAULT_WORKDIR}).",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage (default: 3).")
+    parser.add_argument("--min-samples", type=int, default=5, help="Minimum samples per cell (default: 5).")
+    parser.add_argument(
+        "--fast-quantiles",
+        action="store_true",
+        help="Benchmark the summaries with per-cell quantile sketches.",
+    )
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="Skip the tracemalloc pass that records peak memory per stage.",
+    )
+    parser.add_argument("--output", type=Path, help="Path to write the JSON results.")
+    parser.add_argument("--compare", type=Path, help="Earlier JSON results to compare stage times against.")
+    args = parser.parse_args()
+
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1.")
+
+    results: Dict[str, Any] = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "pe_fraction": args.pe_fraction,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "fast_quantiles": args.fast_quantiles,
+        "runs": [],
+    }
+    for rows in args.rows:
+        log_path, tune_path = prepare_inputs(args.workdir, rows, args.pe_fraction, args.seed)
+        print(f"Benchmarking {rows} rows ...")
+        stages = run_size(
+            log_path,
+            tune_path,
+            args.workdir / "benchmark_output.tune",
+            args.repeat,
+            args.min_samples,
+            args.fast_quantiles,
+            trace_memory=not args.no_memory,
+        )
+        results["runs"].append({"rows": rows, "log": str(log_path), "tune": str(tune_path), "stages": stages})
+    results["peak_rss_bytes"] = _peak_rss_bytes()
+
+    print(format_results(results))
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print(f"\nResults written to: {args.output}")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        print("\n" + "\n".join(compare_results(results, baseline)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+"""
+Deterministic synthetic Cobb-style datalogs and tunes for benchmarking.
+
+The generated CSV has the 27 headers (and column order) of the bundled v10
+log. It is built from driving phases: idle, part-throttle cruise and
+acceleration, power-enrichment pulls and overrun decel. Rows are generated
+and written in batches, so 50M-row logs never have to be in memory at once.
+
+Phase durations are drawn so that about `pe_fraction` of the samples belong
+to pulls. Pulls run at wide-open throttle and high load with a rich lambda
+target, so `classify_loop_state` puts them in open loop with the PE tables
+of AF041_base.tune. Everything else is closed loop or DFCO. Fueling follows a
+smooth per-cell error field, which shows up as lambda deviation in pulls and
+as fuel trims in closed loop, so the summaries and `fuel_base` writer see
+realistic corrections rather than noise.
+
+The same seed, row count and mix always produce the same file.
+
+    python -m benchmarks.synthetic_logs --rows 1000000 --output benchmarks/data/log_1m.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from tune_file import TuneFile
+
+
+# Column headers of the bundled Cobb logs, in file order.
+LOG_HEADERS = (
+    "Time (s)",
+    "Airflow (MAF) (g/s)",
+    "Load (MAF) (g/rev)",
+    "Manifold Air Pressure - Filtered (kPa)",
+    "Mass Air Flow (g/s)",
+    "Boost Target (kPa)",
+    "Wastegate Duty Cycle (%)",
+    "Air/Fuel Sensor #1 (λ)",
+    "Injector Pulse Width (ms)",
+    "Fuel - Base Multiplier",
+    "Power Mode - Fuel Ratio Target (λ)",
+    "Fuel Trim - Long Term (%)",
+    "Fuel Trim - Short Term (%)",
+    "Coolant Temperature (°C)",
+    "Intake Air Temperature (°C)",
+    "Manifold Absolute Pressure (kPa)",
+    "Engine Speed (rpm)",
+    "Vehicle Speed (km/h)",
+    "System Voltage (V)",
+    "Ignition Advance (°)",
+    "Ignition Advance - Base (°BTDC)",
+    "Ignition Advance Multiplier",
+    "Ignition Advance - Fine Learn (°)",
+    "Knock Retard (°)",
+    "Throttle Position (%)",
+    "Mass Air Flow Voltage (V)",
+    "Fuel - Acceleration Enrich",
+)
+
+# Decimals written per column, as in the Cobb export (0 = integer column).
+COLUMN_DECIMALS = {
+    "Time (s)": 3,
+    "Airflow (MAF) (g/s)": 2,
+    "Load (MAF) (g/rev)": 2,
+    "Manifold Air Pressure - Filtered (kPa)": 1,
+    "Mass Air Flow (g/s)": 2,
+    "Boost Target (kPa)": 1,
+    "Wastegate Duty Cycle (%)": 1,
+    "Air/Fuel Sensor #1 (λ)": 3,
+    "Injector Pulse Width (ms)": 2,
+    "Fuel - Base Multiplier": 3,
+    "Power Mode - Fuel Ratio Target (λ)": 3,
+    "Fuel Trim - Long Term (%)": 2,
+    "Fuel Trim - Short Term (%)": 2,
+    "Coolant Temperature (°C)": 0,
+    "Intake Air Temperature (°C)": 0,
+    "Manifold Absolute Pressure (kPa)": 1,
+    "Engine Speed (rpm)": 0,
+    "Vehicle Speed (km/h)": 0,
+    "System Voltage (V)": 2,
+    "Ignition Advance (°)": 1,
+    "Ignition Advance - Base (°BTDC)": 1,
+    "Ignition Advance Multiplier": 2,
+    "Ignition Advance - Fine Learn (°)": 1,
+    "Knock Retard (°)": 1,
+    "Throttle Position (%)": 2,
+    "Mass Air Flow Voltage (V)": 2,
+    "Fuel - Acceleration Enrich": 3,
+}
+
+PHASES = ("idle", "cruise", "accel", "pull", "decel")
+IDLE, CRUISE, ACCEL, PULL, DECEL = range(len(PHASES))
+
+# Shortest and longest phase, in samples.
+PHASE_SAMPLES = {
+    IDLE: (40, 400),
+    CRUISE: (100, 1500),
+    ACCEL: (20, 80),
+    PULL: (40, 90),
+    DECEL: (30, 150),
+}
+
+# Relative frequency of the non-pull phases.
+OTHER_PHASE_WEIGHTS = {IDLE: 0.2, CRUISE: 0.35, ACCEL: 0.25, DECEL: 0.2}
+
+# Nominal sample period of the Cobb logs (seconds) and its jitter.
+SAMPLE_PERIOD_S = 0.078
+SAMPLE_JITTER_S = 0.002
+
+# Default share of samples in power-enrichment pulls.
+DEFAULT_PE_FRACTION = 0.15
+
+# Largest fueling error of the synthetic engine (fraction of fuel_base).
+FUEL_ERROR_AMPLITUDE = 0.04
+
+# Phases generated per batch; fixed so output does not depend on batch timing.
+PHASES_PER_BATCH = 4096
+
+# Bundled tune the synthetic tunes are derived from.
+BASE_TUNE = Path(__file__).resolve().parent.parent / "example_tune_files" / "AF041_base.tune"
+
+
+def _phase_probabilities(pe_fraction: float) -> np.ndarray:
+    """Phase draw probabilities giving `pe_fraction` of samples in pulls."""
+    if not 0.0 <= pe_fraction < 1.0:
+        raise ValueError(f"pe_fraction must be in [0, 1), got {pe_fraction}.")
+    mean_samples = {phase: sum(bounds) / 2.0 for phase, bounds in PHASE_SAMPLES.items()}
+    other_samples = sum(OTHER_PHASE_WEIGHTS[phase] * mean_samples[phase] for phase in OTHER_PHASE_WEIGHTS)
+    pull_weight = pe_fraction * other_samples / (
+        mean_samples[PULL] * (1.0 - pe_fraction) + pe_fraction * other_samples
+    )
+    probabilities = np.zeros(len(PHASES))
+    probabilities[PULL] = pull_weight
+    for phase, weight in OTHER_PHASE_WEIGHTS.items():
+        probabilities[phase] = (1.0 - pull_weight) * weight
+    return probabilities
+
+
+def fuel_error(rpm: np.ndarray, load: np.ndarray, seed: int) -> np.ndarray:
+    """Smooth fueling error field (fraction, positive = lean) of the synthetic engine."""
+    phase_rpm, phase_load = np.random.default_rng([seed, 1]).uniform(0.0, 2.0 * np.pi, 2)
+    return FUEL_ERROR_AMPLITUDE * np.sin(rpm / 1500.0 + phase_rpm) * np.cos(load * 2.5 + phase_load)
+
+
+class _PhaseState:
+    """Values carried from one batch to the next so phases join up."""
+
+    def __init__(self) -> None:
+        self.rpm = 800.0
+        self.time_s = 0.0
+
+
+def _batch(rng: np.random.Generator, probabilities: np.ndarray, state: _PhaseState, seed: int) -> pd.DataFrame:
+    """Generate `PHASES_PER_BATCH` phases worth of samples."""
+    kinds = rng.choice(len(PHASES), size=PHASES_PER_BATCH, p=probabilities)
+    low = np.array([PHASE_SAMPLES[phase][0] for phase in range(len(PHASES))])[kinds]
+    high = np.array([PHASE_SAMPLES[phase][1] for phase in range(len(PHASES))])[kinds]
+    durations = rng.integers(low, high + 1)
+
+    # RPM each phase ramps to; each phase starts where the previous one ended.
+    end_rpm = np.select(
+        [kinds == IDLE, kinds == CRUISE, kinds == ACCEL, kinds == PULL],
+        [
+            np.full(len(kinds), 800.0),
+            rng.uniform(1800.0, 3200.0, len(kinds)),
+            rng.uniform(3000.0, 4200.0, len(kinds)),
+            rng.uniform(5800.0, 6600.0, len(kinds)),
+        ],
+        rng.uniform(1200.0, 1800.0, len(kinds)),
+    )
+    start_rpm = np.concatenate(([state.rpm], end_rpm[:-1]))
+    # Pulls start from a floored throttle at 2500-3500 rpm.
+    start_rpm = np.where(kinds == PULL, rng.uniform(2500.0, 3500.0, len(kinds)), start_rpm)
+    # Cruise holds its speed after a short transition.
+    ramp_share = np.where(kinds == CRUISE, 0.1, 1.0)
+    level = rng.uniform(0.0, 1.0, len(kinds))
+    rpm_per_kmh = np.select([kinds == PULL, kinds == ACCEL], [55.0, 45.0], 38.0) + 10.0 * level
+
+    n = int(durations.sum())
+    phase = np.repeat(np.arange(len(kinds)), durations)
+    offsets = np.arange(n) - np.repeat(np.cumsum(durations) - durations, durations)
+    kind = kinds[phase]
+    progress = np.minimum(offsets / (durations[phase] * ramp_share[phase]), 1.0)
+    noise = rng.standard_normal((8, n))
+
+    rpm = start_rpm[phase] + (end_rpm[phase] - start_rpm[phase]) * progress + 15.0 * noise[0]
+    rpm = np.maximum(rpm, 650.0)
+    throttle = np.select(
+        [kind == IDLE, kind == CRUISE, kind == ACCEL, kind == PULL],
+        [
+            np.zeros(n),
+            8.0 + 10.0 * level[phase] + 0.8 * noise[1],
+            22.0 + 15.0 * level[phase] + 2.0 * noise[1],
+            np.minimum(85.0 + 15.0 * np.minimum(offsets / 5.0, 1.0), 100.0),
+        ],
+        np.zeros(n),
+    )
+    throttle = np.clip(throttle, 0.0, 100.0)
+    load = np.select(
+        [kind == IDLE, kind == CRUISE, kind == ACCEL, kind == PULL],
+        [
+            0.22 + 0.01 * noise[2],
+            0.3 + 0.5 * level[phase] + 0.03 * noise[2],
+            0.8 + 0.4 * level[phase] + 0.05 * noise[2],
+            1.6 + 0.5 * np.minimum(offsets / 10.0, 1.0) + 0.04 * noise[2],
+        ],
+        0.14 + 0.01 * noise[2],
+    )
+    load = np.maximum(load, 0.1)
+
+    lambda_target = np.where(kind == PULL, 0.78 + 0.04 * (rpm < 4000.0), 1.0)
+    error = fuel_error(rpm, load, seed)
+    closed = kind != PULL
+    stft = np.where(closed & (kind != DECEL), 100.0 * error + 2.0 * noise[3], 0.0)
+    stft = np.clip(stft, -25.0, 25.0)
+    ltft = np.clip(np.round(50.0 * error, 1), -3.2, 3.2)
+    lambda_actual = np.select(
+        [kind == PULL, kind == DECEL],
+        [lambda_target * (1.0 + error) + 0.01 * noise[4], np.full(n, 1.523)],
+        1.0 + 0.01 * noise[4],
+    )
+
+    maf = load * rpm / 60.0
+    boost_target = np.where(kind == PULL, 140.0 + 10.0 * level[phase], 100.3)
+    map_kpa = 12.0 + 70.0 * load + 1.0 * noise[5]
+    wg_duty = np.where(kind == PULL, np.clip(40.0 + 0.008 * (rpm - 2500.0), 0.0, 80.0), 0.0)
+    knock = np.where((kind == PULL) & (rng.random(n) < 0.002), -1.4, 0.0)
+    advance = np.clip(40.0 - 14.0 * load + 0.5 * noise[6], 2.0, 41.0)
+
+    time_s = state.time_s + np.cumsum(SAMPLE_PERIOD_S + SAMPLE_JITTER_S * np.clip(noise[7], -1.0, 1.0))
+    state.rpm = float(end_rpm[-1])
+    state.time_s = float(time_s[-1])
+
+    return pd.DataFrame(
+        {
+            "Time (s)": time_s,
+            "Airflow (MAF) (g/s)": maf,
+            "Load (MAF) (g/rev)": load,
+            "Manifold Air Pressure - Filtered (kPa)": map_kpa,
+            "Mass Air Flow (g/s)": maf * 1.002,
+            "Boost Target (kPa)": boost_target,
+            "Wastegate Duty Cycle (%)": wg_duty,
+            "Air/Fuel Sensor #1 (λ)": lambda_actual,
+            "Injector Pulse Width (ms)": 0.5 + 4.2 * load / lambda_target,
+            "Fuel - Base Multiplier": np.clip(0.58 + 0.1 * load, 0.58, 0.79),
+            "Power Mode - Fuel Ratio Target (λ)": lambda_target,
+            "Fuel Trim - Long Term (%)": ltft,
+            "Fuel Trim - Short Term (%)": stft,
+            "Coolant Temperature (°C)": 90.0 - 70.0 * np.exp(-time_s / 300.0),
+            "Intake Air Temperature (°C)": 12.0 + 10.0 * load,
+            "Manifold Absolute Pressure (kPa)": np.round(map_kpa),
+            "Engine Speed (rpm)": rpm,
+            "Vehicle Speed (km/h)": np.where(kind == IDLE, 0.0, rpm / rpm_per_kmh[phase]),
+            "System Voltage (V)": 14.0 + 0.2 * np.sin(time_s / 30.0),
+            "Ignition Advance (°)": advance + knock,
+            "Ignition Advance - Base (°BTDC)": advance,
+            "Ignition Advance Multiplier": np.ones(n),
+            "Ignition Advance - Fine Learn (°)": np.zeros(n),
+            "Knock Retard (°)": knock,
+            "Throttle Position (%)": throttle,
+            "Mass Air Flow Voltage (V)": np.clip(0.78 * np.log(maf) - 0.04, 0.5, 5.0),
+            "Fuel - Acceleration Enrich": np.where((kind == ACCEL) & (offsets < 5), 0.06, 0.0),
+        },
+        columns=list(LOG_HEADERS),
+    )
+
+
+def _round_columns(frame: pd.DataFrame) -> pd.DataFrame:
+    for column, decimals in COLUMN_DECIMALS.items():
+        values = frame[column].to_numpy()
+        frame[column] = np.round(values).astype(np.int64) if decimals == 0 else np.round(values, decimals)
+    return frame
+
+
+def iter_synthetic_chunks(
+    rows: int, pe_fraction: float = DEFAULT_PE_FRACTION, seed: int = 0
+) -> Iterator[pd.DataFrame]:
+    """Yield `rows` samples of a synthetic log in batches, rounded as Cobb writes them."""
+    rng = np.random.default_rng(seed)
+    probabilities = _phase_probabilities(pe_fraction)
+    state = _PhaseState()
+    remaining = rows
+    while remaining > 0:
+        chunk = _round_columns(_batch(rng, probabilities, state, seed))
+        if len(chunk) > remaining:
+            chunk = chunk.iloc[:remaining]
+        remaining -= len(chunk)
+        yield chunk
+
+
+def write_synthetic_log(
+    path: Path, rows: int, pe_fraction: float = DEFAULT_PE_FRACTION, seed: int = 0
+) -> Path:
+    """Write a synthetic log with `rows` samples to `path` (UTF-8 with BOM, like Cobb)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8-sig", newline="") as handle:
+        for index, chunk in enumerate(iter_synthetic_chunks(rows, pe_fraction, seed)):
+            chunk.to_csv(handle, header=index == 0, index=False, lineterminator="\n")
+    return path
+
+
+def derive_tune(
+    seed: int = 0, fuel_scatter_pct: float = 2.0, base_tune: Optional[Path] = None
+) -> TuneFile:
+    """
+    A copy of AF041_base.tune with each `fuel_base` cell moved by up to
+    `fuel_scatter_pct` percent; every other map is unchanged.
+    """
+    tune = TuneFile.load(base_tune or BASE_TUNE)
+    fuel_base = tune.array("fuel_base")
+    scatter = np.random.default_rng([seed, 2]).uniform(-fuel_scatter_pct, fuel_scatter_pct, fuel_base.shape)
+    tune.set_array("fuel_base", fuel_base * (1.0 + scatter / 100.0))
+    return tune
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Write a deterministic synthetic Cobb-style datalog (and optionally a tune) for benchmarks."
+    )
+    parser.add_argument("--rows", type=int, required=True, help="Samples to generate (e.g. 10000 to 50000000).")
+    parser.add_argument("--output", type=Path, required=True, help="Path of the CSV to write.")
+    parser.add_argument(
+        "--pe-fraction",
+        type=float,
+        default=DEFAULT_PE_FRACTION,
+        help=f"Share of samples in power-enrichment pulls; the rest is closed loop or DFCO (default: {DEFAULT_PE_FRACTION}).",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0).")
+    parser.add_argument(
+        "--output-tune",
+        type=Path,
+        help="Also write a tune derived from AF041_base.tune with a perturbed fuel_base.",
+    )
+    parser.add_argument(
+        "--fuel-scatter",
+        type=float,
+        default=2.0,
+        help="Per-cell fuel_base perturbation of the derived tune in percent (default: 2.0).",
+    )
+    args = parser.parse_args()
+
+    write_synthetic_log(args.output, args.rows, args.pe_fraction, args.seed)
+    print(f"Wrote {args.rows} samples to {args.output}")
+    if args.output_tune:
+        derive_tune(args.seed, args.fuel_scatter).save(args.output_tune)
+        print(f"Wrote derived tune to {args.output_tune}")
+
+
+if __name__ == "__main__":
+    main()
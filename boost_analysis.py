@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+"""
+Per-cell boost control analysis on the wastegate and boost target tables.
+
+`tune_analysis.analyze_datalog` summarizes boost error over hard-coded RPM
+ranges. This script maps every boost sample onto the real table cells in one
+vectorized pass: `wg_base`/`wg_max` cells (`wg_rpm_index` x `wg_tps_index`)
+and `boost_target` cells (`boost_target_rpm_index` x
+`boost_target_tps_index`), then reports duty and boost error per cell.
+
+Logged wastegate duty does not track `wg_base` closely (the controller's
+corrections and limits sit in between; see "Wastegate Control" in
+`ECU_TUNE_FILE_MODEL.md`), so suggestions are anchored on the table: the
+cell's current `wg_base` moved by `--duty-per-kpa` times its mean boost error.
+Samples outside closed-loop boost control (closed throttle, RPM below the
+first real breakpoint) are left out of the wastegate summary. Suggested
+`wg_base` values are limited to `--max-step` duty points from the source tune
+and to the cell's `wg_max`, and are written back with the tune model.
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from cell_binning import MISSING_INDEX, bin_cells
+from data_quality import describe_glitches, reject_glitches
+from log_cache import DEFAULT_CACHE_DIR, LogCache
+from log_schema import EXACT, INTEGER, read_log
+from tune_file import TuneFile
+from tune_writer import ABSOLUTE, MapCorrection, write_tune
+
+
+BOOST_COLUMNS = {
+    "Time (s)": "time_s",
+    "Engine Speed (rpm)": "rpm",
+    "Throttle Position (%)": "throttle_pct",
+    "Manifold Air Pressure - Filtered (kPa)": "map_kpa",
+    "Manifold Absolute Pressure (kPa)": "map_raw_kpa",
+    "Boost Target (kPa)": "boost_target_kpa",
+    "Wastegate Duty Cycle (%)": "wg_duty_pct",
+}
+
+# Load precision of each channel (see log_schema.py).
+BOOST_CHANNELS = {
+    "Time (s)": EXACT,
+    "Engine Speed (rpm)": INTEGER,
+    "Throttle Position (%)": EXACT,
+    "Manifold Air Pressure - Filtered (kPa)": EXACT,
+    "Manifold Absolute Pressure (kPa)": INTEGER,
+    "Boost Target (kPa)": EXACT,
+    "Wastegate Duty Cycle (%)": EXACT,
+}
+
+# Samples below this manifold pressure are not under boost control (kPa).
+DEFAULT_MIN_MAP_KPA = 100.0
+
+# Filtered MAP further than this from the raw MAP channel is a stuck or
+# implausible reading (the filtered channel latches at ~181 kPa at times).
+MAP_DISAGREEMENT_KPA = 30.0
+
+# Duty change assumed to move boost by 1 kPa when correcting for residual error.
+DEFAULT_DUTY_PER_KPA = 0.5
+
+# Largest wg_base change written per cell (duty percentage points).
+DEFAULT_MAX_STEP = 5.0
+
+
+def load_boost_logs(csv_paths: List[Path], cache: Optional[LogCache] = None) -> pd.DataFrame:
+    frames = []
+    for path in csv_paths:
+        frame = read_log(path, BOOST_CHANNELS, cache)
+        missing = [column for column in BOOST_COLUMNS if column not in frame.columns]
+        if missing:
+            raise ValueError(f"Missing columns {missing} in datalog '{path}'.")
+        frame = frame[list(BOOST_COLUMNS)].rename(columns=BOOST_COLUMNS)
+        frame["log_file"] = path.name
+        frames.append(frame)
+    if not frames:
+        raise ValueError("No datalogs were loaded.")
+    return pd.concat(frames, ignore_index=True)
+
+
+def boost_rows(logs: pd.DataFrame, min_map_kpa: float = DEFAULT_MIN_MAP_KPA) -> pd.DataFrame:
+    """
+    Samples under boost control with their boost error (MAP - target, kPa).
+
+    Rows with the engine stopped or with filtered MAP disagreeing with the raw
+    MAP channel by more than MAP_DISAGREEMENT_KPA are ignored.
+    """
+    rows = logs.dropna(subset=["rpm", "throttle_pct", "map_kpa", "boost_target_kpa", "wg_duty_pct"])
+    plausible = (rows["map_kpa"] - rows["map_raw_kpa"]).abs() <= MAP_DISAGREEMENT_KPA
+    rows = rows[(rows["rpm"] > 0) & plausible & (rows["map_kpa"] >= min_map_kpa)].copy()
+    rows["boost_error_kpa"] = rows["map_kpa"] - rows["boost_target_kpa"]
+    return rows
+
+
+def _bin_table(rows: pd.DataFrame, tune: TuneFile, map_id: str) -> tuple:
+    rpm_axis, tps_axis = tune.axis_arrays(map_id)
+    rpm_idx, tps_idx = bin_cells(
+        rows["rpm"].to_numpy(dtype=float),
+        rows["throttle_pct"].to_numpy(dtype=float),
+        rpm_axis,
+        tps_axis,
+    )
+    valid = (rpm_idx != MISSING_INDEX) & (tps_idx != MISSING_INDEX)
+    return rpm_idx, tps_idx, valid, rpm_axis, tps_axis
+
+
+def summarize_wastegate(
+    rows: pd.DataFrame,
+    tune: TuneFile,
+    min_samples: int,
+    duty_per_kpa: float = DEFAULT_DUTY_PER_KPA,
+) -> pd.DataFrame:
+    """
+    Duty and boost error per `wg_base` cell with a suggested base duty.
+
+    The first RPM row and the closed-throttle column are not under boost
+    control and are skipped. A suggestion that would move `wg_base` against
+    the boost error (e.g. lower duty while underboosting, which the `wg_max`
+    cap can cause) keeps the current value instead.
+    """
+    if rows.empty:
+        return pd.DataFrame()
+    rpm_idx, tps_idx, valid, rpm_axis, tps_axis = _bin_table(rows, tune, "wg_base")
+    valid &= (rpm_idx > 0) & (tps_idx > 0)
+    binned = rows.assign(rpm_idx=rpm_idx, tps_idx=tps_idx)[valid]
+    grouped = (
+        binned.groupby(["rpm_idx", "tps_idx"])
+        .agg(
+            samples=("wg_duty_pct", "size"),
+            mean_duty=("wg_duty_pct", "mean"),
+            mean_error_kpa=("boost_error_kpa", "mean"),
+            p95_abs_error_kpa=("boost_error_kpa", lambda s: np.percentile(np.abs(s), 95)),
+        )
+        .reset_index()
+    )
+    grouped = grouped[grouped["samples"] >= min_samples].copy()
+    if grouped.empty:
+        return grouped
+
+    row = grouped["rpm_idx"].to_numpy(dtype=int)
+    col = grouped["tps_idx"].to_numpy(dtype=int)
+    grouped.insert(2, "rpm_axis", rpm_axis[row].astype(int))
+    grouped.insert(3, "tps_axis", np.round(tps_axis[col], 2))
+    grouped["current_wg_base"] = tune.array("wg_base")[row, col]
+    grouped["wg_max"] = tune.array("wg_max")[row, col]
+    current = grouped["current_wg_base"]
+    suggested = np.clip(current - duty_per_kpa * grouped["mean_error_kpa"], 0.0, grouped["wg_max"])
+    against_error = (suggested - current) * grouped["mean_error_kpa"] > 0
+    grouped["suggested_wg_base"] = suggested.where(~against_error, current)
+    return grouped.sort_values(by="mean_error_kpa", key=lambda col: col.abs(), ascending=False)
+
+
+def summarize_boost_target(rows: pd.DataFrame, tune: TuneFile, min_samples: int) -> pd.DataFrame:
+    """Boost error and over/underboost counts per `boost_target` cell."""
+    if rows.empty:
+        return pd.DataFrame()
+    rpm_idx, tps_idx, valid, rpm_axis, tps_axis = _bin_table(rows, tune, "boost_target")
+    binned = rows.assign(
+        rpm_idx=rpm_idx,
+        tps_idx=tps_idx,
+        overboost=rows["boost_error_kpa"] > 5.0,
+        underboost=rows["boost_error_kpa"] < -5.0,
+    )[valid]
+    grouped = (
+        binned.groupby(["rpm_idx", "tps_idx"])
+        .agg(
+            samples=("boost_error_kpa", "size"),
+            mean_target_kpa=("boost_target_kpa", "mean"),
+            mean_map_kpa=("map_kpa", "mean"),
+            mean_error_kpa=("boost_error_kpa", "mean"),
+            overboost=("overboost", "sum"),
+            underboost=("underboost", "sum"),
+        )
+        .reset_index()
+    )
+    grouped = grouped[grouped["samples"] >= min_samples].copy()
+    if grouped.empty:
+        return grouped
+    row = grouped["rpm_idx"].to_numpy(dtype=int)
+    col = grouped["tps_idx"].to_numpy(dtype=int)
+    grouped.insert(2, "rpm_axis", rpm_axis[row].astype(int))
+    grouped.insert(3, "tps_axis", np.round(tps_axis[col], 2))
+    grouped["table_target_kpa"] = tune.array("boost_target")[row, col]
+    return grouped.sort_values(by="mean_error_kpa", key=lambda col: col.abs(), ascending=False)
+
+
+def generate_boost_report(
+    wastegate: pd.DataFrame, targets: pd.DataFrame, output_path: Optional[Path]
+) -> None:
+    def _format(df: pd.DataFrame) -> str:
+        if df.empty:
+            return "_No data available._"
+        return df.to_string(index=False, float_format=lambda val: f"{val:.2f}")
+
+    wg_section = "### Wastegate Duty by wg_base Cell\n" + _format(wastegate) + "\n"
+    target_section = "### Boost Error by boost_target Cell\n" + _format(targets) + "\n"
+
+    if output_path:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(wg_section + "\n" + target_section, encoding="utf-8")
+
+    print(wg_section)
+    print(target_section)
+
+
+def apply_wg_base_modifications(
+    tune_path: Path,
+    wastegate: pd.DataFrame,
+    output_tune_path: Path,
+    max_step: float = DEFAULT_MAX_STEP,
+    modify_tune_path: Optional[Path] = None,
+    source_tune: Optional[TuneFile] = None,
+) -> None:
+    """
+    Write suggested `wg_base` values to a new tune file.
+
+    Changes are limited to +/-max_step duty points from the source tune's
+    `wg_base` (clamped and reported) and always start from the source values,
+    so reruns are idempotent; other maps come from the output or template tune.
+    """
+    source_tune = source_tune if source_tune is not None else TuneFile.load(tune_path)
+    correction = MapCorrection.from_summary(
+        "wg_base",
+        wastegate,
+        "suggested_wg_base",
+        ("rpm_idx", "tps_idx"),
+        max_step,
+        ABSOLUTE,
+        label_columns=("rpm_axis", "tps_axis"),
+    )
+    update = write_tune(source_tune, [correction], output_tune_path, modify_tune_path)["wg_base"]
+
+    print(f"\nModified tune file saved to: {output_tune_path}")
+    print(f"Applied {len(wastegate)} wg_base modifications (limit: +/-{max_step} duty points from source).")
+    clamped = np.flatnonzero(update.clamped)
+    if len(clamped):
+        print(f"\nWARNING: {len(clamped)} modifications exceeded the +/-{max_step} point limit and were clamped:")
+        print("   RPM     TPS     Original  Suggested  Clamped")
+        print("   " + "-" * 46)
+        for cell in clamped:
+            print(
+                f"   {float(update.labels['rpm_axis'][cell]):5.0f}   {float(update.labels['tps_axis'][cell]):6.2f}   "
+                f"{update.original[cell]:7.1f}   {update.suggested[cell]:8.1f}   {update.written[cell]:7.1f}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Analyze boost control per wg_base/boost_target cell and suggest wg_base "
+            "corrections. See ECU_TUNE_FILE_MODEL.md for map structure details."
+        )
+    )
+    parser.add_argument("--tune", type=Path, required=True, help="Path to the JSON-formatted tune file.")
+    parser.add_argument("--logs", type=Path, nargs="+", required=True, help="One or more CSV datalog files to analyze.")
+    parser.add_argument("--output", type=Path, help="Optional path to save a Markdown summary.")
+    parser.add_argument(
+        "--output-tune",
+        type=Path,
+        help="Optional path to save a modified tune file with updated wg_base values.",
+    )
+    parser.add_argument(
+        "--modify-tune",
+        type=Path,
+        help="Optional tune file to modify. If not specified, uses --tune file as the source for modifications.",
+    )
+    parser.add_argument(
+        "--min-samples",
+        type=int,
+        default=5,
+        help="Minimum hits per cell before reporting it (default: 5).",
+    )
+    parser.add_argument(
+        "--min-map",
+        type=float,
+        default=DEFAULT_MIN_MAP_KPA,
+        help=f"Minimum manifold pressure for a sample to count as under boost (default: {DEFAULT_MIN_MAP_KPA} kPa).",
+    )
+    parser.add_argument(
+        "--duty-per-kpa",
+        type=float,
+        default=DEFAULT_DUTY_PER_KPA,
+        help=f"Duty points per kPa used to correct residual boost error (default: {DEFAULT_DUTY_PER_KPA}).",
+    )
+    parser.add_argument(
+        "--max-step",
+        type=float,
+        default=DEFAULT_MAX_STEP,
+        help=f"Maximum wg_base change per cell in duty points (default: {DEFAULT_MAX_STEP}).",
+    )
+    parser.add_argument(
+        "--no-glitch-filter",
+        action="store_true",
+        help="Keep sensor glitches (spikes, flatlines, out-of-range values) instead of masking them.",
+    )
+    parser.add_argument(
+        "--log-cache",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory for the parsed-datalog cache (default: {DEFAULT_CACHE_DIR}).",
+    )
+    parser.add_argument(
+        "--no-log-cache",
+        action="store_true",
+        help="Always parse datalog CSVs instead of using the parsed-datalog cache.",
+    )
+
+    args = parser.parse_args()
+
+    tune_file = TuneFile.load(args.tune)
+    cache = None if args.no_log_cache else LogCache(args.log_cache)
+    logs = load_boost_logs(args.logs, cache)
+    if not args.no_glitch_filter:
+        logs, glitches = reject_glitches(logs, names=BOOST_COLUMNS)
+        print(describe_glitches(glitches, len(logs)))
+    rows = boost_rows(logs, args.min_map)
+    print(f"Boost samples (MAP >= {args.min_map:g} kPa): {len(rows)}")
+
+    wastegate = summarize_wastegate(rows, tune_file, args.min_samples, args.duty_per_kpa)
+    targets = summarize_boost_target(rows, tune_file, args.min_samples)
+    generate_boost_report(wastegate, targets, args.output)
+
+    if args.output_tune:
+        apply_wg_base_modifications(
+            args.tune,
+            wastegate,
+            args.output_tune,
+            max_step=args.max_step,
+            modify_tune_path=args.modify_tune,
+            source_tune=tune_file,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Vectorized cell binning for tune table axes.
+
+These helpers map whole datalog columns onto table breakpoints in a single
+`np.searchsorted` pass. They follow the same semantics as the scalar
+`fueling_analysis.axis_index` helper: samples snap to the lower breakpoint,
+values outside the axis are clamped to the first/last cell (or rejected when
+`clamp=False`), and NaN samples never map to a cell.
+
+`axis_weights`/`bilinear_cells` instead mirror the ECU's interpolated lookup:
+each sample is split between its bracketing breakpoints by linear weight.
+"""
+
+from __future__ import annotations
+
+from typing import Tuple
+
+import numpy as np
+
+
+# Sentinel index for samples that do not map to any cell (NaN or out of range).
+MISSING_INDEX = -1
+
+
+def axis_indices(values: np.ndarray, axis: np.ndarray, clamp: bool = True) -> np.ndarray:
+    """Return the lower-breakpoint index of every value, or MISSING_INDEX."""
+    values = np.asarray(values, dtype=float)
+    axis = np.asarray(axis, dtype=float)
+
+    indices = np.searchsorted(axis, values, side="right") - 1
+    np.clip(indices, 0, len(axis) - 1, out=indices)
+    indices = indices.astype(np.int64, copy=False)
+
+    if not clamp:
+        indices[(values < axis[0]) | (values > axis[-1])] = MISSING_INDEX
+    indices[np.isnan(values)] = MISSING_INDEX
+    return indices
+
+
+def bin_cells(
+    rpm: np.ndarray,
+    load: np.ndarray,
+    rpm_axis: np.ndarray,
+    load_axis: np.ndarray,
+    clamp: bool = True,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Map RPM/load columns to (rpm_idx, load_idx) arrays for a 2D table."""
+    return axis_indices(rpm, rpm_axis, clamp), axis_indices(load, load_axis, clamp)
+
+
+def axis_lookup(
+    values: np.ndarray,
+    axis: np.ndarray,
+    table: np.ndarray,
+    clamp: bool = True,
+    missing: float = np.inf,
+) -> np.ndarray:
+    """
+    Look up a 1D table (e.g. `pe_enable_load` indexed by RPM) for every value.
+
+    Samples that do not map to a breakpoint receive `missing`, which defaults to
+    +inf so that "value >= threshold" comparisons are never satisfied.
+    """
+    indices = axis_indices(values, axis, clamp)
+    result = np.asarray(table, dtype=float)[np.maximum(indices, 0)]
+    result[indices == MISSING_INDEX] = missing
+    return result
+
+
+def axis_weights(values: np.ndarray, axis: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lower bracketing index and the linear weight of the upper breakpoint.
+
+    Values outside the axis clamp to the end breakpoint with weight 0 on the
+    (nonexistent) neighbour; NaN values get MISSING_INDEX.
+    """
+    values = np.asarray(values, dtype=float)
+    axis = np.asarray(axis, dtype=float)
+    if len(axis) < 2:
+        lower = np.zeros(values.shape, dtype=np.int64)
+        lower[np.isnan(values)] = MISSING_INDEX
+        return lower, np.zeros(values.shape)
+
+    lower = np.clip(np.searchsorted(axis, values, side="right") - 1, 0, len(axis) - 2)
+    span = axis[lower + 1] - axis[lower]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        upper_weight = np.clip((values - axis[lower]) / span, 0.0, 1.0)
+    upper_weight[~np.isfinite(upper_weight)] = 0.0
+    lower = lower.astype(np.int64, copy=False)
+    lower[np.isnan(values)] = MISSING_INDEX
+    return lower, upper_weight
+
+
+def bilinear_cells(
+    rpm: np.ndarray,
+    load: np.ndarray,
+    rpm_axis: np.ndarray,
+    load_axis: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The four cells surrounding every (rpm, load) sample and their bilinear weights.
+
+    Returns `(rpm_idx, load_idx, weight)`, each shaped `(n, 4)`; the weights of
+    a sample sum to 1. Samples with NaN coordinates get MISSING_INDEX cells and
+    zero weight.
+    """
+    rpm_lo, rpm_w = axis_weights(rpm, rpm_axis)
+    load_lo, load_w = axis_weights(load, load_axis)
+    rpm_hi = np.minimum(rpm_lo + 1, len(rpm_axis) - 1)
+    load_hi = np.minimum(load_lo + 1, len(load_axis) - 1)
+
+    rpm_idx = np.stack((rpm_lo, rpm_lo, rpm_hi, rpm_hi), axis=1)
+    load_idx = np.stack((load_lo, load_hi, load_lo, load_hi), axis=1)
+    weight = np.stack(
+        (
+            (1.0 - rpm_w) * (1.0 - load_w),
+            (1.0 - rpm_w) * load_w,
+            rpm_w * (1.0 - load_w),
+            rpm_w * load_w,
+        ),
+        axis=1,
+    )
+    missing = (rpm_lo == MISSING_INDEX) | (load_lo == MISSING_INDEX)
+    rpm_idx[missing] = MISSING_INDEX
+    load_idx[missing] = MISSING_INDEX
+    weight[missing] = 0.0
+    return rpm_idx, load_idx, weight
@@ -0,0 +1,400 @@
+"""
+Mergeable per-cell accumulators for streaming fueling analysis.
+
+A `CellAccumulator` keeps, for every (rpm_idx, load_idx) cell of a 2D table,
+the sample count, sum and sum of squares of a metric plus a `QuantileSketch`
+used to estimate the median and 95th percentile. Memory use depends only on
+the table shape and sketch resolution, never on the number of log rows, and
+two accumulators built from different chunks, files or worker processes can
+be merged exactly and serialized.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# Histogram ranges for the metrics summarized by fueling_analysis. Values
+# outside the range are counted in the edge bins.
+LAMBDA_RATIO_RANGE = (0.0, 2.0)
+TRIM_PCT_RANGE = (-50.0, 50.0)
+DEFAULT_HISTOGRAM_BINS = 4000
+
+
+@dataclass
+class QuantileSketch:
+    """
+    Fixed-bin histogram sketch holding one value distribution per cell.
+
+    Quantile estimates are within one bin width of the exact `np.percentile`
+    result for values inside `value_range`. Because the bins are fixed, two
+    sketches merge exactly by adding counts, independent of merge order. A
+    `weighted` sketch accumulates sample weights instead of counts and answers
+    weighted quantiles.
+    """
+
+    cells: int
+    value_range: Tuple[float, float]
+    bins: int
+    counts: np.ndarray  # (cells, bins) value counts (or weights)
+    weighted: bool = False
+
+    @classmethod
+    def create(
+        cls,
+        cells: int,
+        value_range: Tuple[float, float],
+        bins: int = DEFAULT_HISTOGRAM_BINS,
+        weighted: bool = False,
+    ) -> "QuantileSketch":
+        return cls(
+            cells=int(cells),
+            value_range=(float(value_range[0]), float(value_range[1])),
+            bins=int(bins),
+            counts=np.zeros((cells, bins), dtype=float if weighted else np.int64),
+            weighted=weighted,
+        )
+
+    @property
+    def bin_width(self) -> float:
+        return (self.value_range[1] - self.value_range[0]) / self.bins
+
+    @property
+    def error_bound(self) -> float:
+        """Worst-case absolute quantile error for values inside `value_range`."""
+        return self.bin_width
+
+    def update(
+        self,
+        cell: np.ndarray,
+        values: np.ndarray,
+        weights: Optional[np.ndarray] = None,
+    ) -> None:
+        """
+        Add samples for flat cell indices `cell` (weights only for weighted
+        sketches). Non-finite values are skipped with their weights.
+        """
+        values = np.asarray(values, dtype=float)
+        if weights is not None and not self.weighted:
+            raise ValueError("Weights require a sketch created with weighted=True.")
+        finite = np.isfinite(values)
+        if not finite.all():
+            values = values[finite]
+            cell = np.asarray(cell)[finite]
+            if weights is not None:
+                weights = np.asarray(weights, dtype=float)[finite]
+        if values.size == 0:
+            return
+        value_bin = np.floor((values - self.value_range[0]) / self.bin_width)
+        value_bin = np.clip(value_bin, 0, self.bins - 1).astype(np.int64)
+        self.counts += np.bincount(
+            np.asarray(cell, dtype=np.int64) * self.bins + value_bin,
+            weights=weights,
+            minlength=self.cells * self.bins,
+        ).reshape(self.cells, self.bins)
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if (
+            self.cells != other.cells
+            or self.value_range != other.value_range
+            or self.bins != other.bins
+            or self.weighted != other.weighted
+        ):
+            raise ValueError("Cannot merge sketches with different layouts.")
+        self.counts += other.counts
+
+    def quantile(self, q: float) -> np.ndarray:
+        """
+        Estimate the q-quantile (0..1) of every cell.
+
+        Samples are assumed to be spread evenly inside their bin and ranks are
+        interpolated linearly as in `np.percentile`. Empty cells return NaN.
+        """
+        counts = self.counts
+        n = counts.sum(axis=1)
+        cumulative = np.cumsum(counts, axis=1)
+        if self.weighted:
+            return self._weighted_quantile(q, counts, cumulative, n)
+        rank = q * np.maximum(n - 1, 0)  # 0-based rank, as in np.percentile
+        lower = np.floor(rank).astype(np.int64)
+        upper = np.minimum(lower + 1, np.maximum(n - 1, 0))
+        low_value = self._value_at_rank(counts, cumulative, lower)
+        high_value = self._value_at_rank(counts, cumulative, upper)
+        estimate = low_value + (rank - lower) * (high_value - low_value)
+        return np.where(n > 0, estimate, np.nan)
+
+    def _weighted_quantile(
+        self, q: float, counts: np.ndarray, cumulative: np.ndarray, total: np.ndarray
+    ) -> np.ndarray:
+        """Invert the weighted CDF, interpolating linearly inside the bin."""
+        target = q * total
+        bin_idx = (cumulative < target[:, None]).sum(axis=1)
+        bin_idx = np.minimum(bin_idx, self.bins - 1)
+        rows = np.arange(counts.shape[0])
+        in_bin = counts[rows, bin_idx]
+        before = cumulative[rows, bin_idx] - in_bin
+        with np.errstate(invalid="ignore", divide="ignore"):
+            offset = np.where(in_bin > 0, (target - before) / in_bin, 0.5)
+        offset = np.clip(offset, 0.0, 1.0)
+        estimate = self.value_range[0] + (bin_idx + offset) * self.bin_width
+        return np.where(total > 0, estimate, np.nan)
+
+    def _value_at_rank(
+        self, counts: np.ndarray, cumulative: np.ndarray, rank: np.ndarray
+    ) -> np.ndarray:
+        """Approximate value of the sample at integer 0-based `rank` in each cell."""
+        bin_idx = (cumulative <= rank[:, None]).sum(axis=1)
+        bin_idx = np.minimum(bin_idx, self.bins - 1)
+        rows = np.arange(counts.shape[0])
+        in_bin = counts[rows, bin_idx]
+        before = cumulative[rows, bin_idx] - in_bin
+        with np.errstate(invalid="ignore", divide="ignore"):
+            offset = np.where(in_bin > 0, (rank - before + 0.5) / in_bin, 0.5)
+        offset = np.clip(offset, 0.0, 1.0)
+        return self.value_range[0] + (bin_idx + offset) * self.bin_width
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable form storing only the non-empty bins."""
+        cell, value_bin = np.nonzero(self.counts)
+        return {
+            "cells": self.cells,
+            "value_range": list(self.value_range),
+            "bins": self.bins,
+            "weighted": self.weighted,
+            "cell": cell.tolist(),
+            "bin": value_bin.tolist(),
+            "count": self.counts[cell, value_bin].tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, payload: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls.create(
+            payload["cells"],
+            tuple(payload["value_range"]),
+            payload["bins"],
+            weighted=payload.get("weighted", False),
+        )
+        sketch.counts[
+            np.asarray(payload["cell"], dtype=np.int64),
+            np.asarray(payload["bin"], dtype=np.int64),
+        ] = np.asarray(payload["count"], dtype=sketch.counts.dtype)
+        return sketch
+
+
+@dataclass
+class CellAccumulator:
+    """
+    Running count/sum/sum-of-squares and quantile sketch for each table cell.
+
+    A `weighted` accumulator also tracks the per-cell weight total; sums and
+    quantiles are then weighted (e.g. by dwell time or interpolation weight),
+    and the standard deviation treats the weights as reliability weights.
+    """
+
+    shape: Tuple[int, int]
+    count: np.ndarray  # (rpm, load) sample counts
+    weight: np.ndarray  # (rpm, load) sum of sample weights (== count when unweighted)
+    weight_sq: np.ndarray  # (rpm, load) sum of squared sample weights (== count when unweighted)
+    total: np.ndarray  # (rpm, load) (weighted) sum of values
+    total_sq: np.ndarray  # (rpm, load) (weighted) sum of squared values
+    sketch: QuantileSketch
+
+    @classmethod
+    def create(
+        cls,
+        shape: Tuple[int, int],
+        value_range: Tuple[float, float],
+        bins: int = DEFAULT_HISTOGRAM_BINS,
+        weighted: bool = False,
+    ) -> "CellAccumulator":
+        return cls(
+            shape=tuple(shape),
+            count=np.zeros(shape, dtype=np.int64),
+            weight=np.zeros(shape, dtype=float),
+            weight_sq=np.zeros(shape, dtype=float),
+            total=np.zeros(shape, dtype=float),
+            total_sq=np.zeros(shape, dtype=float),
+            sketch=QuantileSketch.create(shape[0] * shape[1], value_range, bins, weighted),
+        )
+
+    @property
+    def weighted(self) -> bool:
+        return self.sketch.weighted
+
+    def update(
+        self,
+        rpm_idx: np.ndarray,
+        load_idx: np.ndarray,
+        values: np.ndarray,
+        weights: Optional[np.ndarray] = None,
+    ) -> None:
+        """Add a batch of samples; indices must already be valid cell indices."""
+        values = np.asarray(values, dtype=float)
+        if values.size == 0:
+            return
+        cells = self.shape[0] * self.shape[1]
+        flat = np.ravel_multi_index(
+            (np.asarray(rpm_idx, dtype=np.int64), np.asarray(load_idx, dtype=np.int64)),
+            self.shape,
+        )
+        if self.weighted and weights is None:
+            weights = np.ones(values.size)
+        elif weights is not None:
+            weights = np.asarray(weights, dtype=float)
+
+        counts = np.bincount(flat, minlength=cells).reshape(self.shape)
+        self.count += counts
+        if weights is None:
+            self.weight += counts
+            self.weight_sq += counts
+            weighted_values = values
+        else:
+            self.weight += np.bincount(flat, weights=weights, minlength=cells).reshape(self.shape)
+            self.weight_sq += np.bincount(flat, weights=weights * weights, minlength=cells).reshape(
+                self.shape
+            )
+            weighted_values = values * weights
+        self.total += np.bincount(flat, weights=weighted_values, minlength=cells).reshape(self.shape)
+        self.total_sq += np.bincount(
+            flat, weights=weighted_values * values, minlength=cells
+        ).reshape(self.shape)
+        self.sketch.update(flat, values, weights)
+
+    def merge(self, other: "CellAccumulator") -> None:
+        """Fold another accumulator with the same layout into this one."""
+        if self.shape != other.shape:
+            raise ValueError("Cannot merge accumulators with different layouts.")
+        self.count += other.count
+        self.weight += other.weight
+        self.weight_sq += other.weight_sq
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.sketch.merge(other.sketch)
+
+    def mean(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.total / self.weight
+
+    def std(self) -> np.ndarray:
+        """
+        Sample standard deviation per cell (NaN where fewer than two samples).
+
+        The unbiased denominator is `W - sum(w^2) / W` (reliability weights),
+        which is `n - 1` for unit weights and independent of the weight scale.
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            denominator = self.weight - self.weight_sq / self.weight
+            variance = (self.total_sq - self.total * self.total / self.weight) / denominator
+        return np.where(denominator > 0, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+
+    def quantile(self, q: float) -> np.ndarray:
+        return self.sketch.quantile(q).reshape(self.shape)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Per-cell statistics for every cell with at least one sample.
+
+        Weighted accumulators add a `weight` column with the per-cell weight total.
+        """
+        rpm_idx, load_idx = np.nonzero(self.count)
+        frame = pd.DataFrame(
+            {
+                "rpm_idx": rpm_idx,
+                "load_idx": load_idx,
+                "samples": self.count[rpm_idx, load_idx],
+                "mean": self.mean()[rpm_idx, load_idx],
+                "median": self.quantile(0.5)[rpm_idx, load_idx],
+                "p95": self.quantile(0.95)[rpm_idx, load_idx],
+                "std": self.std()[rpm_idx, load_idx],
+            }
+        )
+        if self.weighted:
+            frame.insert(3, "weight", self.weight[rpm_idx, load_idx])
+        return frame
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable form (sparse) for persisting or shipping partials."""
+        return {
+            "shape": list(self.shape),
+            "count": self.count.tolist(),
+            "weight": self.weight.tolist(),
+            "weight_sq": self.weight_sq.tolist(),
+            "total": self.total.tolist(),
+            "total_sq": self.total_sq.tolist(),
+            "sketch": self.sketch.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, payload: Dict[str, Any]) -> "CellAccumulator":
+        count = np.asarray(payload["count"], dtype=np.int64)
+        return cls(
+            shape=tuple(payload["shape"]),
+            count=count,
+            weight=np.asarray(payload.get("weight", count), dtype=float),
+            weight_sq=np.asarray(payload.get("weight_sq", count), dtype=float),
+            total=np.asarray(payload["total"], dtype=float),
+            total_sq=np.asarray(payload["total_sq"], dtype=float),
+            sketch=QuantileSketch.from_dict(payload["sketch"]),
+        )
+
+
+def weighted_cell_stats(
+    rpm_idx: np.ndarray,
+    load_idx: np.ndarray,
+    values: np.ndarray,
+    weights: np.ndarray,
+) -> pd.DataFrame:
+    """
+    Exact weighted per-cell statistics (the in-memory counterpart of a
+    weighted `CellAccumulator`).
+
+    Returns one row per cell with `samples`, `weight`, weighted `mean` and
+    weighted `median`/`p95`, where a weighted quantile is the smallest value
+    whose cumulative weight reaches `q` of the cell total.
+    """
+    rpm_idx = np.asarray(rpm_idx, dtype=np.int64)
+    load_idx = np.asarray(load_idx, dtype=np.int64)
+    values = np.asarray(values, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    if values.size == 0:
+        return pd.DataFrame(
+            columns=["rpm_idx", "load_idx", "samples", "weight", "mean", "median", "p95"]
+        )
+
+    order = np.lexsort((values, load_idx, rpm_idx))
+    rpm_sorted = rpm_idx[order]
+    load_sorted = load_idx[order]
+    values_sorted = values[order]
+    weights_sorted = weights[order]
+
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = (rpm_sorted[1:] != rpm_sorted[:-1]) | (load_sorted[1:] != load_sorted[:-1])
+    starts = np.flatnonzero(new_group)
+    ends = np.append(starts[1:], len(order))
+
+    cumulative = np.cumsum(weights_sorted)
+    before = np.concatenate(([0.0], cumulative))[starts]
+    group_weight = cumulative[ends - 1] - before
+    group_total = np.add.reduceat(values_sorted * weights_sorted, starts)
+
+    def _quantile(q: float) -> np.ndarray:
+        position = np.searchsorted(cumulative, before + q * group_weight, side="left")
+        return values_sorted[np.clip(position, starts, ends - 1)]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = group_total / group_weight
+    return pd.DataFrame(
+        {
+            "rpm_idx": rpm_sorted[starts],
+            "load_idx": load_sorted[starts],
+            "samples": ends - starts,
+            "weight": group_weight,
+            "mean": mean,
+            "median": _quantile(0.5),
+            "p95": _quantile(0.95),
+        }
+    )
@@ -0,0 +1,226 @@
+"""
+Sensor-glitch rejection for datalog channels.
+
+Some logged channels glitch in ways that corrupt every statistic built on
+them: the filtered MAP channel in the v10 log jumps from ~40 kPa to a latched
+181.3 kPa for one or two samples at a time, which turns into bogus boost
+error and overboost counts. `reject_glitches` runs ahead of the analyzers and
+masks (sets to NaN) samples that are
+
+- out of the channel's physical range,
+- spikes: further than `SPIKE_MADS` robust deviations (and at least the
+  channel's `spike_delta`) from a centered rolling median, computed with
+  `numpy.lib.stride_tricks.sliding_window_view`,
+- flatlines: a channel that normally moves repeating one value for at least
+  `flatline_s` seconds.
+
+Checks are per channel (`CHANNEL_CHECKS`, keyed by the original CSV header)
+and never look across a log file boundary. A rolling median follows real
+steps (throttle snaps, boost onset) after half a window, so only isolated
+excursions shorter than that are treated as spikes. Channels whose fast
+changes are real physics (lambda, fuel trims, throttle) only get range checks.
+"""
+
+from __future__ import annotations
+
+import warnings
+from dataclasses import dataclass
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from run_length import run_bounds
+
+
+# Samples in the centered rolling window (odd); spikes up to half of it wide are caught.
+SPIKE_WINDOW = 7
+
+# Scaled MADs a sample must deviate from the rolling median to be a spike.
+SPIKE_MADS = 5.0
+
+# Columns of a `reject_glitches` report.
+GLITCH_REPORT_COLUMNS = ["channel", "out_of_range", "spikes", "flatlines", "masked"]
+
+# Consistency constant turning a MAD into a normal-equivalent standard deviation.
+MAD_SCALE = 1.4826
+
+
+@dataclass(frozen=True)
+class ChannelCheck:
+    """Glitch limits for one channel; None disables that check."""
+
+    low: Optional[float] = None
+    high: Optional[float] = None
+    spike_delta: Optional[float] = None  # minimum deviation from the rolling median
+    flatline_s: Optional[float] = None  # longest plausible run of one repeated value
+
+
+CHANNEL_CHECKS: Dict[str, ChannelCheck] = {
+    "Engine Speed (rpm)": ChannelCheck(0.0, 9000.0, spike_delta=1500.0),
+    "Load (MAF) (g/rev)": ChannelCheck(0.0, 5.0),
+    "Manifold Air Pressure - Filtered (kPa)": ChannelCheck(10.0, 350.0, spike_delta=15.0, flatline_s=5.0),
+    "Manifold Absolute Pressure (kPa)": ChannelCheck(10.0, 350.0, spike_delta=20.0, flatline_s=5.0),
+    "Mass Air Flow (g/s)": ChannelCheck(0.0, 600.0, spike_delta=20.0, flatline_s=5.0),
+    "Airflow (MAF) (g/s)": ChannelCheck(0.0, 600.0, spike_delta=20.0, flatline_s=5.0),
+    "Mass Air Flow Voltage (V)": ChannelCheck(0.0, 5.1, spike_delta=0.75, flatline_s=5.0),
+    "Air/Fuel Sensor #1 (λ)": ChannelCheck(0.4, 2.0),
+    "Power Mode - Fuel Ratio Target (λ)": ChannelCheck(0.5, 1.5),
+    "Fuel Trim - Short Term (%)": ChannelCheck(-50.0, 50.0),
+    "Fuel Trim - Long Term (%)": ChannelCheck(-50.0, 50.0),
+    "Throttle Position (%)": ChannelCheck(0.0, 100.0),
+    "Coolant Temperature (°C)": ChannelCheck(-40.0, 140.0, spike_delta=10.0),
+    "Intake Air Temperature (°C)": ChannelCheck(-40.0, 100.0, spike_delta=10.0),
+    "System Voltage (V)": ChannelCheck(8.0, 17.0, spike_delta=1.5),
+    "Boost Target (kPa)": ChannelCheck(50.0, 350.0),
+    "Wastegate Duty Cycle (%)": ChannelCheck(0.0, 100.0),
+}
+
+
+def file_bounds(frame: pd.DataFrame, file_column: str = "log_file") -> Tuple[np.ndarray, np.ndarray]:
+    """Start and end (exclusive) row of each log file in a frame of concatenated logs."""
+    if file_column not in frame.columns or frame.empty:
+        return np.array([0]), np.array([len(frame)])
+    files = frame[file_column].to_numpy()
+    boundaries = np.flatnonzero(files[1:] != files[:-1]) + 1
+    return np.concatenate(([0], boundaries)), np.concatenate((boundaries, [len(frame)]))
+
+
+def rolling_median_mad(values: np.ndarray, window: int = SPIKE_WINDOW) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Centered rolling median and median absolute deviation.
+
+    The series is edge-padded so the output has the input's length; NaN
+    samples are ignored within each window.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return values.copy(), values.copy()
+    half = window // 2
+    windows = sliding_window_view(np.pad(values, half, mode="edge"), window)
+    with np.errstate(invalid="ignore"), warnings.catch_warnings():
+        # Windows without any data yield NaN; numpy warns about those slices.
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        median = np.nanmedian(windows, axis=1)
+        mad = np.nanmedian(np.abs(windows - median[:, None]), axis=1)
+    return median, mad
+
+
+def spike_mask(
+    values: np.ndarray,
+    spike_delta: float,
+    window: int = SPIKE_WINDOW,
+    n_mads: float = SPIKE_MADS,
+) -> np.ndarray:
+    """Samples further than max(n_mads * scaled MAD, spike_delta) from the rolling median."""
+    median, mad = rolling_median_mad(values, window)
+    limit = np.maximum(n_mads * MAD_SCALE * mad, spike_delta)
+    with np.errstate(invalid="ignore"):
+        return np.abs(values - median) > limit
+
+
+def flatline_mask(values: np.ndarray, time_s: np.ndarray, min_duration_s: float) -> np.ndarray:
+    """Samples belonging to a run of one repeated value lasting at least `min_duration_s`."""
+    mask = np.zeros(len(values), dtype=bool)
+    if len(values) < 2:
+        return mask
+    repeated = np.concatenate(([False], values[1:] == values[:-1]))
+    starts, ends = run_bounds(repeated)
+    # A run of repeats starts one sample after the first occurrence of the value.
+    starts = starts - 1
+    long_runs = time_s[ends - 1] - time_s[starts] >= min_duration_s
+    edges = np.zeros(len(values) + 1, dtype=np.int64)
+    np.add.at(edges, starts[long_runs], 1)
+    np.add.at(edges, ends[long_runs], -1)
+    return np.cumsum(edges[:-1]) > 0
+
+
+def reject_glitches(
+    frame: pd.DataFrame,
+    checks: Mapping[str, ChannelCheck] = CHANNEL_CHECKS,
+    names: Optional[Mapping[str, str]] = None,
+    time_column: str = "Time (s)",
+    file_column: str = "log_file",
+    report_rows: slice = slice(None),
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Mask glitched samples of every checked channel present in `frame`.
+
+    `names` maps the original CSV headers used by `checks` to the frame's
+    column names (e.g. `fueling_analysis.RENAMED_COLUMNS`); `time_column` is
+    looked up through it too. Returns the masked copy and a report with the
+    number of out-of-range, spike and flatline samples per channel (only
+    channels with at least one rejected sample are listed). Only `report_rows`
+    are counted, so streamed chunks padded with rows of their neighbours are
+    not reported twice.
+    """
+    names = names or {}
+    time_name = names.get(time_column, time_column)
+    time_s = frame[time_name].to_numpy(dtype=float) if time_name in frame.columns else None
+    starts, ends = file_bounds(frame, file_column)
+
+    masked = frame.copy()
+    report = []
+    for channel, check in checks.items():
+        column = names.get(channel, channel)
+        if column not in frame.columns:
+            continue
+        values = frame[column].to_numpy(dtype=float)
+        with np.errstate(invalid="ignore"):
+            out_of_range = np.zeros(len(values), dtype=bool)
+            if check.low is not None:
+                out_of_range |= values < check.low
+            if check.high is not None:
+                out_of_range |= values > check.high
+        spikes = np.zeros(len(values), dtype=bool)
+        flatlines = np.zeros(len(values), dtype=bool)
+        for start, end in zip(starts, ends):
+            segment = np.where(out_of_range[start:end], np.nan, values[start:end])
+            if check.spike_delta is not None:
+                spikes[start:end] = spike_mask(segment, check.spike_delta)
+            if check.flatline_s is not None and time_s is not None:
+                flatlines[start:end] = flatline_mask(values[start:end], time_s[start:end], check.flatline_s)
+
+        rejected = out_of_range | spikes | flatlines
+        if rejected.any():
+            masked[column] = np.where(rejected, np.nan, values)
+        out_of_range = out_of_range[report_rows]
+        spikes = spikes[report_rows]
+        flatlines = flatlines[report_rows]
+        rejected = rejected[report_rows]
+        if rejected.any():
+            report.append(
+                {
+                    "channel": channel,
+                    "out_of_range": int(out_of_range.sum()),
+                    "spikes": int((spikes & ~out_of_range).sum()),
+                    "flatlines": int((flatlines & ~out_of_range & ~spikes).sum()),
+                    "masked": int(rejected.sum()),
+                }
+            )
+    return masked, pd.DataFrame(report, columns=GLITCH_REPORT_COLUMNS)
+
+
+def merge_glitch_reports(reports: Iterable[Optional[pd.DataFrame]]) -> pd.DataFrame:
+    """
+    Sum `reject_glitches` reports (e.g. one per chunk or log file) per
+    channel, in order of first appearance; None entries are skipped.
+    """
+    frames = [report for report in reports if report is not None and not report.empty]
+    if not frames:
+        return pd.DataFrame(columns=GLITCH_REPORT_COLUMNS)
+    return pd.concat(frames, ignore_index=True).groupby("channel", sort=False, as_index=False).sum()
+
+
+def describe_glitches(report: pd.DataFrame, rows: int) -> str:
+    """One-paragraph text summary of a `reject_glitches` report."""
+    if report.empty:
+        return f"Data quality: no glitches found in {rows} samples."
+    lines = [f"Data quality: masked glitched samples in {rows} samples:"]
+    for item in report.itertuples(index=False):
+        lines.append(
+            f"  {item.channel}: {item.masked} masked "
+            f"({item.out_of_range} out of range, {item.spikes} spikes, {item.flatlines} flatlines)"
+        )
+    return "\n".join(lines)
@@ -11,15 +11,28 @@ logic for table relationships follows the documentation captured in
 from __future__ import annotations
 
 import argparse
-import json
-import math
+import time
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Sequence
+from typing import Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import pandas as pd
 
+from cell_binning import MISSING_INDEX, axis_indices, axis_lookup, bilinear_cells, bin_cells
+from cell_stats import LAMBDA_RATIO_RANGE, TRIM_PCT_RANGE, CellAccumulator, weighted_cell_stats
+from data_quality import SPIKE_WINDOW, describe_glitches, merge_glitch_reports, reject_glitches
+from log_cache import DEFAULT_CACHE_DIR, LogCache
+from log_resample import dwell_weights, resample_uniform
+from log_schema import COMPACT, EXACT, INTEGER, compact_frame, read_log
+from log_tail import LogTail
+from profiling import DISABLED, Profiler
+from run_length import run_lengths
+from signal_align import DEFAULT_MAX_LAMBDA_LAG, align_lambda, describe_lags
+from tune_file import TuneFile, parse_map_rows
+from tune_writer import MapCorrection, MapUpdate, write_tune
+
 
 # Column labels used by the Cobb-style datalogs present in this repo.
 REQUIRED_COLUMNS = [
@@ -44,8 +57,64 @@ RENAMED_COLUMNS = {
     "Throttle Position (%)": "throttle_pct",
     "Coolant Temperature (°C)": "ect_c",
     "Intake Air Temperature (°C)": "iat_c",
+    "Injector Pulse Width (ms)": "ipw_ms",
+}
+
+# Channels read from each datalog and the precision they are kept at (see
+# log_schema.py). Load, lambda, trims and throttle are binned or compared with
+# tune thresholds, so they stay float64.
+FUELING_CHANNELS = {
+    "Time (s)": EXACT,
+    "Load (MAF) (g/rev)": EXACT,
+    "Engine Speed (rpm)": INTEGER,
+    "Air/Fuel Sensor #1 (λ)": EXACT,
+    "Power Mode - Fuel Ratio Target (λ)": EXACT,
+    "Fuel Trim - Short Term (%)": EXACT,
+    "Fuel Trim - Long Term (%)": EXACT,
+    "Throttle Position (%)": EXACT,
+    "Coolant Temperature (°C)": INTEGER,
+    "Intake Air Temperature (°C)": INTEGER,
+    "Injector Pulse Width (ms)": COMPACT,
 }
 
+# Rows per chunk when --jobs is used without an explicit --chunk-size.
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Logging gaps longer than this restart the PE delay counter (seconds).
+PE_DELAY_MAX_GAP_S = 1.0
+
+# Seconds per step of the ECU's PE delay counter. The tune only stores the
+# counter thresholds (`pe_delay`), so this is an assumed 20 Hz routine: a
+# delay of N engages PE once the enable thresholds have held for (N - 1)
+# ticks, i.e. immediately for N = 1.
+PE_DELAY_TICK_S = 0.05
+
+# Rows of each neighbouring chunk that a streamed chunk is cleaned with, so
+# row-neighbour computations (glitch spike windows, dwell weights) see across
+# chunk edges.
+CHUNK_CONTEXT_ROWS = max(1, SPIKE_WINDOW // 2)
+
+# Seconds between summary updates in --follow mode.
+DEFAULT_FOLLOW_INTERVAL_S = 5.0
+
+
+@dataclass
+class PrepareOptions:
+    """Optional preprocessing steps applied by `prepare_logs`."""
+
+    align_lambda: bool = False  # shift wideband lambda back by its estimated lag
+    max_lambda_lag: int = DEFAULT_MAX_LAMBDA_LAG  # samples
+    lag_rpm_bands: Optional[Sequence[float]] = None  # per-band lag breakpoints
+    resample_period_s: Optional[float] = None  # uniform timebase for all channels
+    dwell_weighting: bool = False  # weight each row by the time it represents
+    interpolate_cells: bool = False  # spread each row over 4 cells by bilinear weight
+    reject_glitches: bool = True  # mask sensor spikes, flatlines and out-of-range values
+
+    @property
+    def weighted(self) -> bool:
+        """Whether per-cell statistics are weighted rather than per-sample."""
+        return self.dwell_weighting or self.interpolate_cells
+
 
 @dataclass
 class TuneFuelBase:
@@ -76,37 +145,28 @@ class TuneFuelBase:
             return float('inf')  # Disable if RPM out of range
         return float(self.pe_enable_tps[idx])
 
+    def pe_enable_load_for(self, rpm: np.ndarray) -> np.ndarray:
+        """Vectorized `pe_enable_load_at_rpm` for a whole RPM column."""
+        return axis_lookup(rpm, self.rpm_axis, self.pe_enable_load)
+
+    def pe_enable_tps_for(self, rpm: np.ndarray) -> np.ndarray:
+        """Vectorized `pe_enable_tps_at_rpm` for a whole RPM column."""
+        return axis_lookup(rpm, self.rpm_axis, self.pe_enable_tps)
 
-def parse_numeric_rows(rows: Sequence[str]) -> np.ndarray:
-    parsed: List[List[float]] = []
-    for row in rows:
-        numbers = [float(item.strip()) for item in row.split(",") if item.strip()]
-        if numbers:
-            parsed.append(numbers)
-    return np.array(parsed, dtype=float)
 
+def parse_numeric_rows(rows: Sequence[str]) -> np.ndarray:
+    return parse_map_rows(rows)
 
-def load_tune(tune_path: Path) -> TuneFuelBase:
-    with tune_path.open("r", encoding="utf-8") as handle:
-        payload = json.load(handle)
 
-    map_lookup: Dict[str, Dict[str, Sequence[str]]] = {
-        entry["id"]: entry for entry in payload["maps"]
-    }
+def load_tune(tune_path: Union[Path, TuneFile]) -> TuneFuelBase:
+    tune_file = tune_path if isinstance(tune_path, TuneFile) else TuneFile.load(tune_path)
 
-    try:
-        rpm_axis = parse_numeric_rows(map_lookup["base_spark_rpm_index"]["data"])[0]
-        load_axis = parse_numeric_rows(map_lookup["base_spark_map_index"]["data"])[0]
-        fuel_base = parse_numeric_rows(map_lookup["fuel_base"]["data"])
-        pe_enable_load = parse_numeric_rows(map_lookup["pe_enable_load"]["data"])[0]
-        pe_enable_tps = parse_numeric_rows(map_lookup["pe_enable_tps"]["data"])[0]
-        pe_delay = parse_numeric_rows(map_lookup["pe_delay"]["data"])[0]
-        pe_delay_index = parse_numeric_rows(map_lookup["pe_delay_index"]["data"])[0]
-    except KeyError as exc:
-        missing = exc.args[0]
-        raise KeyError(
-            f"Required map '{missing}' not found in tune file '{tune_path}'."
-        ) from exc
+    rpm_axis, load_axis = tune_file.axis_arrays("fuel_base")
+    fuel_base = tune_file.array("fuel_base")
+    pe_enable_load = tune_file.vector("pe_enable_load")
+    pe_enable_tps = tune_file.vector("pe_enable_tps")
+    pe_delay = tune_file.vector("pe_delay")
+    (pe_delay_index,) = tune_file.axis_arrays("pe_delay")
 
     if fuel_base.shape != (len(rpm_axis), len(load_axis)):
         raise ValueError(
@@ -142,26 +202,35 @@ def load_tune(tune_path: Path) -> TuneFuelBase:
 
 
 def axis_index(value: float, axis: np.ndarray, clamp: bool = True) -> Optional[int]:
-    if math.isnan(value):
-        return None
-    if value < axis[0]:
-        return 0 if clamp else None
-    if value > axis[-1]:
-        return len(axis) - 1 if clamp else None
-    idx = int(np.searchsorted(axis, value, side="right") - 1)
-    return max(0, min(idx, len(axis) - 1))
+    """Scalar form of `cell_binning.axis_indices`; returns None when unmapped."""
+    idx = int(axis_indices(np.array([value], dtype=float), axis, clamp)[0])
+    return None if idx == MISSING_INDEX else idx
+
+
+def _check_columns(columns: Iterable[str], path: Path) -> None:
+    missing = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if missing:
+        raise ValueError(
+            f"Missing columns {missing} in datalog '{path}'. "
+            "Update REQUIRED_COLUMNS if needed."
+        )
 
 
-def load_logs(csv_paths: Iterable[Path]) -> pd.DataFrame:
+def load_logs(
+    csv_paths: Iterable[Path],
+    cache: Optional[LogCache] = None,
+    channels: Optional[Mapping[str, str]] = FUELING_CHANNELS,
+) -> pd.DataFrame:
+    """
+    Load and rename datalogs, reading only `channels` (all columns when None).
+
+    Analyzers that need more channels pass `log_schema.merge_channels` of
+    `FUELING_CHANNELS` and their own declaration.
+    """
     frames: List[pd.DataFrame] = []
     for path in csv_paths:
-        frame = pd.read_csv(path)
-        missing = [col for col in REQUIRED_COLUMNS if col not in frame.columns]
-        if missing:
-            raise ValueError(
-                f"Missing columns {missing} in datalog '{path}'. "
-                "Update REQUIRED_COLUMNS if needed."
-            )
+        frame = read_log(path, channels, cache)
+        _check_columns(frame.columns, path)
         frame = frame.rename(columns=RENAMED_COLUMNS)
         frame["log_file"] = path.name
         frames.append(frame)
@@ -170,9 +239,522 @@ def load_logs(csv_paths: Iterable[Path]) -> pd.DataFrame:
     return pd.concat(frames, ignore_index=True)
 
 
+def iter_log_chunks(
+    path: Path,
+    chunk_size: int,
+    cache: Optional[LogCache] = None,
+    channels: Optional[Mapping[str, str]] = FUELING_CHANNELS,
+) -> Iterator[pd.DataFrame]:
+    """Yield the `channels` of a datalog in renamed chunks of at most `chunk_size` rows."""
+    if cache is not None:
+        names = None if channels is None else [cache.renames.get(channel, channel) for channel in channels]
+        arrays = cache.load_columns(path, names)
+        meta = cache.column_meta(path)
+        _check_columns([meta[name]["source"] for name in arrays], path)
+        renamed_channels = {
+            cache.renames.get(channel, channel): precision for channel, precision in (channels or {}).items()
+        }
+        rows = len(next(iter(arrays.values()))) if arrays else 0
+        for start in range(0, rows, chunk_size):
+            chunk = pd.DataFrame(
+                {
+                    name: cache.restore(stored[start : start + chunk_size], meta[name])
+                    for name, stored in arrays.items()
+                },
+                index=pd.RangeIndex(start, min(start + chunk_size, rows)),
+            )
+            chunk = compact_frame(chunk, renamed_channels)
+            chunk["log_file"] = path.name
+            yield chunk
+        return
+
+    usecols = None if channels is None else (lambda column: column in channels)
+    with pd.read_csv(path, chunksize=chunk_size, usecols=usecols) as reader:
+        for chunk in reader:
+            _check_columns(chunk.columns, path)
+            chunk = compact_frame(chunk, channels or {})
+            chunk = chunk.rename(columns=RENAMED_COLUMNS)
+            chunk["log_file"] = path.name
+            yield chunk
+
+
+def clean_logs(
+    logs: pd.DataFrame,
+    options: Optional[PrepareOptions] = None,
+    context: Tuple[int, int] = (0, 0),
+) -> Tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+    """
+    Tune-independent preprocessing: sensor-glitch rejection, optional
+    resampling, dwell weights and lambda alignment, then dropping unusable rows
+    and deriving the combined trim.
+
+    `context` is the number of rows at the start and end of `logs` that come
+    from the neighbouring chunks of a streamed log (see `chunks_with_context`).
+    They complete the glitch filter's rolling windows and the dwell-time
+    neighbours of the chunk's edge rows, and are dropped from the result and
+    the glitch report.
+
+    Returns the cleaned frame and the `reject_glitches` report (None when
+    glitch rejection is off).
+    """
+    options = options or PrepareOptions()
+    lead, trail = context
+    core = slice(lead, len(logs) - trail)
+    glitches = None
+    if options.reject_glitches:
+        logs, glitches = reject_glitches(logs, names=RENAMED_COLUMNS, report_rows=core)
+    weights = None
+    if options.dwell_weighting and not options.resample_period_s:
+        weights = dwell_weights(logs)[core]
+    logs = logs.iloc[core]
+    if options.resample_period_s:
+        logs = resample_uniform(logs, options.resample_period_s)
+    if options.dwell_weighting:
+        logs = logs.copy()
+        logs["weight"] = weights if weights is not None else dwell_weights(logs)
+    if options.align_lambda:
+        logs = logs.copy()
+        logs["lambda_actual"], logs["lambda_lag"] = align_lambda(
+            logs, options.max_lambda_lag, options.lag_rpm_bands
+        )
+
+    logs = logs.dropna(
+        subset=["rpm", "load_g_rev", "lambda_actual", "lambda_target"]
+    ).copy()
+    logs["stft"] = logs["stft"].fillna(0.0)
+    logs["ltft"] = logs["ltft"].fillna(0.0)
+    logs["combined_trim"] = logs["stft"] + logs["ltft"]
+    return logs, glitches
+
+
+def chunks_with_context(
+    chunks: Iterable[pd.DataFrame], rows: int = CHUNK_CONTEXT_ROWS
+) -> Iterator[Tuple[pd.DataFrame, Tuple[int, int]]]:
+    """
+    Pad each chunk of one log with up to `rows` rows of the previous and next
+    chunk, for `clean_logs(chunk, options, context)`.
+
+    Reads one chunk ahead. Yields the padded chunk and its `context`.
+    """
+    previous = None
+    current = None
+    for upcoming in chunks:
+        if current is not None:
+            yield _pad_chunk(previous, current, upcoming, rows)
+            previous = current if previous is None else pd.concat([previous, current]).tail(rows)
+        current = upcoming
+    if current is not None:
+        yield _pad_chunk(previous, current, None, rows)
+
+
+def _pad_chunk(
+    previous: Optional[pd.DataFrame],
+    current: pd.DataFrame,
+    upcoming: Optional[pd.DataFrame],
+    rows: int,
+) -> Tuple[pd.DataFrame, Tuple[int, int]]:
+    lead = previous.tail(rows) if previous is not None and rows else None
+    trail = upcoming.head(rows) if upcoming is not None and rows else None
+    parts = [part for part in (lead, current, trail) if part is not None and not part.empty]
+    padded = pd.concat(parts) if len(parts) > 1 else current
+    return padded, (0 if lead is None else len(lead), 0 if trail is None else len(trail))
+
+
+def bin_logs(logs: pd.DataFrame, tune: TuneFuelBase) -> pd.DataFrame:
+    """Add `rpm_idx`/`load_idx` for the tune's fuel_base axes and drop unmapped rows."""
+    rpm_idx, load_idx = bin_cells(
+        logs["rpm"].to_numpy(dtype=float),
+        logs["load_g_rev"].to_numpy(dtype=float),
+        tune.rpm_axis,
+        tune.load_axis,
+    )
+    logs = logs.copy()
+    logs["rpm_idx"] = rpm_idx
+    logs["load_idx"] = load_idx
+    return logs[(rpm_idx != MISSING_INDEX) & (load_idx != MISSING_INDEX)].copy()
+
+
+def classify_logs(
+    logs: pd.DataFrame, tune: TuneFuelBase, pe_carry: Optional[PeDelayCarry] = None
+) -> pd.DataFrame:
+    """
+    Add the PE enable run length (`pe_run`, samples), how long the enable
+    thresholds have held (`pe_held_s`) and `loop_state` for a tune.
+    """
+    logs = logs.copy()
+    pe_run = pe_enable_run_length(logs, tune, pe_carry)
+    logs["pe_run"] = pe_run
+    logs["pe_held_s"] = pe_enable_held_s(logs, pe_run, pe_carry)
+    logs["loop_state"] = classify_loop_state(logs, tune, logs["pe_held_s"].to_numpy())
+    return logs
+
+
+def prepare_logs(
+    logs: pd.DataFrame,
+    tune: TuneFuelBase,
+    pe_carry: Optional[PeDelayCarry] = None,
+    options: Optional[PrepareOptions] = None,
+) -> pd.DataFrame:
+    """
+    Drop unusable rows, derive trims and cell indices, and classify loop state.
+
+    `pe_carry` continues the PE delay counter from the previous chunk of a
+    streamed log (see `pe_delay_carry`). When `options.align_lambda` is set,
+    wideband lambda is shifted back by its estimated lag before binning; in
+    streaming mode the lag is estimated per chunk and the last `lag` rows of
+    each chunk are dropped.
+
+    `options.resample_period_s` first puts each log on a uniform timebase, and
+    `options.dwell_weighting` adds a `weight` column (dwell time in units of
+    `log_resample.DWELL_REFERENCE_S`) that the per-cell summaries use instead
+    of equal weights. In streaming mode both are applied per chunk.
+
+    The stages are also available separately (`clean_logs`, `bin_logs`,
+    `classify_logs`) so callers evaluating several tunes can share the
+    tune-independent work; `clean_logs` also returns the glitch report, which
+    this function drops.
+    """
+    cleaned, _ = clean_logs(logs, options)
+    return classify_logs(bin_logs(cleaned, tune), tune, pe_carry)
+
+
+def split_loop_rows(logs: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Split prepared rows into open-loop (with `lambda_ratio`) and closed-loop rows."""
+    open_rows = logs[logs["loop_state"] == "open"].copy()
+    open_rows = open_rows[open_rows["lambda_target"] > 0]
+    open_rows["lambda_ratio"] = open_rows["lambda_actual"] / open_rows["lambda_target"]
+
+    closed_rows = logs[logs["loop_state"] == "closed"].copy()
+    return open_rows, closed_rows
+
+
+def spread_bilinear(rows: pd.DataFrame, tune: TuneFuelBase) -> pd.DataFrame:
+    """
+    Split every row over the four `fuel_base` cells the ECU interpolates between.
+
+    Each row is repeated once per surrounding cell with `rpm_idx`/`load_idx`
+    replaced and `weight` set to its bilinear weight (times any existing dwell
+    weight). Contributions with zero weight are dropped.
+    """
+    if rows.empty:
+        return rows.assign(weight=np.zeros(0))
+    rpm_idx, load_idx, weight = bilinear_cells(
+        rows["rpm"].to_numpy(dtype=float),
+        rows["load_g_rev"].to_numpy(dtype=float),
+        tune.rpm_axis,
+        tune.load_axis,
+    )
+    base_weight = _row_weights(rows)
+    if base_weight is not None:
+        weight = weight * base_weight[:, None]
+
+    keep = weight.ravel() > 0
+    spread = rows.iloc[np.repeat(np.arange(len(rows)), 4)[keep]].copy()
+    spread["rpm_idx"] = rpm_idx.ravel()[keep]
+    spread["load_idx"] = load_idx.ravel()[keep]
+    spread["weight"] = weight.ravel()[keep]
+    return spread
+
+
+def create_accumulators(
+    tune: TuneFuelBase, weighted: bool = False
+) -> Tuple[CellAccumulator, CellAccumulator]:
+    """Empty (open-loop lambda ratio, closed-loop trim) accumulators for the tune's axes."""
+    shape = (len(tune.rpm_axis), len(tune.load_axis))
+    return (
+        CellAccumulator.create(shape, LAMBDA_RATIO_RANGE, weighted=weighted),
+        CellAccumulator.create(shape, TRIM_PCT_RANGE, weighted=weighted),
+    )
+
+
+def _row_weights(rows: pd.DataFrame) -> Optional[np.ndarray]:
+    return rows["weight"].to_numpy(dtype=float) if "weight" in rows.columns else None
+
+
+@dataclass
+class LogAccumulators:
+    """Open/closed-loop accumulators of streamed logs, with the rows read and their glitch report."""
+
+    open_acc: CellAccumulator
+    closed_acc: CellAccumulator
+    rows: int = 0
+    glitches: Optional[pd.DataFrame] = None  # None when glitch rejection is off
+
+    @classmethod
+    def create(cls, tune: TuneFuelBase, weighted: bool = False) -> "LogAccumulators":
+        return cls(*create_accumulators(tune, weighted))
+
+    def add_rows(self, rows: int, glitches: Optional[pd.DataFrame]) -> None:
+        """Count `rows` read from a log and merge the glitch report of their chunk."""
+        self.rows += rows
+        if glitches is not None:
+            self.glitches = merge_glitch_reports([self.glitches, glitches])
+
+    def update(self, prepared: pd.DataFrame, tune: TuneFuelBase, interpolate_cells: bool) -> None:
+        """Fold rows prepared by `prepare_logs` into the accumulators."""
+        open_rows, closed_rows = split_loop_rows(prepared)
+        if interpolate_cells:
+            open_rows = spread_bilinear(open_rows, tune)
+            closed_rows = spread_bilinear(closed_rows, tune)
+        self.open_acc.update(
+            open_rows["rpm_idx"],
+            open_rows["load_idx"],
+            open_rows["lambda_ratio"],
+            _row_weights(open_rows),
+        )
+        self.closed_acc.update(
+            closed_rows["rpm_idx"],
+            closed_rows["load_idx"],
+            closed_rows["combined_trim"],
+            _row_weights(closed_rows),
+        )
+
+    def merge(self, other: "LogAccumulators") -> None:
+        self.open_acc.merge(other.open_acc)
+        self.closed_acc.merge(other.closed_acc)
+        self.add_rows(other.rows, other.glitches)
+
+
+def accumulate_log(
+    path: Path,
+    tune: TuneFuelBase,
+    chunk_size: int,
+    cache: Optional[LogCache] = None,
+    options: Optional[PrepareOptions] = None,
+    profiler: Profiler = DISABLED,
+) -> LogAccumulators:
+    """
+    Stream one datalog into fresh open/closed-loop accumulators.
+
+    The `prepare_logs` steps run one by one so each chunk's time is recorded
+    per stage by `profiler`. Chunks are cleaned with `CHUNK_CONTEXT_ROWS` rows
+    of their neighbours (`chunks_with_context`), so edge rows get the same
+    spike checks and dwell weights as in an in-memory run. The glitch reports of all chunks are
+    merged into the result.
+    """
+    options = options or PrepareOptions()
+    result = LogAccumulators.create(tune, options.weighted)
+    pe_carry: Optional[PeDelayCarry] = None
+    chunks = chunks_with_context(profiler.iterate("load", iter_log_chunks(path, chunk_size, cache)))
+    for chunk, context in chunks:
+        rows = len(chunk) - sum(context)
+        with profiler.stage("filter", rows):
+            cleaned, glitches = clean_logs(chunk, options, context)
+        result.add_rows(rows, glitches)
+        with profiler.stage("bin", len(cleaned)):
+            binned = bin_logs(cleaned, tune)
+        with profiler.stage("classify", len(binned)):
+            prepared = classify_logs(binned, tune, pe_carry)
+        pe_carry = pe_delay_carry(prepared) or pe_carry
+        with profiler.stage("summarize", len(prepared)):
+            result.update(prepared, tune, options.interpolate_cells)
+    return result
+
+
+def accumulate_logs(
+    csv_paths: Iterable[Path],
+    tune: TuneFuelBase,
+    chunk_size: int,
+    jobs: int = 1,
+    cache: Optional[LogCache] = None,
+    options: Optional[PrepareOptions] = None,
+    profiler: Profiler = DISABLED,
+) -> LogAccumulators:
+    """
+    Stream datalogs chunk by chunk into per-cell accumulators.
+
+    Memory use is bounded by `chunk_size` and the table shape rather than by the
+    total log volume. Each file is reduced on its own and the partial
+    accumulators are merged in input order, so running the per-file reduction
+    in `jobs` worker processes gives exactly the same result as the serial path.
+    Worker processes are profiled as a single `accumulate` stage.
+    """
+    paths = list(csv_paths)
+    if not paths:
+        raise ValueError("No datalogs were loaded.")
+
+    if jobs > 1 and len(paths) > 1:
+        with profiler.stage("accumulate"), ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as pool:
+            partials = list(
+                pool.map(
+                    accumulate_log,
+                    paths,
+                    [tune] * len(paths),
+                    [chunk_size] * len(paths),
+                    [cache] * len(paths),
+                    [options] * len(paths),
+                )
+            )
+    else:
+        partials = [
+            accumulate_log(path, tune, chunk_size, cache, options, profiler) for path in paths
+        ]
+
+    result = LogAccumulators.create(tune, weighted=options is not None and options.weighted)
+    for partial in partials:
+        result.merge(partial)
+    return result
+
+
+def follow_log(
+    path: Path,
+    tune: TuneFuelBase,
+    min_samples: int,
+    output_path: Optional[Path] = None,
+    interval_s: float = DEFAULT_FOLLOW_INTERVAL_S,
+    idle_timeout_s: Optional[float] = None,
+    options: Optional[PrepareOptions] = None,
+) -> LogAccumulators:
+    """
+    Follow a datalog that is still being written and keep the summary current.
+
+    Every `interval_s` seconds only the newly appended rows are parsed
+    (`log_tail.LogTail`), prepared with the PE delay state and the last rows
+    carried from the previous batch, and folded into the open/closed-loop
+    accumulators; the report is then re-rendered. Later rows are not known
+    yet, so the newest rows of each batch are cleaned without their next
+    neighbours. Stops on Ctrl-C, or once no rows have arrived for
+    `idle_timeout_s` seconds, and returns the final accumulators.
+    """
+    options = options or PrepareOptions()
+    tail = LogTail(path, FUELING_CHANNELS)
+    result = LogAccumulators.create(tune, options.weighted)
+    pe_carry: Optional[PeDelayCarry] = None
+    previous: Optional[pd.DataFrame] = None
+    last_rows = time.monotonic()
+    print(f"Following {path} (summary every {interval_s:g} s, Ctrl-C to stop)...")
+    try:
+        while True:
+            chunk = tail.poll()
+            if tail.restarted:
+                print(f"{path} was truncated; restarting the analysis.")
+                result = LogAccumulators.create(tune, options.weighted)
+                pe_carry = None
+                previous = None
+                tail.restarted = False
+            if not chunk.empty:
+                _check_columns(chunk.columns, path)
+                chunk = compact_frame(chunk, FUELING_CHANNELS).rename(columns=RENAMED_COLUMNS)
+                chunk["log_file"] = path.name
+                padded, context = _pad_chunk(previous, chunk, None, CHUNK_CONTEXT_ROWS)
+                previous = chunk if previous is None else pd.concat([previous, chunk]).tail(CHUNK_CONTEXT_ROWS)
+                cleaned, glitches = clean_logs(padded, options, context)
+                result.add_rows(len(chunk), glitches)
+                prepared = classify_logs(bin_logs(cleaned, tune), tune, pe_carry)
+                pe_carry = pe_delay_carry(prepared) or pe_carry
+                result.update(prepared, tune, options.interpolate_cells)
+                last_rows = time.monotonic()
+                print(f"\n--- {time.strftime('%H:%M:%S')}: {tail.rows_read} rows ---")
+                generate_report(
+                    summarize_open_loop_stats(result.open_acc, tune, min_samples),
+                    summarize_closed_loop_stats(result.closed_acc, tune, min_samples),
+                    output_path,
+                )
+            elif idle_timeout_s is not None and time.monotonic() - last_rows >= idle_timeout_s:
+                print(f"No new rows for {idle_timeout_s:g} s; stopping.")
+                break
+            time.sleep(interval_s)
+    except KeyboardInterrupt:
+        print("Stopped following.")
+    return result
+
+
+@dataclass
+class PeDelayCarry:
+    """PE enable run state at the end of a chunk, carried into the next chunk."""
+
+    run: int
+    time_s: float
+    log_file: Optional[str]
+    run_start_s: float = np.nan  # time of the first sample of the current run
+
+
+def _sample_breaks(df: pd.DataFrame, carry: Optional[PeDelayCarry]) -> np.ndarray:
+    """Samples where the time series restarts: new log file, time reset or logging gap."""
+    n = len(df)
+    breaks = np.zeros(n, dtype=bool)
+    if n == 0:
+        return breaks
+    previous_file = carry.log_file if carry is not None else None
+    previous_time = carry.time_s if carry is not None else np.nan
+
+    if "log_file" in df.columns:
+        files = df["log_file"].to_numpy()
+        breaks[1:] |= files[1:] != files[:-1]
+        breaks[0] |= carry is not None and files[0] != previous_file
+    if "time_s" in df.columns:
+        time_s = df["time_s"].to_numpy(dtype=float)
+        step = np.diff(time_s, prepend=previous_time)
+        breaks |= (step < 0) | (step > PE_DELAY_MAX_GAP_S)
+    if carry is None:
+        breaks[0] = True
+    return breaks
+
+
+def pe_enable_run_length(
+    df: pd.DataFrame,
+    tune: TuneFuelBase,
+    carry: Optional[PeDelayCarry] = None,
+) -> np.ndarray:
+    """
+    Consecutive samples (including the current one) meeting the PE enable thresholds.
+
+    Runs restart at log file boundaries, when time goes backwards and across
+    logging gaps longer than PE_DELAY_MAX_GAP_S. `carry` continues a run from
+    the previous chunk of the same log.
+    """
+    rpm = df["rpm"].to_numpy(dtype=float)
+    enable = (
+        (df["load_g_rev"].to_numpy(dtype=float) >= tune.pe_enable_load_for(rpm))
+        & (df["throttle_pct"].to_numpy(dtype=float) >= tune.pe_enable_tps_for(rpm))
+    )
+    initial = carry.run if carry is not None else 0
+    return run_lengths(enable, _sample_breaks(df, carry), initial)
+
+
+def pe_enable_held_s(
+    df: pd.DataFrame, pe_run: np.ndarray, carry: Optional[PeDelayCarry] = None
+) -> np.ndarray:
+    """
+    Seconds the PE enable thresholds have held at each sample, measured on
+    `time_s` from the first sample of the run (`pe_run` from
+    `pe_enable_run_length`): 0 at the first sample of a run and NaN outside
+    runs.
+
+    Runs continuing from the previous chunk are measured from
+    `carry.run_start_s`. Where the time is unknown every sample counts as one
+    `PE_DELAY_TICK_S`.
+    """
+    pe_run = np.asarray(pe_run, dtype=np.int64)
+    by_samples = (pe_run - 1) * PE_DELAY_TICK_S
+    if "time_s" in df.columns and len(pe_run):
+        time_s = df["time_s"].to_numpy(dtype=float)
+        start = np.arange(len(pe_run)) - (pe_run - 1)
+        carried_start = carry.run_start_s if carry is not None else np.nan
+        start_time = np.where(start >= 0, time_s[np.clip(start, 0, len(time_s) - 1)], carried_start)
+        held = time_s - start_time
+        by_samples = np.where(np.isfinite(held), held, by_samples)
+    return np.where(pe_run > 0, by_samples, np.nan)
+
+
+def pe_delay_carry(df: pd.DataFrame) -> Optional[PeDelayCarry]:
+    """Carry state from the last row of a frame prepared by `prepare_logs`."""
+    if df.empty:
+        return None
+    last = df.iloc[-1]
+    time_s = float(last["time_s"]) if "time_s" in df.columns else np.nan
+    return PeDelayCarry(
+        run=int(last["pe_run"]),
+        time_s=time_s,
+        log_file=last["log_file"] if "log_file" in df.columns else None,
+        run_start_s=time_s - float(last["pe_held_s"]),
+    )
+
+
 def classify_loop_state(
     df: pd.DataFrame,
     tune: TuneFuelBase,
+    pe_held_s: Optional[np.ndarray] = None,
 ) -> pd.Series:
     """
     Classify loop state using PE enable conditions from the tune file.
@@ -180,36 +762,59 @@ def classify_loop_state(
     PE (open loop) is active when:
     - Load >= pe_enable_load threshold for current RPM
     - TPS >= pe_enable_tps threshold for current RPM
+    - Both thresholds have held for the pe_delay counter, looked up by RPM on
+      pe_delay_index: (pe_delay - 1) * PE_DELAY_TICK_S seconds of `time_s`
     - Lambda target indicates PE mode (lambda_target < 1.0, typically)
     
-    Note: PE delay logic is simplified - we check if current conditions
-    meet the enable thresholds. The actual delay counters would require
-    tracking state transitions over time.
+    The hold time comes from runs over the time series (see
+    `pe_enable_run_length` and `pe_enable_held_s`), so PE engagement does not
+    depend on the logging rate or `--resample-ms`. Pass `pe_held_s` to reuse
+    precomputed hold times, e.g. when a chunk continues a run from the
+    previous chunk.
     """
-    # Get PE enable thresholds for each row's RPM
-    pe_load_thresholds = df["rpm"].apply(
-        lambda rpm: tune.pe_enable_load_at_rpm(rpm)
-    )
-    pe_tps_thresholds = df["rpm"].apply(
-        lambda rpm: tune.pe_enable_tps_at_rpm(rpm)
-    )
+    if pe_held_s is None:
+        pe_held_s = pe_enable_held_s(df, pe_enable_run_length(df, tune))
+
+    # Hold time the PE delay counter requires at each row's RPM
+    rpm = df["rpm"].to_numpy(dtype=float)
+    pe_delay = np.maximum(axis_lookup(rpm, tune.pe_delay_index, tune.pe_delay), 1.0)
+    required_s = (pe_delay - 1.0) * PE_DELAY_TICK_S
     
-    # Check if PE conditions are met
-    # PE is active when load and TPS exceed thresholds, and lambda target indicates PE
+    # PE is active once the enable thresholds have held long enough, and lambda target indicates PE
     open_loop = (
-        (df["load_g_rev"] >= pe_load_thresholds)
-        & (df["throttle_pct"] >= pe_tps_thresholds)
-        & (df["lambda_target"] < 1.0)  # PE mode typically targets lambda < 1.0
+        (pe_held_s >= required_s - 1e-9)  # NaN outside runs; tolerate float error in times
+        & (df["lambda_target"].to_numpy(dtype=float) < 1.0)  # PE mode typically targets lambda < 1.0
     )
     
     return np.where(open_loop, "open", "closed")
 
 
 def summarize_open_loop(
-    df: pd.DataFrame, tune: TuneFuelBase, min_samples: int
+    df: pd.DataFrame,
+    tune: TuneFuelBase,
+    min_samples: int,
+    fast_quantiles: bool = False,
 ) -> pd.DataFrame:
+    """
+    Per-cell open-loop lambda ratio summary.
+
+    With `fast_quantiles`, median/p95 come from per-cell quantile sketches
+    instead of a per-group percentile (see `cell_stats.QuantileSketch`). When
+    the rows carry a `weight` column (dwell weighting), the statistics are
+    weighted and `min_samples` applies to the per-cell weight total.
+    """
     if df.empty:
         return pd.DataFrame()
+    weights = _row_weights(df)
+    if fast_quantiles:
+        accumulator, _ = create_accumulators(tune, weighted=weights is not None)
+        accumulator.update(df["rpm_idx"], df["load_idx"], df["lambda_ratio"], weights)
+        return summarize_open_loop_stats(accumulator, tune, min_samples)
+    if weights is not None:
+        grouped = weighted_cell_stats(
+            df["rpm_idx"], df["load_idx"], df["lambda_ratio"], weights
+        ).rename(columns={"mean": "mean_ratio", "median": "median_ratio", "p95": "p95_ratio"})
+        return _finish_open_summary(grouped, tune, min_samples)
 
     grouped = (
         df.groupby(["rpm_idx", "load_idx"])
@@ -221,20 +826,39 @@ def summarize_open_loop(
         )
         .reset_index()
     )
+    return _finish_open_summary(grouped, tune, min_samples)
+
 
-    grouped = grouped[grouped["samples"] >= min_samples]
+def summarize_open_loop_stats(
+    accumulator: CellAccumulator, tune: TuneFuelBase, min_samples: int
+) -> pd.DataFrame:
+    """`summarize_open_loop` computed from a streaming accumulator."""
+    stats = accumulator.to_frame()
+    if stats.empty:
+        return pd.DataFrame()
+    grouped = stats.rename(
+        columns={"mean": "mean_ratio", "median": "median_ratio", "p95": "p95_ratio"}
+    ).drop(columns="std")
+    return _finish_open_summary(grouped, tune, min_samples)
+
+
+def _support_column(grouped: pd.DataFrame) -> str:
+    """Column compared against `min_samples`: the weight total when weighted."""
+    return "weight" if "weight" in grouped.columns else "samples"
+
+
+def _finish_open_summary(
+    grouped: pd.DataFrame, tune: TuneFuelBase, min_samples: int
+) -> pd.DataFrame:
+    grouped = grouped[grouped[_support_column(grouped)] >= min_samples].copy()
     if grouped.empty:
         return grouped
 
-    grouped["rpm_axis"] = grouped["rpm_idx"].apply(
-        lambda idx: int(tune.rpm_axis[int(idx)])
-    )
-    grouped["load_axis"] = grouped["load_idx"].apply(
-        lambda idx: round(float(tune.load_axis[int(idx)]), 3)
-    )
-    grouped["current_fuel_base"] = grouped.apply(
-        lambda row: tune.value(int(row["rpm_idx"]), int(row["load_idx"])), axis=1
-    )
+    rpm_idx = grouped["rpm_idx"].to_numpy(dtype=int)
+    load_idx = grouped["load_idx"].to_numpy(dtype=int)
+    grouped["rpm_axis"] = tune.rpm_axis[rpm_idx].astype(int)
+    grouped["load_axis"] = np.round(tune.load_axis[load_idx], 3)
+    grouped["current_fuel_base"] = tune.fuel_base[rpm_idx, load_idx]
     grouped["mean_error_pct"] = (grouped["mean_ratio"] - 1.0) * 100.0
     grouped["suggested_fuel_base"] = (
         grouped["current_fuel_base"] * grouped["mean_ratio"]
@@ -245,10 +869,24 @@ def summarize_open_loop(
 
 
 def summarize_closed_loop(
-    df: pd.DataFrame, tune: TuneFuelBase, min_samples: int
+    df: pd.DataFrame,
+    tune: TuneFuelBase,
+    min_samples: int,
+    fast_quantiles: bool = False,
 ) -> pd.DataFrame:
+    """Per-cell closed-loop trim summary; see `summarize_open_loop` for `fast_quantiles` and weights."""
     if df.empty:
         return pd.DataFrame()
+    weights = _row_weights(df)
+    if fast_quantiles:
+        _, accumulator = create_accumulators(tune, weighted=weights is not None)
+        accumulator.update(df["rpm_idx"], df["load_idx"], df["combined_trim"], weights)
+        return summarize_closed_loop_stats(accumulator, tune, min_samples)
+    if weights is not None:
+        grouped = weighted_cell_stats(
+            df["rpm_idx"], df["load_idx"], df["combined_trim"], weights
+        ).rename(columns={"mean": "mean_trim", "median": "median_trim", "p95": "p95_trim"})
+        return _finish_closed_summary(grouped, tune, min_samples)
 
     grouped = (
         df.groupby(["rpm_idx", "load_idx"])
@@ -260,20 +898,34 @@ def summarize_closed_loop(
         )
         .reset_index()
     )
+    return _finish_closed_summary(grouped, tune, min_samples)
+
 
-    grouped = grouped[grouped["samples"] >= min_samples]
+def summarize_closed_loop_stats(
+    accumulator: CellAccumulator, tune: TuneFuelBase, min_samples: int
+) -> pd.DataFrame:
+    """`summarize_closed_loop` computed from a streaming accumulator."""
+    stats = accumulator.to_frame()
+    if stats.empty:
+        return pd.DataFrame()
+    grouped = stats.rename(
+        columns={"mean": "mean_trim", "median": "median_trim", "p95": "p95_trim"}
+    ).drop(columns="std")
+    return _finish_closed_summary(grouped, tune, min_samples)
+
+
+def _finish_closed_summary(
+    grouped: pd.DataFrame, tune: TuneFuelBase, min_samples: int
+) -> pd.DataFrame:
+    grouped = grouped[grouped[_support_column(grouped)] >= min_samples].copy()
     if grouped.empty:
         return grouped
 
-    grouped["rpm_axis"] = grouped["rpm_idx"].apply(
-        lambda idx: int(tune.rpm_axis[int(idx)])
-    )
-    grouped["load_axis"] = grouped["load_idx"].apply(
-        lambda idx: round(float(tune.load_axis[int(idx)]), 3)
-    )
-    grouped["current_fuel_base"] = grouped.apply(
-        lambda row: tune.value(int(row["rpm_idx"]), int(row["load_idx"])), axis=1
-    )
+    rpm_idx = grouped["rpm_idx"].to_numpy(dtype=int)
+    load_idx = grouped["load_idx"].to_numpy(dtype=int)
+    grouped["rpm_axis"] = tune.rpm_axis[rpm_idx].astype(int)
+    grouped["load_axis"] = np.round(tune.load_axis[load_idx], 3)
+    grouped["current_fuel_base"] = tune.fuel_base[rpm_idx, load_idx]
     grouped["suggested_fuel_base"] = (
         grouped["current_fuel_base"] * (1.0 + grouped["mean_trim"] / 100.0)
     )
@@ -286,6 +938,7 @@ def generate_report(
     open_summary: pd.DataFrame,
     closed_summary: pd.DataFrame,
     output_path: Optional[Path],
+    echo: bool = True,
 ) -> None:
     def _format(df: pd.DataFrame) -> str:
         if df.empty:
@@ -294,6 +947,7 @@ def generate_report(
             "rpm_axis",
             "load_axis",
             "samples",
+            *(["weight"] if "weight" in df.columns else []),
             "mean_error_pct" if "mean_error_pct" in df.columns else "mean_trim",
             "current_fuel_base",
             "suggested_fuel_base",
@@ -312,8 +966,9 @@ def generate_report(
         output_path.parent.mkdir(parents=True, exist_ok=True)
         output_path.write_text(open_section + "\n" + closed_section, encoding="utf-8")
 
-    print(open_section)
-    print(closed_section)
+    if echo:
+        print(open_section)
+        print(closed_section)
 
 
 def apply_fuel_base_modifications(
@@ -323,7 +978,8 @@ def apply_fuel_base_modifications(
     output_tune_path: Path,
     change_limit_pct: float = 5.0,
     modify_tune_path: Optional[Path] = None,
-) -> None:
+    source_tune: Optional[TuneFile] = None,
+) -> MapUpdate:
     """
     Apply fuel_base modifications from analysis summaries to create a new tune file.
     
@@ -339,6 +995,9 @@ def apply_fuel_base_modifications(
     always produce the same output, as it always uses the original source tune file's
     values as the baseline for change limit calculations.
     
+    The tune is written by `tune_writer.write_tune`, which can also update several
+    maps in one write.
+    
     Args:
         tune_path: Tune file used for analysis (baseline for fuel_base and limits)
         open_summary: Open-loop analysis summary
@@ -347,157 +1006,56 @@ def apply_fuel_base_modifications(
         change_limit_pct: Maximum percent change allowed (based on source tune file)
         modify_tune_path: Optional tune file used only as a template for non-fuel_base
             content. Fuel_base values are always derived from tune_path.
+        source_tune: Already-loaded TuneFile for tune_path, to avoid re-reading it.
+
+    Returns:
+        The fuel_base `MapUpdate`; `requested` is the number of distinct cells
+        modified, as printed in the "Applied N" line.
     """
-    # ALWAYS use tune_path as the source for fuel_base values and change limits
-    # This guarantees idempotency even when modify_tune_path points to a previously
-    # modified file.
-    source_tune_path = tune_path
-    
-    # Load the source tune file to get original baseline values
-    with source_tune_path.open("r", encoding="utf-8") as handle:
-        source_tune_data = json.load(handle)
-    
-    # Find the fuel_base map entry in the source tune file
-    source_fuel_base_map = None
-    for i, map_entry in enumerate(source_tune_data["maps"]):
-        if map_entry["id"] == "fuel_base":
-            source_fuel_base_map = map_entry
-            break
-    
-    if source_fuel_base_map is None:
-        raise ValueError(f"fuel_base map not found in source tune file '{source_tune_path}'")
-    
-    # Parse original fuel_base table from source tune file (used for change limit baseline)
-    source_fuel_base = parse_numeric_rows(source_fuel_base_map["data"])
-    
-    # Load or create the output tune file structure
-    # Priority:
-    #   1. If output file exists, modify it in-place (other maps preserved)
-    #   2. Else if modify_tune_path is provided, start from that as template
-    #   3. Else fall back to source_tune_data
-    if output_tune_path.exists():
-        with output_tune_path.open("r", encoding="utf-8") as handle:
-            tune_data = json.load(handle)
-    elif modify_tune_path is not None:
-        with modify_tune_path.open("r", encoding="utf-8") as handle:
-            tune_data = json.load(handle)
-    else:
-        tune_data = json.loads(json.dumps(source_tune_data))
-    
-    # Find the fuel_base map entry in the output tune file (for updating)
-    fuel_base_map = None
-    for i, map_entry in enumerate(tune_data["maps"]):
-        if map_entry["id"] == "fuel_base":
-            fuel_base_map = map_entry
-            break
-    
-    if fuel_base_map is None:
-        raise ValueError(f"fuel_base map not found in output tune file structure")
-    
-    # Always start from source tune file's fuel_base values for idempotency
-    # The output file is only used to preserve other settings, not fuel_base values
-    # This ensures running the script multiple times always produces the same result
-    modified_fuel_base = source_fuel_base.copy()
-    
-    # Create a lookup of modifications: (rpm_idx, load_idx) -> (suggested_value, source_original, source, rpm_axis, load_axis)
-    # We use raw suggested values from analysis for idempotent operation
-    modifications: Dict[tuple[int, int], tuple[float, float, str, float, float]] = {}
-    
-    # Add closed-loop modifications first
-    if not closed_summary.empty:
-        for _, row in closed_summary.iterrows():
-            rpm_idx = int(row["rpm_idx"])
-            load_idx = int(row["load_idx"])
-            # Get suggested value from analysis (raw value, not percent change)
-            suggested = float(row["suggested_fuel_base"])
-            # Get original from analysis tune (for change limit calculation)
-            analysis_original = float(row["current_fuel_base"])
-            rpm_axis = float(row["rpm_axis"])
-            load_axis = float(row["load_axis"])
-            modifications[(rpm_idx, load_idx)] = (suggested, analysis_original, "closed", rpm_axis, load_axis)
-    
-    # Override with open-loop modifications (PE takes precedence)
-    if not open_summary.empty:
-        for _, row in open_summary.iterrows():
-            rpm_idx = int(row["rpm_idx"])
-            load_idx = int(row["load_idx"])
-            # Get suggested value from analysis (raw value, not percent change)
-            suggested = float(row["suggested_fuel_base"])
-            # Get original from analysis tune (for change limit calculation)
-            analysis_original = float(row["current_fuel_base"])
-            rpm_axis = float(row["rpm_axis"])
-            load_axis = float(row["load_axis"])
-            modifications[(rpm_idx, load_idx)] = (suggested, analysis_original, "open", rpm_axis, load_axis)
-    
-    # Apply modifications with change limit (based on source tune file values)
-    clamped_modifications: List[Dict[str, Any]] = []
-    
-    for (rpm_idx, load_idx), (suggested, analysis_original, source, rpm_axis, load_axis) in modifications.items():
-        if 0 <= rpm_idx < modified_fuel_base.shape[0] and 0 <= load_idx < modified_fuel_base.shape[1]:
-            # Get the original value from the source tune file (for change limit baseline)
-            source_original = source_fuel_base[rpm_idx, load_idx]
-            
-            # Calculate percent change from source tune file (for limit checking)
-            change_pct = ((suggested - source_original) / source_original) * 100.0
-            
-            # Apply change limit (limit is based on source tune file values for idempotency)
-            if abs(change_pct) > change_limit_pct:
-                # Clamp to limit based on source tune file value
-                if change_pct > 0:
-                    clamped_value = source_original * (1.0 + change_limit_pct / 100.0)
-                else:
-                    clamped_value = source_original * (1.0 - change_limit_pct / 100.0)
-                
-                modified_fuel_base[rpm_idx, load_idx] = clamped_value
-                
-                # Track clamped modification
-                clamped_modifications.append({
-                    "rpm": rpm_axis,
-                    "load": load_axis,
-                    "original": source_original,
-                    "suggested": suggested,
-                    "clamped": clamped_value,
-                    "change_pct": change_pct,
-                    "source": source,
-                })
-            else:
-                # Within limit, apply raw suggested value directly (idempotent)
-                modified_fuel_base[rpm_idx, load_idx] = suggested
-    
-    # Convert back to string format (comma-separated rows)
-    fuel_base_strings = []
-    for row in modified_fuel_base:
-        row_str = ", ".join(f"{val:.1f}" for val in row)
-        fuel_base_strings.append(row_str)
-    
-    # Update the map entry
-    fuel_base_map["data"] = fuel_base_strings
-    
-    # Write the modified tune file
-    output_tune_path.parent.mkdir(parents=True, exist_ok=True)
-    with output_tune_path.open("w", encoding="utf-8") as handle:
-        json.dump(tune_data, handle, indent=1, ensure_ascii=False)
+    # ALWAYS use tune_path as the source for fuel_base values and change limits.
+    # tune_writer starts from the source values on every run, which guarantees
+    # idempotency even when modify_tune_path or an existing output file was
+    # produced by a previous run; those only supply the other maps.
+    source_tune = source_tune if source_tune is not None else TuneFile.load(tune_path)
+
+    # Closed-loop corrections first, so open-loop ones override them for
+    # cells in both summaries (PE takes precedence).
+    corrections = [
+        MapCorrection.from_summary(
+            "fuel_base",
+            summary,
+            "suggested_fuel_base",
+            ("rpm_idx", "load_idx"),
+            change_limit_pct,
+            source=source,
+            label_columns=("rpm_axis", "load_axis"),
+        )
+        for source, summary in (("closed", closed_summary), ("open", open_summary))
+    ]
+    update = write_tune(source_tune, corrections, output_tune_path, modify_tune_path)["fuel_base"]
     
     print(f"\nModified tune file saved to: {output_tune_path}")
     if modify_tune_path is not None:
         print(f"Source tune file for modifications: {modify_tune_path}")
     else:
         print(f"Source tune file for modifications: {tune_path}")
-    print(f"Applied {len(modifications)} fuel_base modifications (limit: +/-{change_limit_pct}% from source).")
+    print(f"Applied {update.requested} fuel_base modifications (limit: +/-{change_limit_pct}% from source).")
     print("Note: Modifications are idempotent - running multiple times produces the same result.")
     
     # Report clamped modifications
-    if clamped_modifications:
-        print(f"\nWARNING: {len(clamped_modifications)} modifications exceeded the +/-{change_limit_pct}% limit and were clamped:")
+    clamped = np.flatnonzero(update.clamped)
+    if len(clamped):
+        print(f"\nWARNING: {len(clamped)} modifications exceeded the +/-{change_limit_pct}% limit and were clamped:")
         print("   RPM     Load    Original  Suggested  Clamped   Change%  Source")
         print("   " + "-" * 65)
-        for mod in clamped_modifications:
+        for cell in clamped:
             print(
-                f"   {mod['rpm']:5.0f}   {mod['load']:5.3f}   "
-                f"{mod['original']:7.1f}   {mod['suggested']:8.1f}   "
-                f"{mod['clamped']:7.1f}   {mod['change_pct']:6.1f}%  {mod['source']}"
+                f"   {float(update.labels['rpm_axis'][cell]):5.0f}   {float(update.labels['load_axis'][cell]):5.3f}   "
+                f"{update.original[cell]:7.1f}   {update.suggested[cell]:8.1f}   "
+                f"{update.written[cell]:7.1f}   {update.change[cell]:6.1f}%  {update.sources[cell]}"
             )
         print(f"\n   Review these cells in the summary report for full details.")
+    return update
 
 
 def main() -> None:
@@ -547,49 +1105,225 @@ def main() -> None:
         default=5.0,
         help="Maximum percent change allowed for fuel_base modifications (default: 5.0%%).",
     )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        help=(
+            "Stream datalogs in chunks of this many rows into per-cell accumulators "
+            "(bounded memory; median/p95 are histogram estimates)."
+        ),
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help=(
+            "Reduce each datalog in a separate worker process (default: 1). Uses the "
+            "streaming accumulators and matches a serial --chunk-size run exactly."
+        ),
+    )
+    parser.add_argument(
+        "--fast-quantiles",
+        action="store_true",
+        help=(
+            "Estimate per-cell median/p95 from mergeable histogram sketches instead "
+            "of exact per-group percentiles (always used with --chunk-size/--jobs)."
+        ),
+    )
+    parser.add_argument(
+        "--align-lambda",
+        action="store_true",
+        help=(
+            "Estimate the wideband lag per log by cross-correlating lambda against "
+            "injector pulse width, and shift lambda back before binning."
+        ),
+    )
+    parser.add_argument(
+        "--max-lambda-lag",
+        type=int,
+        default=DEFAULT_MAX_LAMBDA_LAG,
+        help=f"Longest wideband lag searched, in samples (default: {DEFAULT_MAX_LAMBDA_LAG}).",
+    )
+    parser.add_argument(
+        "--lag-rpm-bands",
+        type=float,
+        nargs="+",
+        help="Optional RPM breakpoints for estimating a separate lag per RPM band.",
+    )
+    parser.add_argument(
+        "--resample-ms",
+        type=float,
+        help=(
+            "Resample each datalog onto a uniform timebase with this period in "
+            "milliseconds (linear for continuous channels, hold for stepwise ones)."
+        ),
+    )
+    parser.add_argument(
+        "--dwell-weighted",
+        action="store_true",
+        help=(
+            "Weight each sample by the time it represents; --min-samples then "
+            "applies to the per-cell weight (typical-sample equivalents)."
+        ),
+    )
+    parser.add_argument(
+        "--interpolate-cells",
+        action="store_true",
+        help=(
+            "Distribute each sample over the four surrounding fuel_base cells by "
+            "bilinear weight, as the ECU interpolates; --min-samples then applies "
+            "to the per-cell weight."
+        ),
+    )
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help=(
+            "Follow a single datalog that is still being written: parse only newly "
+            "appended rows and re-render the summary every --follow-interval seconds."
+        ),
+    )
+    parser.add_argument(
+        "--follow-interval",
+        type=float,
+        default=DEFAULT_FOLLOW_INTERVAL_S,
+        help=f"Seconds between summary updates in --follow mode (default: {DEFAULT_FOLLOW_INTERVAL_S:g}).",
+    )
+    parser.add_argument(
+        "--follow-idle-timeout",
+        type=float,
+        help="Stop following once no new rows have arrived for this many seconds.",
+    )
+    parser.add_argument(
+        "--no-glitch-filter",
+        action="store_true",
+        help=(
+            "Keep sensor glitches (spikes, flatlines, out-of-range values) instead of "
+            "masking them before analysis."
+        ),
+    )
+    parser.add_argument(
+        "--log-cache",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=(
+            "Directory for the parsed-datalog cache keyed by file content "
+            f"(default: {DEFAULT_CACHE_DIR})."
+        ),
+    )
+    parser.add_argument(
+        "--no-log-cache",
+        action="store_true",
+        help="Always parse datalog CSVs instead of using the parsed-datalog cache.",
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        help=(
+            "Record wall time, CPU time, rows and peak RSS per stage (load, filter, bin, classify, "
+            "summarize, report, tune write) and write them to this JSON file, which also loads "
+            "as a Chrome/Perfetto trace."
+        ),
+    )
 
     args = parser.parse_args()
+    profiler = Profiler() if args.profile else DISABLED
 
-    tune = load_tune(args.tune)
-    logs = load_logs(args.logs)
-
-    logs = logs.dropna(
-        subset=["rpm", "load_g_rev", "lambda_actual", "lambda_target"]
-    ).copy()
-    logs["stft"] = logs["stft"].fillna(0.0)
-    logs["ltft"] = logs["ltft"].fillna(0.0)
-    logs["combined_trim"] = logs["stft"] + logs["ltft"]
-
-    logs["rpm_idx"] = logs["rpm"].apply(lambda val: axis_index(val, tune.rpm_axis))
-    logs["load_idx"] = logs["load_g_rev"].apply(
-        lambda val: axis_index(val, tune.load_axis)
+    tune_file = TuneFile.load(args.tune)
+    tune = load_tune(tune_file)
+    cache = None if args.no_log_cache else LogCache(args.log_cache, RENAMED_COLUMNS)
+    options = PrepareOptions(
+        align_lambda=args.align_lambda,
+        max_lambda_lag=args.max_lambda_lag,
+        lag_rpm_bands=args.lag_rpm_bands,
+        resample_period_s=args.resample_ms / 1000.0 if args.resample_ms else None,
+        dwell_weighting=args.dwell_weighted,
+        interpolate_cells=args.interpolate_cells,
+        reject_glitches=not args.no_glitch_filter,
     )
-    logs = logs.dropna(subset=["rpm_idx", "load_idx"])
-    logs["rpm_idx"] = logs["rpm_idx"].astype(int)
-    logs["load_idx"] = logs["load_idx"].astype(int)
-
-    logs["loop_state"] = classify_loop_state(logs, tune)
-
-    open_rows = logs[logs["loop_state"] == "open"].copy()
-    open_rows = open_rows[open_rows["lambda_target"] > 0]
-    open_rows["lambda_ratio"] = open_rows["lambda_actual"] / open_rows["lambda_target"]
-
-    closed_rows = logs[logs["loop_state"] == "closed"].copy()
 
-    open_summary = summarize_open_loop(open_rows, tune, args.min_samples)
-    closed_summary = summarize_closed_loop(closed_rows, tune, args.min_samples)
+    if args.follow:
+        if len(args.logs) != 1:
+            parser.error("--follow takes exactly one datalog.")
+        with profiler.stage("follow"):
+            streamed = follow_log(
+                args.logs[0],
+                tune,
+                args.min_samples,
+                args.output,
+                interval_s=args.follow_interval,
+                idle_timeout_s=args.follow_idle_timeout,
+                options=options,
+            )
+        with profiler.stage("summarize"):
+            open_summary = summarize_open_loop_stats(streamed.open_acc, tune, args.min_samples)
+            closed_summary = summarize_closed_loop_stats(streamed.closed_acc, tune, args.min_samples)
+        if streamed.glitches is not None:
+            print(describe_glitches(streamed.glitches, streamed.rows))
+    elif args.chunk_size or args.jobs > 1:
+        streamed = accumulate_logs(
+            args.logs,
+            tune,
+            args.chunk_size or DEFAULT_CHUNK_SIZE,
+            jobs=args.jobs,
+            cache=cache,
+            options=options,
+            profiler=profiler,
+        )
+        if streamed.glitches is not None:
+            print(describe_glitches(streamed.glitches, streamed.rows))
+        with profiler.stage("summarize"):
+            open_summary = summarize_open_loop_stats(streamed.open_acc, tune, args.min_samples)
+            closed_summary = summarize_closed_loop_stats(streamed.closed_acc, tune, args.min_samples)
+    else:
+        # prepare_logs, one step at a time so each is profiled separately.
+        with profiler.stage("load") as stage:
+            raw_logs = load_logs(args.logs, cache)
+            stage.rows = len(raw_logs)
+        with profiler.stage("filter", len(raw_logs)):
+            logs, glitches = clean_logs(raw_logs, options)
+        with profiler.stage("bin", len(logs)):
+            logs = bin_logs(logs, tune)
+        with profiler.stage("classify", len(logs)):
+            logs = classify_logs(logs, tune)
+        if glitches is not None:
+            print(describe_glitches(glitches, len(raw_logs)))
+        for log_file, lag in describe_lags(logs).items():
+            print(f"Wideband lag compensation for {log_file}: {lag:.1f} samples")
+        with profiler.stage("summarize", len(logs)):
+            open_rows, closed_rows = split_loop_rows(logs)
+            if options.interpolate_cells:
+                open_rows = spread_bilinear(open_rows, tune)
+                closed_rows = spread_bilinear(closed_rows, tune)
+            open_summary = summarize_open_loop(
+                open_rows, tune, args.min_samples, fast_quantiles=args.fast_quantiles
+            )
+            closed_summary = summarize_closed_loop(
+                closed_rows, tune, args.min_samples, fast_quantiles=args.fast_quantiles
+            )
 
-    generate_report(open_summary, closed_summary, args.output)
+    # follow_log renders the report after every batch of rows, so the final
+    # summary has already been printed and written unless no rows arrived.
+    if not (args.follow and streamed.rows):
+        with profiler.stage("report", len(open_summary) + len(closed_summary)):
+            generate_report(open_summary, closed_summary, args.output)
     
     if args.output_tune:
-        apply_fuel_base_modifications(
-            args.tune,
-            open_summary,
-            closed_summary,
-            args.output_tune,
-            change_limit_pct=args.change_limit,
-            modify_tune_path=args.modify_tune,
-        )
+        with profiler.stage("tune_write", len(open_summary) + len(closed_summary)):
+            apply_fuel_base_modifications(
+                args.tune,
+                open_summary,
+                closed_summary,
+                args.output_tune,
+                change_limit_pct=args.change_limit,
+                modify_tune_path=args.modify_tune,
+                source_tune=tune_file,
+            )
+
+    if args.profile:
+        profiler.write(args.profile)
+        print(f"\n{profiler.format_table()}")
+        print(f"Profile written to: {args.profile}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+"""
+Batch fueling analysis of a tune history against a shared log corpus.
+
+`fueling_analysis.py` evaluates one `--tune` per run and reparses every log
+each time. This script takes many tunes (files or directories of `.tune`
+files) and many logs, parses and cleans the logs once, bins them once per
+distinct `fuel_base` axis set, and then only repeats the cheap tune-specific
+steps (PE classification and per-cell summaries) for each revision. It writes
+one summary table per tune plus a comparison report across all of them.
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data_quality import describe_glitches
+from fueling_analysis import (
+    RENAMED_COLUMNS,
+    PrepareOptions,
+    TuneFuelBase,
+    bin_logs,
+    classify_logs,
+    clean_logs,
+    generate_report,
+    load_logs,
+    load_tune,
+    split_loop_rows,
+    spread_bilinear,
+    summarize_closed_loop,
+    summarize_open_loop,
+)
+from log_cache import DEFAULT_CACHE_DIR, LogCache
+from tune_file import discover_tunes
+
+
+# Cells shown in the per-cell trend tables of the comparison report.
+DEFAULT_TREND_CELLS = 15
+
+
+@dataclass
+class TuneResult:
+    """Open/closed-loop summaries of one tune revision."""
+
+    label: str
+    path: Path
+    open_summary: pd.DataFrame
+    closed_summary: pd.DataFrame
+
+
+def axis_signature(tune: TuneFuelBase) -> Tuple[bytes, bytes]:
+    """Key identifying the fuel_base axes; tunes with equal keys share binned logs."""
+    return tune.rpm_axis.tobytes(), tune.load_axis.tobytes()
+
+
+def analyze_tunes(
+    tune_paths: List[Path],
+    logs: pd.DataFrame,
+    min_samples: int,
+    options: Optional[PrepareOptions] = None,
+    fast_quantiles: bool = False,
+) -> List[TuneResult]:
+    """
+    Summarize `logs` against every tune, sharing cleaning and binning work.
+    Prints the glitch report of the shared cleaning step.
+    """
+    options = options or PrepareOptions()
+    cleaned, glitches = clean_logs(logs, options)
+    if glitches is not None:
+        print(describe_glitches(glitches, len(logs)))
+    binned: Dict[Tuple[bytes, bytes], pd.DataFrame] = {}
+
+    results: List[TuneResult] = []
+    for position, path in enumerate(tune_paths, start=1):
+        tune = load_tune(path)
+        key = axis_signature(tune)
+        if key not in binned:
+            binned[key] = bin_logs(cleaned, tune)
+
+        open_rows, closed_rows = split_loop_rows(classify_logs(binned[key], tune))
+        if options.interpolate_cells:
+            open_rows = spread_bilinear(open_rows, tune)
+            closed_rows = spread_bilinear(closed_rows, tune)
+        results.append(
+            TuneResult(
+                label=f"T{position}",
+                path=path,
+                open_summary=summarize_open_loop(
+                    open_rows, tune, min_samples, fast_quantiles=fast_quantiles
+                ),
+                closed_summary=summarize_closed_loop(
+                    closed_rows, tune, min_samples, fast_quantiles=fast_quantiles
+                ),
+            )
+        )
+    print(f"Binned logs for {len(binned)} distinct axis set(s) across {len(results)} tune(s).")
+    return results
+
+
+def _support(summary: pd.DataFrame) -> np.ndarray:
+    column = "weight" if "weight" in summary.columns else "samples"
+    return summary[column].to_numpy(dtype=float)
+
+
+def _weighted_abs_mean(summary: pd.DataFrame, column: str) -> float:
+    if summary.empty:
+        return float("nan")
+    return float(np.average(np.abs(summary[column].to_numpy(dtype=float)), weights=_support(summary)))
+
+
+def _cells_over_limit(summary: pd.DataFrame, change_limit_pct: float) -> int:
+    if summary.empty:
+        return 0
+    change_pct = (summary["suggested_fuel_base"] / summary["current_fuel_base"] - 1.0) * 100.0
+    return int((change_pct.abs() > change_limit_pct).sum())
+
+
+def comparison_table(results: List[TuneResult], change_limit_pct: float) -> pd.DataFrame:
+    """One row per tune with cell coverage and sample-weighted mean absolute errors."""
+    rows = []
+    for result in results:
+        open_summary, closed_summary = result.open_summary, result.closed_summary
+        rows.append(
+            {
+                "tune": result.label,
+                "open_cells": len(open_summary),
+                "open_samples": int(open_summary["samples"].sum()) if not open_summary.empty else 0,
+                "open_abs_error_pct": _weighted_abs_mean(open_summary, "mean_error_pct"),
+                "closed_cells": len(closed_summary),
+                "closed_samples": int(closed_summary["samples"].sum()) if not closed_summary.empty else 0,
+                "closed_abs_trim_pct": _weighted_abs_mean(closed_summary, "mean_trim"),
+                "cells_over_limit": _cells_over_limit(open_summary, change_limit_pct)
+                + _cells_over_limit(closed_summary, change_limit_pct),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def cell_trend_table(
+    results: List[TuneResult], summary: str, column: str, top: int = DEFAULT_TREND_CELLS
+) -> pd.DataFrame:
+    """
+    `column` per (rpm, load) cell with one column per tune, for the `top`
+    cells with the most samples across all tunes.
+    """
+    frames = []
+    for result in results:
+        frame = getattr(result, summary)
+        if frame.empty:
+            continue
+        frames.append(
+            frame[["rpm_axis", "load_axis", "samples", column]].assign(tune=result.label)
+        )
+    if not frames:
+        return pd.DataFrame()
+    combined = pd.concat(frames, ignore_index=True)
+    busiest = (
+        combined.groupby(["rpm_axis", "load_axis"])["samples"].sum().nlargest(top).index
+    )
+    trend = combined.pivot_table(
+        index=["rpm_axis", "load_axis"], columns="tune", values=column, aggfunc="first"
+    )
+    labels = [result.label for result in results if result.label in trend.columns]
+    return trend.loc[busiest, labels].reset_index()
+
+
+def render_comparison(results: List[TuneResult], change_limit_pct: float) -> str:
+    def _table(df: pd.DataFrame) -> str:
+        if df.empty:
+            return "_No data available._"
+        return df.to_string(index=False, float_format=lambda val: f"{val:.3f}")
+
+    legend = "\n".join(f"- {result.label}: {result.path}" for result in results)
+    sections = [
+        "### Tunes\n" + legend + "\n",
+        "### Comparison\n" + _table(comparison_table(results, change_limit_pct)) + "\n",
+        "### Open-Loop Mean Error % by Cell\n"
+        + _table(cell_trend_table(results, "open_summary", "mean_error_pct"))
+        + "\n",
+        "### Closed-Loop Mean Trim % by Cell\n"
+        + _table(cell_trend_table(results, "closed_summary", "mean_trim"))
+        + "\n",
+    ]
+    return "\n".join(sections)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Evaluate many tune revisions against the same datalogs in one run, "
+            "parsing and binning each log only once."
+        )
+    )
+    parser.add_argument(
+        "--tunes",
+        type=Path,
+        nargs="+",
+        required=True,
+        help="Tune files and/or directories containing .tune files.",
+    )
+    parser.add_argument(
+        "--logs",
+        type=Path,
+        nargs="+",
+        required=True,
+        help="One or more CSV datalog files to analyze.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Optional path to save the Markdown comparison report.",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        help="Optional directory for one Markdown summary per tune (<label>_<tune stem>.md, e.g. T1_v9.md).",
+    )
+    parser.add_argument(
+        "--min-samples",
+        type=int,
+        default=5,
+        help="Minimum hits per cell before reporting a recommendation (default: 5).",
+    )
+    parser.add_argument(
+        "--change-limit",
+        type=float,
+        default=5.0,
+        help="Percent change beyond which a suggested cell counts as over the limit (default: 5.0%%).",
+    )
+    parser.add_argument(
+        "--fast-quantiles",
+        action="store_true",
+        help="Estimate per-cell median/p95 from histogram sketches.",
+    )
+    parser.add_argument(
+        "--align-lambda",
+        action="store_true",
+        help="Shift wideband lambda back by its estimated lag before binning.",
+    )
+    parser.add_argument(
+        "--dwell-weighted",
+        action="store_true",
+        help="Weight each sample by the time it represents.",
+    )
+    parser.add_argument(
+        "--interpolate-cells",
+        action="store_true",
+        help="Distribute each sample over the four surrounding cells by bilinear weight.",
+    )
+    parser.add_argument(
+        "--no-glitch-filter",
+        action="store_true",
+        help="Keep sensor glitches (spikes, flatlines, out-of-range values) instead of masking them.",
+    )
+    parser.add_argument(
+        "--log-cache",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory for the parsed-datalog cache (default: {DEFAULT_CACHE_DIR}).",
+    )
+    parser.add_argument(
+        "--no-log-cache",
+        action="store_true",
+        help="Always parse datalog CSVs instead of using the parsed-datalog cache.",
+    )
+
+    args = parser.parse_args()
+
+    tune_paths = discover_tunes(args.tunes)
+    if not tune_paths:
+        raise SystemExit("No tune files found.")
+    cache = None if args.no_log_cache else LogCache(args.log_cache, RENAMED_COLUMNS)
+    options = PrepareOptions(
+        align_lambda=args.align_lambda,
+        dwell_weighting=args.dwell_weighted,
+        interpolate_cells=args.interpolate_cells,
+        reject_glitches=not args.no_glitch_filter,
+    )
+
+    results = analyze_tunes(
+        tune_paths,
+        load_logs(args.logs, cache),
+        args.min_samples,
+        options=options,
+        fast_quantiles=args.fast_quantiles,
+    )
+
+    if args.output_dir:
+        for result in results:
+            generate_report(
+                result.open_summary,
+                result.closed_summary,
+                args.output_dir / f"{result.label}_{result.path.stem}.md",
+                echo=False,
+            )
+
+    report = render_comparison(results, args.change_limit)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(report, encoding="utf-8")
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
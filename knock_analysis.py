@@ -0,0 +1,417 @@
+#!/usr/bin/env python
+"""
+Knock event and fine-learn analysis per spark table cell and per pull.
+
+Knock retard is logged as a per-sample value, but what matters when reviewing
+timing is the knock *event*: a run of consecutive samples with retard applied.
+Events are found with vectorized run-length encoding
+(`run_length.run_bounds`) and WOT pulls as `log_segments.Segments`, so a
+whole log archive is scanned without per-row Python loops. Each event is
+attributed to the fine-learn cell (`spark_fine_learn_rpm` x
+`spark_fine_learn_load`) and the base spark cell (`base_spark_rpm_index` x
+`base_spark_map_index`) it started in, and to the pull it occurred during
+(`Segments.labels`); per-pull fine learn and IAM are `Segments.reduce`
+reductions.
+
+Fine learn and the IAM (see "Relationships" under spark timing in
+`ECU_TUNE_FILE_MODEL.md`) are summarized per fine-learn cell and per pull, so
+cells where the ECU keeps pulling timing stand out next to the events that
+caused it.
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from cell_binning import MISSING_INDEX, bin_cells
+from data_quality import describe_glitches, reject_glitches
+from log_cache import DEFAULT_CACHE_DIR, LogCache
+from log_schema import EXACT, INTEGER, read_log
+from log_segments import Segments, sample_breaks
+from run_length import reduce_runs, run_bounds
+from tune_file import TuneFile
+
+
+KNOCK_COLUMNS = {
+    "Time (s)": "time_s",
+    "Engine Speed (rpm)": "rpm",
+    "Load (MAF) (g/rev)": "load_g_rev",
+    "Throttle Position (%)": "throttle_pct",
+    "Knock Retard (°)": "knock_retard_deg",
+    "Ignition Advance - Fine Learn (°)": "fine_learn_deg",
+    "Ignition Advance Multiplier": "iam",
+}
+
+# Load precision of each channel (see log_schema.py).
+KNOCK_CHANNELS = {
+    "Time (s)": EXACT,
+    "Engine Speed (rpm)": INTEGER,
+    "Load (MAF) (g/rev)": EXACT,
+    "Throttle Position (%)": EXACT,
+    "Knock Retard (°)": EXACT,
+    "Ignition Advance - Fine Learn (°)": EXACT,
+    "Ignition Advance Multiplier": EXACT,
+}
+
+SPARK_TABLES = ("base_spark_mt", "base_spark_at")
+
+# Retard magnitude above which a sample counts as knock (degrees).
+DEFAULT_KNOCK_THRESHOLD_DEG = 0.0
+
+# Throttle at or above which a sample is part of a pull (%).
+DEFAULT_PULL_THROTTLE_PCT = 80.0
+
+# Shortest throttle run reported as a pull (seconds).
+DEFAULT_MIN_PULL_S = 1.0
+
+
+def load_knock_logs(csv_paths: List[Path], cache: Optional[LogCache] = None) -> pd.DataFrame:
+    frames = []
+    for path in csv_paths:
+        frame = read_log(path, KNOCK_CHANNELS, cache)
+        missing = [column for column in KNOCK_COLUMNS if column not in frame.columns]
+        if missing:
+            raise ValueError(f"Missing columns {missing} in datalog '{path}'.")
+        frame = frame[list(KNOCK_COLUMNS)].rename(columns=KNOCK_COLUMNS)
+        frame["log_file"] = path.name
+        frames.append(frame)
+    if not frames:
+        raise ValueError("No datalogs were loaded.")
+    logs = pd.concat(frames, ignore_index=True)
+    return logs.dropna(subset=["time_s", "rpm", "load_g_rev", "knock_retard_deg"]).reset_index(drop=True)
+
+
+def _cell_columns(
+    logs: pd.DataFrame, tune: TuneFile, spark_table: str
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Fine-learn and base spark cell indices for every sample."""
+    rpm = logs["rpm"].to_numpy(dtype=float)
+    load = logs["load_g_rev"].to_numpy(dtype=float)
+    learn_rpm, learn_load = bin_cells(
+        rpm, load, tune.vector("spark_fine_learn_rpm"), tune.vector("spark_fine_learn_load")
+    )
+    spark_rpm_axis, spark_load_axis = tune.axis_arrays(spark_table)
+    spark_rpm, spark_load = bin_cells(rpm, load, spark_rpm_axis, spark_load_axis)
+    return learn_rpm, learn_load, spark_rpm, spark_load
+
+
+def detect_pulls(
+    logs: pd.DataFrame,
+    breaks: np.ndarray,
+    min_throttle_pct: float = DEFAULT_PULL_THROTTLE_PCT,
+    min_duration_s: float = DEFAULT_MIN_PULL_S,
+) -> Segments:
+    """`wot` segments: samples at or above `min_throttle_pct` lasting at least `min_duration_s`."""
+    throttle = logs["throttle_pct"].to_numpy(dtype=float)
+    return Segments.from_condition(
+        "wot", throttle >= min_throttle_pct, breaks, logs["time_s"].to_numpy(dtype=float), min_duration_s
+    )
+
+
+def pull_table(pulls: Segments, logs: pd.DataFrame) -> pd.DataFrame:
+    """One row per pull (numbered as in `Segments.labels`) with its span and worst fine learn/IAM."""
+    starts, ends = pulls.starts, pulls.ends
+    time_s = logs["time_s"].to_numpy(dtype=float)
+    rpm = logs["rpm"].to_numpy(dtype=float)
+    return pd.DataFrame(
+        {
+            "pull": np.arange(len(pulls)),
+            "log_file": logs["log_file"].to_numpy()[starts],
+            "start_time_s": time_s[starts],
+            "duration_s": time_s[ends - 1] - time_s[starts],
+            "start_rpm": rpm[starts],
+            "end_rpm": rpm[ends - 1],
+            "min_fine_learn_deg": pulls.reduce(np.fmin, logs["fine_learn_deg"].to_numpy(dtype=float)),
+            "min_iam": pulls.reduce(np.fmin, logs["iam"].to_numpy(dtype=float)),
+        }
+    )
+
+
+def detect_events(
+    logs: pd.DataFrame,
+    breaks: np.ndarray,
+    tune: TuneFile,
+    pulls: Segments,
+    threshold_deg: float = DEFAULT_KNOCK_THRESHOLD_DEG,
+    spark_table: str = SPARK_TABLES[0],
+) -> pd.DataFrame:
+    """
+    One row per knock event (run of samples with |retard| > threshold).
+
+    Events carry their peak and summed retard, the operating point and cells
+    at onset, and the index of the pull they started in (-1 outside pulls).
+    """
+    retard = np.abs(logs["knock_retard_deg"].to_numpy(dtype=float))
+    starts, ends = run_bounds(retard > threshold_deg, breaks)
+    learn_rpm, learn_load, spark_rpm, spark_load = _cell_columns(logs.iloc[starts], tune, spark_table)
+
+    pull = pulls.labels(len(logs))[starts]
+
+    time_s = logs["time_s"].to_numpy(dtype=float)
+    return pd.DataFrame(
+        {
+            "log_file": logs["log_file"].to_numpy()[starts],
+            "start_time_s": time_s[starts],
+            "duration_s": time_s[ends - 1] - time_s[starts] if len(starts) else np.zeros(0),
+            "samples": ends - starts,
+            "peak_retard_deg": reduce_runs(np.maximum, retard, starts, ends),
+            "total_retard_deg": reduce_runs(np.add, retard, starts, ends),
+            "rpm": logs["rpm"].to_numpy(dtype=float)[starts],
+            "load_g_rev": logs["load_g_rev"].to_numpy(dtype=float)[starts],
+            "learn_rpm_idx": learn_rpm,
+            "learn_load_idx": learn_load,
+            "spark_rpm_idx": spark_rpm,
+            "spark_load_idx": spark_load,
+            "pull": pull,
+        }
+    )
+
+
+def summarize_event_cells(
+    events: pd.DataFrame,
+    rpm_axis: np.ndarray,
+    load_axis: np.ndarray,
+    rpm_column: str,
+    load_column: str,
+    table: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
+    """Event counts and retard magnitudes per cell of the given axes."""
+    valid = (events[rpm_column] != MISSING_INDEX) & (events[load_column] != MISSING_INDEX)
+    binned = events[valid]
+    if binned.empty:
+        return pd.DataFrame()
+    grouped = (
+        binned.groupby([rpm_column, load_column])
+        .agg(
+            events=("peak_retard_deg", "size"),
+            samples=("samples", "sum"),
+            max_retard_deg=("peak_retard_deg", "max"),
+            mean_peak_retard_deg=("peak_retard_deg", "mean"),
+            total_retard_deg=("total_retard_deg", "sum"),
+        )
+        .reset_index()
+    )
+    row = grouped[rpm_column].to_numpy(dtype=int)
+    col = grouped[load_column].to_numpy(dtype=int)
+    grouped.insert(2, "rpm_axis", rpm_axis[row].astype(int))
+    grouped.insert(3, "load_axis", np.round(load_axis[col], 2))
+    if table is not None:
+        grouped["table_timing_deg"] = table[row, col]
+    return grouped.sort_values(by=["events", "max_retard_deg"], ascending=False)
+
+
+def summarize_fine_learn(
+    logs: pd.DataFrame, tune: TuneFile, knock: np.ndarray, min_samples: int
+) -> pd.DataFrame:
+    """Fine-learn values and knock samples per fine-learn cell."""
+    rpm_axis = tune.vector("spark_fine_learn_rpm")
+    load_axis = tune.vector("spark_fine_learn_load")
+    rpm_idx, load_idx = bin_cells(
+        logs["rpm"].to_numpy(dtype=float), logs["load_g_rev"].to_numpy(dtype=float), rpm_axis, load_axis
+    )
+    valid = (rpm_idx != MISSING_INDEX) & (load_idx != MISSING_INDEX)
+    binned = pd.DataFrame(
+        {
+            "rpm_idx": rpm_idx[valid],
+            "load_idx": load_idx[valid],
+            "fine_learn_deg": logs["fine_learn_deg"].to_numpy(dtype=float)[valid],
+            "knock": knock[valid],
+        }
+    )
+    if binned.empty:
+        return pd.DataFrame()
+    grouped = (
+        binned.groupby(["rpm_idx", "load_idx"])
+        .agg(
+            samples=("fine_learn_deg", "size"),
+            mean_fine_learn_deg=("fine_learn_deg", "mean"),
+            min_fine_learn_deg=("fine_learn_deg", "min"),
+            knock_samples=("knock", "sum"),
+        )
+        .reset_index()
+    )
+    grouped = grouped[grouped["samples"] >= min_samples].copy()
+    if grouped.empty:
+        return grouped
+    grouped.insert(2, "rpm_axis", rpm_axis[grouped["rpm_idx"].to_numpy(dtype=int)].astype(int))
+    grouped.insert(3, "load_axis", np.round(load_axis[grouped["load_idx"].to_numpy(dtype=int)], 2))
+    return grouped.sort_values(by=["min_fine_learn_deg", "knock_samples"], ascending=[True, False])
+
+
+def summarize_pulls(pulls: pd.DataFrame, events: pd.DataFrame) -> pd.DataFrame:
+    """Pulls with their knock event counts and worst retard."""
+    if pulls.empty:
+        return pd.DataFrame()
+    in_pull = events[events["pull"] >= 0]
+    per_pull = in_pull.groupby("pull").agg(
+        events=("peak_retard_deg", "size"), max_retard_deg=("peak_retard_deg", "max")
+    )
+    summary = pulls.join(per_pull, on="pull")
+    summary["events"] = summary["events"].fillna(0).astype(int)
+    summary["max_retard_deg"] = summary["max_retard_deg"].fillna(0.0)
+    return summary
+
+
+def analyze_knock(
+    logs: pd.DataFrame,
+    tune: TuneFile,
+    min_samples: int = 5,
+    threshold_deg: float = DEFAULT_KNOCK_THRESHOLD_DEG,
+    pull_throttle_pct: float = DEFAULT_PULL_THROTTLE_PCT,
+    min_pull_s: float = DEFAULT_MIN_PULL_S,
+    spark_table: str = SPARK_TABLES[0],
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Events, fine-learn cells, base spark cells, fine-learn summary and pulls."""
+    breaks = sample_breaks(logs)
+    pulls = detect_pulls(logs, breaks, pull_throttle_pct, min_pull_s)
+    events = detect_events(logs, breaks, tune, pulls, threshold_deg, spark_table)
+
+    learn_cells = summarize_event_cells(
+        events,
+        tune.vector("spark_fine_learn_rpm"),
+        tune.vector("spark_fine_learn_load"),
+        "learn_rpm_idx",
+        "learn_load_idx",
+    )
+    spark_rpm_axis, spark_load_axis = tune.axis_arrays(spark_table)
+    spark_cells = summarize_event_cells(
+        events, spark_rpm_axis, spark_load_axis, "spark_rpm_idx", "spark_load_idx", tune.array(spark_table)
+    )
+    knock = np.abs(logs["knock_retard_deg"].to_numpy(dtype=float)) > threshold_deg
+    fine_learn = summarize_fine_learn(logs, tune, knock, min_samples)
+    return events, learn_cells, spark_cells, fine_learn, summarize_pulls(pull_table(pulls, logs), events)
+
+
+def generate_knock_report(
+    events: pd.DataFrame,
+    learn_cells: pd.DataFrame,
+    spark_cells: pd.DataFrame,
+    fine_learn: pd.DataFrame,
+    pulls: pd.DataFrame,
+    spark_table: str,
+    output_path: Optional[Path],
+    max_events: int = 50,
+) -> None:
+    def _format(df: pd.DataFrame) -> str:
+        if df.empty:
+            return "_No data available._"
+        return df.to_string(index=False, float_format=lambda val: f"{val:.2f}")
+
+    event_columns = [
+        column
+        for column in events.columns
+        if column not in ("learn_rpm_idx", "learn_load_idx", "spark_rpm_idx", "spark_load_idx")
+    ]
+    worst_events = events.sort_values("peak_retard_deg", ascending=False).head(max_events)
+    sections = [
+        f"### Knock Events ({len(events)} total, worst {min(len(events), max_events)} shown)\n"
+        + _format(worst_events[event_columns])
+        + "\n",
+        "### Knock Events by Fine-Learn Cell\n" + _format(learn_cells) + "\n",
+        f"### Knock Events by {spark_table} Cell\n" + _format(spark_cells) + "\n",
+        "### Fine Learn by Cell\n" + _format(fine_learn) + "\n",
+        "### Pulls\n" + _format(pulls) + "\n",
+    ]
+
+    if output_path:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text("\n".join(sections), encoding="utf-8")
+
+    for section in sections:
+        print(section)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Detect knock events and summarize them with fine learn per spark cell and per pull. "
+            "See ECU_TUNE_FILE_MODEL.md for map structure details."
+        )
+    )
+    parser.add_argument("--tune", type=Path, required=True, help="Path to the JSON-formatted tune file.")
+    parser.add_argument("--logs", type=Path, nargs="+", required=True, help="One or more CSV datalog files to analyze.")
+    parser.add_argument("--output", type=Path, help="Optional path to save a Markdown summary.")
+    parser.add_argument(
+        "--min-samples",
+        type=int,
+        default=5,
+        help="Minimum hits per fine-learn cell before reporting it (default: 5).",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_KNOCK_THRESHOLD_DEG,
+        help=f"Knock retard magnitude above which a sample counts as knock (default: {DEFAULT_KNOCK_THRESHOLD_DEG} deg).",
+    )
+    parser.add_argument(
+        "--pull-throttle",
+        type=float,
+        default=DEFAULT_PULL_THROTTLE_PCT,
+        help=f"Throttle at or above which samples form a pull (default: {DEFAULT_PULL_THROTTLE_PCT}%%).",
+    )
+    parser.add_argument(
+        "--min-pull",
+        type=float,
+        default=DEFAULT_MIN_PULL_S,
+        help=f"Shortest throttle run reported as a pull (default: {DEFAULT_MIN_PULL_S} s).",
+    )
+    parser.add_argument(
+        "--spark-table",
+        choices=SPARK_TABLES,
+        default=SPARK_TABLES[0],
+        help=f"Base spark table events are attributed to (default: {SPARK_TABLES[0]}).",
+    )
+    parser.add_argument(
+        "--max-events",
+        type=int,
+        default=50,
+        help="Number of individual events listed in the report (default: 50).",
+    )
+    parser.add_argument(
+        "--no-glitch-filter",
+        action="store_true",
+        help="Keep sensor glitches (spikes, flatlines, out-of-range values) instead of masking them.",
+    )
+    parser.add_argument(
+        "--log-cache",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory for the parsed-datalog cache (default: {DEFAULT_CACHE_DIR}).",
+    )
+    parser.add_argument(
+        "--no-log-cache",
+        action="store_true",
+        help="Always parse datalog CSVs instead of using the parsed-datalog cache.",
+    )
+
+    args = parser.parse_args()
+
+    tune_file = TuneFile.load(args.tune)
+    cache = None if args.no_log_cache else LogCache(args.log_cache)
+    logs = load_knock_logs(args.logs, cache)
+    if not args.no_glitch_filter:
+        logs, glitches = reject_glitches(logs, names=KNOCK_COLUMNS)
+        print(describe_glitches(glitches, len(logs)))
+    print(f"Samples: {len(logs)}")
+
+    events, learn_cells, spark_cells, fine_learn, pulls = analyze_knock(
+        logs,
+        tune_file,
+        args.min_samples,
+        args.threshold,
+        args.pull_throttle,
+        args.min_pull,
+        args.spark_table,
+    )
+    generate_knock_report(
+        events, learn_cells, spark_cells, fine_learn, pulls, args.spark_table, args.output, args.max_events
+    )
+
+
+if __name__ == "__main__":
+    main()
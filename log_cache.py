@@ -0,0 +1,246 @@
+"""
+On-disk columnar cache of parsed datalogs.
+
+Parsing the Cobb CSV text dominates repeat analyses of the same logs against
+new tune revisions. `LogCache` stores every parsed column as a `.npy` file
+(memory-mappable) under a key derived from the CSV content hash and the column
+schema, so a log that has been seen before is loaded without touching the CSV
+parser. Float columns are stored as float32 when the values round-trip exactly
+at their logged decimal precision, and integral columns use the smallest
+integer type that holds them. Loaded frames are identical to `pd.read_csv`.
+
+Entries are evicted oldest-access-first once the cache exceeds its size budget,
+and entries not used within `max_age_days` are dropped.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+
+CACHE_FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = Path(".log_cache")
+DEFAULT_MAX_BYTES = 2 * 1024**3
+DEFAULT_MAX_AGE_DAYS = 30.0
+
+MANIFEST_NAME = "manifest.json"
+_HASH_BLOCK_SIZE = 1 << 20
+_MAX_DECIMALS = 6
+
+
+def file_digest(path: Path) -> str:
+    """SHA-256 of the file contents."""
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for block in iter(lambda: handle.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _decimals(values: np.ndarray) -> Optional[int]:
+    """Smallest decimal count that reproduces every finite value exactly."""
+    finite = values[np.isfinite(values)]
+    for decimals in range(_MAX_DECIMALS + 1):
+        if np.array_equal(np.round(finite, decimals), finite):
+            return decimals
+    return None
+
+
+def _compact_column(values: np.ndarray) -> tuple[np.ndarray, Dict[str, object]]:
+    """Pick the smallest storage dtype that restores `values` exactly."""
+    meta: Dict[str, object] = {"dtype": str(values.dtype)}
+    if values.dtype.kind in "iu":
+        for candidate in (np.int8, np.int16, np.int32):
+            info = np.iinfo(candidate)
+            if values.size == 0 or (values.min() >= info.min and values.max() <= info.max):
+                return values.astype(candidate), meta
+        return values, meta
+
+    if values.dtype.kind == "f":
+        decimals = _decimals(values)
+        if decimals is not None:
+            narrowed = values.astype(np.float32)
+            restored = np.round(narrowed.astype(np.float64), decimals)
+            if np.array_equal(restored, values, equal_nan=True):
+                meta["decimals"] = decimals
+                return narrowed, meta
+        return values, meta
+
+    # Non-numeric channels are rare in these logs; keep them as fixed-width text.
+    return values.astype(str), meta
+
+
+def _restore_column(stored: np.ndarray, meta: Mapping[str, object]) -> np.ndarray:
+    dtype = np.dtype(str(meta["dtype"]))
+    if "decimals" in meta:
+        return np.round(stored.astype(np.float64), int(meta["decimals"]))
+    # Copy out of the read-only memory map so callers may modify the result.
+    return np.array(stored, dtype=dtype)
+
+
+class LogCache:
+    """Content-addressed cache of parsed, renamed datalog columns."""
+
+    def __init__(
+        self,
+        root: Path = DEFAULT_CACHE_DIR,
+        renames: Optional[Mapping[str, str]] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age_days: float = DEFAULT_MAX_AGE_DAYS,
+    ) -> None:
+        self.root = Path(root)
+        self.renames = dict(renames or {})
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self._digests: Dict[tuple, str] = {}
+
+    def schema_digest(self) -> str:
+        schema = json.dumps(
+            {"version": CACHE_FORMAT_VERSION, "renames": self.renames},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(schema.encode("utf-8")).hexdigest()[:16]
+
+    def key(self, csv_path: Path) -> str:
+        stat = csv_path.stat()
+        stamp = (str(csv_path.resolve()), stat.st_size, stat.st_mtime_ns)
+        if stamp not in self._digests:
+            self._digests[stamp] = file_digest(csv_path)
+        return f"{self._digests[stamp][:32]}-{self.schema_digest()}"
+
+    def entry_path(self, csv_path: Path) -> Path:
+        return self.root / self.key(csv_path)
+
+    def load_columns(
+        self, csv_path: Path, columns: Optional[Iterable[str]] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Memory-mapped stored arrays for a log, parsing and caching it on a miss.
+
+        Keys are the renamed column labels. Arrays keep their compact storage
+        dtype; use `restore` (or `read_frame`) to get parse-equivalent values.
+        """
+        entry = self.entry_path(csv_path)
+        manifest = self._read_manifest(entry)
+        if manifest is None:
+            self._store(csv_path, entry)
+            manifest = self._read_manifest(entry)
+            if manifest is None:
+                raise RuntimeError(f"Failed to cache datalog '{csv_path}'.")
+        self._touch(entry)
+
+        wanted = None if columns is None else set(columns)
+        arrays: Dict[str, np.ndarray] = {}
+        for column in manifest["columns"]:
+            if wanted is not None and column["name"] not in wanted:
+                continue
+            arrays[column["name"]] = np.load(entry / column["file"], mmap_mode="r")
+        return arrays
+
+    def column_meta(self, csv_path: Path) -> Dict[str, Dict[str, object]]:
+        manifest = self._read_manifest(self.entry_path(csv_path)) or {"columns": []}
+        return {column["name"]: column for column in manifest["columns"]}
+
+    def read_frame(
+        self,
+        csv_path: Path,
+        columns: Optional[Iterable[str]] = None,
+        original_names: bool = False,
+    ) -> pd.DataFrame:
+        """DataFrame equivalent to `pd.read_csv(csv_path)` with cached columns renamed."""
+        arrays = self.load_columns(csv_path, columns)
+        meta = self.column_meta(csv_path)
+        data = {}
+        for name, stored in arrays.items():
+            label = meta[name]["source"] if original_names else name
+            data[label] = _restore_column(stored, meta[name])
+        return pd.DataFrame(data)
+
+    @staticmethod
+    def restore(stored: np.ndarray, meta: Mapping[str, object]) -> np.ndarray:
+        return _restore_column(stored, meta)
+
+    def evict(self) -> List[Path]:
+        """Drop expired entries, then least recently used ones over the size budget."""
+        if not self.root.exists():
+            return []
+        now = time.time()
+        entries = []
+        for entry in self.root.iterdir():
+            manifest_path = entry / MANIFEST_NAME
+            if not manifest_path.exists():
+                continue
+            size = sum(item.stat().st_size for item in entry.iterdir())
+            entries.append((manifest_path.stat().st_mtime, size, entry))
+        entries.sort()
+
+        removed: List[Path] = []
+        total = sum(size for _, size, _ in entries)
+        max_age_s = self.max_age_days * 86400.0
+        for accessed, size, entry in entries:
+            if now - accessed > max_age_s or total > self.max_bytes:
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+                removed.append(entry)
+        return removed
+
+    def _read_manifest(self, entry: Path) -> Optional[Dict[str, object]]:
+        try:
+            with (entry / MANIFEST_NAME).open("r", encoding="utf-8") as handle:
+                return json.load(handle)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @staticmethod
+    def _touch(entry: Path) -> None:
+        try:
+            os.utime(entry / MANIFEST_NAME)
+        except OSError:
+            pass
+
+    def _store(self, csv_path: Path, entry: Path) -> None:
+        frame = pd.read_csv(csv_path)
+        self.root.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=".staging-", dir=self.root))
+        try:
+            columns = []
+            for position, source in enumerate(frame.columns):
+                stored, meta = _compact_column(frame[source].to_numpy())
+                file_name = f"{position:03d}.npy"
+                np.save(staging / file_name, stored, allow_pickle=False)
+                meta.update(
+                    {
+                        "name": self.renames.get(source, source),
+                        "source": source,
+                        "file": file_name,
+                    }
+                )
+                columns.append(meta)
+            manifest = {
+                "version": CACHE_FORMAT_VERSION,
+                "source_file": csv_path.name,
+                "rows": int(len(frame)),
+                "columns": columns,
+            }
+            with (staging / MANIFEST_NAME).open("w", encoding="utf-8") as handle:
+                json.dump(manifest, handle, indent=1, ensure_ascii=False)
+            try:
+                os.replace(staging, entry)
+            except OSError:
+                # Another process cached the same log first; keep its entry.
+                shutil.rmtree(staging, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self.evict()
@@ -0,0 +1,100 @@
+"""
+Analyzer-declared datalog column projection with compact dtypes.
+
+Cobb logs carry 27 channels, and `pd.read_csv` loads every one of them as
+float64 although each analyzer reads only a handful. Each analyzer declares
+the channels it needs (original CSV headers) and the precision it needs them
+at, and `read_log` loads only the union of those columns:
+
+- `EXACT`: float64, bit-identical to `pd.read_csv`. Used for channels that are
+  binned against table axes or compared with tune thresholds, where a float32
+  value such as 0.94 -> 0.9399999 would land in a different cell.
+- `COMPACT`: float32, for channels only used in statistics or lag estimation.
+- `INTEGER`: the smallest integer type that holds the column (temperatures,
+  speed, RPM). Columns with NaN or fractional values fall back to float64, so
+  this is always exact.
+
+When several analyzers share a load, each channel gets the widest precision
+any of them asked for (`merge_channels`).
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from log_cache import LogCache
+
+
+INTEGER = "int"
+COMPACT = "float32"
+EXACT = "float64"
+
+# Precisions ordered from narrowest to widest. float32 holds every integer a
+# log channel can take, so COMPACT also satisfies an INTEGER request.
+_WIDTH = {INTEGER: 0, COMPACT: 1, EXACT: 2}
+
+_INTEGER_TYPES = (np.int8, np.int16, np.int32)
+
+
+def merge_channels(*declarations: Mapping[str, str]) -> Dict[str, str]:
+    """Union of channel declarations, keeping the widest precision per channel."""
+    merged: Dict[str, str] = {}
+    for declaration in declarations:
+        for channel, precision in declaration.items():
+            if channel not in merged or _WIDTH[precision] > _WIDTH[merged[channel]]:
+                merged[channel] = precision
+    return merged
+
+
+def _narrow_integer(values: np.ndarray) -> np.ndarray:
+    if len(values) == 0:
+        return values
+    if values.dtype.kind == "f" and not (
+        np.isfinite(values).all() and np.array_equal(values, np.round(values))
+    ):
+        return values
+    low, high = values.min(), values.max()
+    for candidate in _INTEGER_TYPES:
+        info = np.iinfo(candidate)
+        if low >= info.min and high <= info.max:
+            return values.astype(candidate)
+    return values
+
+
+def compact_frame(frame: pd.DataFrame, channels: Mapping[str, str]) -> pd.DataFrame:
+    """Cast the declared channels of `frame` (in place) to their declared precision."""
+    for channel, precision in channels.items():
+        if channel not in frame.columns or frame[channel].dtype.kind not in "iuf":
+            continue
+        values = frame[channel].to_numpy()
+        if precision == INTEGER:
+            frame[channel] = _narrow_integer(values)
+        elif precision == COMPACT:
+            frame[channel] = values.astype(np.float32)
+    return frame
+
+
+def read_log(
+    csv_path: Path,
+    channels: Optional[Mapping[str, str]] = None,
+    cache: Optional[LogCache] = None,
+) -> pd.DataFrame:
+    """
+    Read the declared channels of a datalog (original headers) with compact dtypes.
+
+    Declared channels missing from the log are skipped; callers check for the
+    ones they require. `channels=None` reads every column at full precision.
+    """
+    if channels is None:
+        return cache.read_frame(csv_path, original_names=True) if cache is not None else pd.read_csv(csv_path)
+
+    if cache is not None:
+        names = [cache.renames.get(channel, channel) for channel in channels]
+        frame = cache.read_frame(csv_path, columns=names, original_names=True)
+    else:
+        frame = pd.read_csv(csv_path, usecols=lambda column: column in channels)
+    return compact_frame(frame, channels)
@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+"""
+Segmentation of datalogs into WOT pulls, steady-state and transient windows.
+
+Analyzers usually filter a log with row masks, which loses the fact that
+samples form contiguous runs. `segment_logs` instead finds runs of interest
+once, with vectorized run-length (`run_length.run_bounds`) and windowed
+derivative logic, and stores them as compact `(start, end, kind)` index arrays
+in a `Segments` object:
+
+- `wot`: throttle at or above the pull threshold.
+- `cruise`: steady state, with RPM and throttle rates of change inside limits.
+- `idle`: low RPM, closed throttle and (when logged) the car standing still.
+- `dfco`: closed throttle above idle RPM at very low load (fuel cut on decel).
+- `gear_change`: the RPM/vehicle speed ratio changing while the car is moving.
+
+Segments never cross a file boundary or a logging gap. Analyzers work on them
+through positional slices (`Segments.views`), per-segment reductions
+(`Segments.reduce`) or a combined row mask, without copying the log.
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from log_cache import DEFAULT_CACHE_DIR, LogCache
+from log_schema import EXACT, INTEGER, read_log
+from run_length import reduce_runs, run_bounds
+
+
+SEGMENT_COLUMNS = {
+    "Time (s)": "time_s",
+    "Engine Speed (rpm)": "rpm",
+    "Load (MAF) (g/rev)": "load_g_rev",
+    "Throttle Position (%)": "throttle_pct",
+    "Vehicle Speed (km/h)": "vehicle_speed_kmh",
+}
+
+# Load precision of each channel (see log_schema.py).
+SEGMENT_CHANNELS = {
+    "Time (s)": EXACT,
+    "Engine Speed (rpm)": INTEGER,
+    "Load (MAF) (g/rev)": EXACT,
+    "Throttle Position (%)": EXACT,
+    "Vehicle Speed (km/h)": INTEGER,
+}
+
+SEGMENT_KINDS = ("wot", "cruise", "idle", "dfco", "gear_change")
+
+# Logging gaps longer than this end a segment (seconds).
+MAX_SAMPLE_GAP_S = 1.0
+
+
+@dataclass(frozen=True)
+class SegmentThresholds:
+    """Detection limits for each segment kind."""
+
+    wot_throttle_pct: float = 80.0
+    min_wot_s: float = 1.0
+    idle_max_rpm: float = 1100.0
+    idle_max_throttle_pct: float = 2.0
+    idle_max_speed_kmh: float = 2.0
+    min_idle_s: float = 2.0
+    dfco_min_rpm: float = 1300.0
+    dfco_max_throttle_pct: float = 1.0
+    dfco_max_load_g_rev: float = 0.25
+    min_dfco_s: float = 0.3
+    cruise_min_rpm: float = 1200.0
+    cruise_min_throttle_pct: float = 1.0
+    cruise_max_rpm_rate: float = 150.0
+    cruise_max_throttle_rate: float = 5.0
+    min_cruise_s: float = 3.0
+    gear_min_speed_kmh: float = 10.0
+    gear_ratio_rate: float = 0.5
+    min_gear_change_s: float = 0.2
+    rate_window: int = 4
+
+
+@dataclass
+class Segments:
+    """Contiguous sample ranges `[start, end)` of a log, each with a kind code."""
+
+    starts: np.ndarray
+    ends: np.ndarray
+    kinds: np.ndarray
+
+    @classmethod
+    def empty(cls) -> "Segments":
+        return cls(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int8))
+
+    @classmethod
+    def from_condition(
+        cls,
+        kind: str,
+        mask: np.ndarray,
+        breaks: np.ndarray,
+        time_s: np.ndarray,
+        min_duration_s: float = 0.0,
+    ) -> "Segments":
+        """Segments of one kind from the runs of `mask` (see `condition_segments`)."""
+        starts, ends = condition_segments(mask, breaks, time_s, min_duration_s)
+        return cls(starts, ends, np.full(len(starts), SEGMENT_KINDS.index(kind), dtype=np.int8))
+
+    @classmethod
+    def concat(cls, parts: List["Segments"]) -> "Segments":
+        """Combine segment sets, ordered by start index."""
+        if not parts:
+            return cls.empty()
+        starts = np.concatenate([part.starts for part in parts])
+        ends = np.concatenate([part.ends for part in parts])
+        kinds = np.concatenate([part.kinds for part in parts])
+        order = np.lexsort((kinds, starts))
+        return cls(starts[order], ends[order], kinds[order])
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return self.ends - self.starts
+
+    def kind_names(self) -> np.ndarray:
+        return np.asarray(SEGMENT_KINDS)[self.kinds]
+
+    def of_kind(self, kind: str) -> "Segments":
+        keep = self.kinds == SEGMENT_KINDS.index(kind)
+        return Segments(self.starts[keep], self.ends[keep], self.kinds[keep])
+
+    def mask(self, n: int) -> np.ndarray:
+        """Boolean row mask covering every segment."""
+        edges = np.zeros(n + 1, dtype=np.int64)
+        np.add.at(edges, self.starts, 1)
+        np.add.at(edges, self.ends, -1)
+        return np.cumsum(edges[:-1]) > 0
+
+    def labels(self, n: int) -> np.ndarray:
+        """
+        Segment number of every row (-1 outside segments).
+
+        Segments must not overlap (e.g. one kind from `of_kind`), since each
+        row has a single label.
+        """
+        if len(self) > 1 and (np.maximum.accumulate(self.ends)[:-1] > self.starts[1:]).any():
+            raise ValueError("Segment labels need non-overlapping segments; select one kind first.")
+        edges = np.zeros(n + 1, dtype=np.int64)
+        numbers = np.arange(1, len(self) + 1, dtype=np.int64)
+        np.add.at(edges, self.starts, numbers)
+        np.add.at(edges, self.ends, -numbers)
+        return np.cumsum(edges[:-1]) - 1
+
+    def views(self, frame: pd.DataFrame) -> Iterator[pd.DataFrame]:
+        """Positional slices of `frame`, one per segment."""
+        for start, end in zip(self.starts, self.ends):
+            yield frame.iloc[start:end]
+
+    def reduce(self, ufunc: np.ufunc, values: np.ndarray) -> np.ndarray:
+        """`ufunc.reduce` of `values` over every segment."""
+        return reduce_runs(ufunc, values, self.starts, self.ends)
+
+    def to_frame(self, logs: pd.DataFrame) -> pd.DataFrame:
+        """One row per segment with its file, time span and RPM range."""
+        time_s = logs["time_s"].to_numpy(dtype=float)
+        rpm = logs["rpm"].to_numpy(dtype=float)
+        return pd.DataFrame(
+            {
+                "kind": self.kind_names(),
+                "log_file": logs["log_file"].to_numpy()[self.starts],
+                "start": self.starts,
+                "end": self.ends,
+                "start_time_s": time_s[self.starts],
+                "duration_s": time_s[self.ends - 1] - time_s[self.starts],
+                "min_rpm": self.reduce(np.fmin, rpm),
+                "max_rpm": self.reduce(np.fmax, rpm),
+            }
+        )
+
+
+def load_segment_logs(csv_paths: List[Path], cache: Optional[LogCache] = None) -> pd.DataFrame:
+    frames = []
+    for path in csv_paths:
+        frame = read_log(path, SEGMENT_CHANNELS, cache)
+        required = [column for column in SEGMENT_COLUMNS if column != "Vehicle Speed (km/h)"]
+        missing = [column for column in required if column not in frame.columns]
+        if missing:
+            raise ValueError(f"Missing columns {missing} in datalog '{path}'.")
+        present = [column for column in SEGMENT_COLUMNS if column in frame.columns]
+        frame = frame[present].rename(columns=SEGMENT_COLUMNS)
+        frame["log_file"] = path.name
+        frames.append(frame)
+    if not frames:
+        raise ValueError("No datalogs were loaded.")
+    return pd.concat(frames, ignore_index=True)
+
+
+def sample_breaks(logs: pd.DataFrame, max_gap_s: float = MAX_SAMPLE_GAP_S) -> np.ndarray:
+    """True where a sample does not continue the previous one (new file, gap or time reset)."""
+    if logs.empty:
+        return np.zeros(0, dtype=bool)
+    dt = np.diff(logs["time_s"].to_numpy(dtype=float), prepend=np.nan)
+    breaks = ~((dt >= 0) & (dt <= max_gap_s))
+    if "log_file" in logs.columns:
+        files = logs["log_file"].to_numpy()
+        breaks[1:] |= files[1:] != files[:-1]
+    breaks[0] = True
+    return breaks
+
+
+def condition_segments(
+    mask: np.ndarray, breaks: np.ndarray, time_s: np.ndarray, min_duration_s: float = 0.0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Runs of `mask` not crossing a break and lasting at least `min_duration_s`."""
+    starts, ends = run_bounds(mask, breaks)
+    if len(starts):
+        keep = time_s[ends - 1] - time_s[starts] >= min_duration_s
+        starts, ends = starts[keep], ends[keep]
+    return starts, ends
+
+
+def windowed_rate(
+    values: np.ndarray, time_s: np.ndarray, breaks: np.ndarray, window: int
+) -> np.ndarray:
+    """
+    Rate of change over the previous `window` samples (units per second).
+
+    Windows that span a break, or that are not yet full, are NaN.
+    """
+    rate = np.full(len(values), np.nan)
+    if len(values) <= window:
+        return rate
+    crossed = np.cumsum(breaks)
+    dt = time_s[window:] - time_s[:-window]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate[window:] = (values[window:] - values[:-window]) / dt
+    rate[window:][(crossed[window:] != crossed[:-window]) | (dt <= 0)] = np.nan
+    return rate
+
+
+def segment_logs(
+    logs: pd.DataFrame,
+    thresholds: SegmentThresholds = SegmentThresholds(),
+    breaks: Optional[np.ndarray] = None,
+) -> Segments:
+    """
+    Find every segment kind in `logs` (renamed columns, positional order).
+
+    `gear_change` and the standing-still idle check need `vehicle_speed_kmh`;
+    without it gear changes are not detected and idle uses RPM/throttle only.
+    """
+    if logs.empty:
+        return Segments.empty()
+    limits = thresholds
+    breaks = sample_breaks(logs) if breaks is None else breaks
+    time_s = logs["time_s"].to_numpy(dtype=float)
+    rpm = logs["rpm"].to_numpy(dtype=float)
+    throttle = logs["throttle_pct"].to_numpy(dtype=float)
+    load = logs["load_g_rev"].to_numpy(dtype=float)
+    speed = (
+        logs["vehicle_speed_kmh"].to_numpy(dtype=float) if "vehicle_speed_kmh" in logs.columns else None
+    )
+
+    wot = throttle >= limits.wot_throttle_pct
+    idle = (rpm > 0) & (rpm <= limits.idle_max_rpm) & (throttle <= limits.idle_max_throttle_pct)
+    if speed is not None:
+        idle &= speed <= limits.idle_max_speed_kmh
+    dfco = (
+        (rpm >= limits.dfco_min_rpm)
+        & (throttle <= limits.dfco_max_throttle_pct)
+        & (load <= limits.dfco_max_load_g_rev)
+    )
+    with np.errstate(invalid="ignore"):
+        rpm_rate = np.abs(windowed_rate(rpm, time_s, breaks, limits.rate_window))
+        throttle_rate = np.abs(windowed_rate(throttle, time_s, breaks, limits.rate_window))
+        cruise = (
+            (rpm >= limits.cruise_min_rpm)
+            & (throttle >= limits.cruise_min_throttle_pct)
+            & ~wot
+            & (rpm_rate <= limits.cruise_max_rpm_rate)
+            & (throttle_rate <= limits.cruise_max_throttle_rate)
+        )
+
+    conditions = [
+        ("wot", wot, limits.min_wot_s),
+        ("cruise", cruise, limits.min_cruise_s),
+        ("idle", idle, limits.min_idle_s),
+        ("dfco", dfco, limits.min_dfco_s),
+    ]
+    if speed is not None:
+        moving = speed >= limits.gear_min_speed_kmh
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_ratio = np.log(np.where(moving & (rpm > 0), rpm / speed, np.nan))
+            ratio_rate = np.abs(windowed_rate(log_ratio, time_s, breaks, limits.rate_window))
+            shifting = ratio_rate > limits.gear_ratio_rate
+        conditions.append(("gear_change", shifting, limits.min_gear_change_s))
+
+    return Segments.concat(
+        [
+            Segments.from_condition(kind, mask, breaks, time_s, min_duration_s)
+            for kind, mask, min_duration_s in conditions
+        ]
+    )
+
+
+def summarize_segments(segments: Segments, logs: pd.DataFrame) -> pd.DataFrame:
+    """Count and total/longest duration per segment kind."""
+    frame = segments.to_frame(logs)
+    if frame.empty:
+        return pd.DataFrame()
+    return (
+        frame.groupby("kind", sort=False)
+        .agg(
+            segments=("duration_s", "size"),
+            total_s=("duration_s", "sum"),
+            longest_s=("duration_s", "max"),
+        )
+        .reindex([kind for kind in SEGMENT_KINDS if kind in set(frame["kind"])])
+        .reset_index()
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Split datalogs into WOT, cruise, idle, DFCO and gear-change segments."
+    )
+    parser.add_argument("--logs", type=Path, nargs="+", required=True, help="One or more CSV datalog files to segment.")
+    parser.add_argument("--output", type=Path, help="Optional path to save the segment list as CSV.")
+    parser.add_argument(
+        "--kind",
+        choices=SEGMENT_KINDS,
+        action="append",
+        help="Only list segments of this kind (repeatable; default: all kinds).",
+    )
+    parser.add_argument(
+        "--log-cache",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory for the parsed-datalog cache (default: {DEFAULT_CACHE_DIR}).",
+    )
+    parser.add_argument(
+        "--no-log-cache",
+        action="store_true",
+        help="Always parse datalog CSVs instead of using the parsed-datalog cache.",
+    )
+
+    args = parser.parse_args()
+
+    cache = None if args.no_log_cache else LogCache(args.log_cache)
+    logs = load_segment_logs(args.logs, cache)
+    segments = segment_logs(logs)
+    if args.kind:
+        segments = Segments.concat([segments.of_kind(kind) for kind in args.kind])
+
+    summary = summarize_segments(segments, logs)
+    print("### Segments by Kind")
+    print(
+        "_No data available._"
+        if summary.empty
+        else summary.to_string(index=False, float_format=lambda val: f"{val:.2f}")
+    )
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        segments.to_frame(logs).to_csv(args.output, index=False)
+        print(f"\nSegment list saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
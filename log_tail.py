@@ -0,0 +1,71 @@
+"""
+Incremental reader for a datalog CSV that is still being written.
+
+`LogTail` remembers the byte offset of the last complete line it parsed, so
+each `poll` reads and parses only the lines appended since the previous call
+(O(new rows) per update). A trailing line without a newline is left for the
+next poll, and a file that shrinks (logger restarted) is reread from the top.
+"""
+
+from __future__ import annotations
+
+import io
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import pandas as pd
+
+
+class LogTail:
+    """
+    Follow a growing CSV datalog, yielding newly appended rows as DataFrames.
+
+    When `columns` is given only those CSV columns are parsed.
+    """
+
+    def __init__(self, path: Path, columns: Optional[Iterable[str]] = None) -> None:
+        self.path = Path(path)
+        self.columns = None if columns is None else frozenset(columns)
+        self.header: Optional[str] = None
+        self.offset = 0
+        self.rows_read = 0
+        self.restarted = False
+
+    def _reset(self) -> None:
+        self.header = None
+        self.offset = 0
+        self.rows_read = 0
+        self.restarted = True
+
+    def poll(self) -> pd.DataFrame:
+        """Rows appended since the last poll (empty when there is nothing new)."""
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            return pd.DataFrame()
+        if size < self.offset:
+            self._reset()
+        if size == self.offset:
+            return pd.DataFrame()
+
+        with self.path.open("rb") as handle:
+            handle.seek(self.offset)
+            data = handle.read(size - self.offset)
+        complete = data.rfind(b"\n") + 1
+        if complete == 0:
+            return pd.DataFrame()
+        self.offset += complete
+        text = data[:complete].decode("utf-8-sig" if self.header is None else "utf-8")
+
+        lines: List[str] = text.splitlines(keepends=True)
+        if self.header is None:
+            self.header, lines = lines[0], lines[1:]
+        lines = [line for line in lines if line.strip()]
+        if not lines:
+            return pd.DataFrame()
+
+        usecols = None if self.columns is None else (lambda column: column in self.columns)
+        frame = pd.read_csv(io.StringIO(self.header + "".join(lines)), usecols=usecols)
+        frame.index = pd.RangeIndex(self.rows_read, self.rows_read + len(frame))
+        self.rows_read += len(frame)
+        return frame
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+"""
+MAF scaling analysis against the `maf_scale` table.
+
+`fueling_analysis.py` pushes every fueling error into `fuel_base`, although
+much of it usually comes from the MAF calibration. This script bins closed-loop
+trims and open-loop lambda error by `maf_scale` breakpoint and suggests
+corrected g/s values, using the same change-limit and clamping semantics as
+`apply_fuel_base_modifications`.
+
+The tune stores `maf_scale` as 64 g/s values without a voltage index map (see
+`ECU_TUNE_FILE_MODEL.md`). By default each sample is therefore placed on the
+table by inverting `maf_scale` with the logged `Mass Air Flow (g/s)`, which
+recovers its position between breakpoints exactly as the ECU looked it up.
+When the breakpoint voltages are known, `--voltage-axis` bins the logged
+`Mass Air Flow Voltage (V)` on an evenly spaced axis instead. Either way each
+sample is split between its two neighbouring breakpoints by linear weight.
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from cell_binning import MISSING_INDEX, axis_weights
+from data_quality import describe_glitches
+from fueling_analysis import (
+    FUELING_CHANNELS,
+    RENAMED_COLUMNS,
+    PrepareOptions,
+    bin_logs,
+    classify_logs,
+    clean_logs,
+    load_logs,
+    load_tune,
+    split_loop_rows,
+)
+from log_cache import DEFAULT_CACHE_DIR, LogCache
+from log_schema import EXACT, merge_channels
+from tune_file import TuneFile
+from tune_writer import MapCorrection, write_tune
+
+
+MAF_FLOW_COLUMN = "Mass Air Flow (g/s)"
+MAF_VOLTAGE_COLUMN = "Mass Air Flow Voltage (V)"
+
+# Channels read in addition to FUELING_CHANNELS; both are binned against the
+# maf_scale axis, so they stay float64.
+MAF_CHANNELS = {MAF_FLOW_COLUMN: EXACT, MAF_VOLTAGE_COLUMN: EXACT}
+
+
+def monotonic_prefix(maf_scale: np.ndarray) -> int:
+    """Number of leading breakpoints with strictly increasing g/s (the usable range)."""
+    steps = np.diff(maf_scale)
+    flat = np.flatnonzero(steps <= 0)
+    return int(flat[0] + 1) if flat.size else len(maf_scale)
+
+
+def breakpoint_weights(
+    rows: pd.DataFrame,
+    maf_scale: np.ndarray,
+    voltage_axis: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Lower `maf_scale` breakpoint and upper-breakpoint weight for every row."""
+    if voltage_axis is not None:
+        return axis_weights(rows[MAF_VOLTAGE_COLUMN].to_numpy(dtype=float), voltage_axis)
+    usable = monotonic_prefix(maf_scale)
+    return axis_weights(rows[MAF_FLOW_COLUMN].to_numpy(dtype=float), maf_scale[:usable])
+
+
+def summarize_maf(
+    rows: pd.DataFrame,
+    correction: np.ndarray,
+    maf_scale: np.ndarray,
+    min_samples: float,
+    voltage_axis: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
+    """
+    Per-breakpoint mean airflow correction factor.
+
+    `correction` is the multiplicative error per row (measured airflow should
+    be multiplied by it). Each row is split between its neighbouring
+    breakpoints by linear weight; `min_samples` applies to the per-breakpoint
+    weight total.
+    """
+    if rows.empty:
+        return pd.DataFrame()
+    lower, upper_weight = breakpoint_weights(rows, maf_scale, voltage_axis)
+    valid = (lower != MISSING_INDEX) & np.isfinite(correction)
+    lower, upper_weight, correction = lower[valid], upper_weight[valid], correction[valid]
+    voltage = rows[MAF_VOLTAGE_COLUMN].to_numpy(dtype=float)[valid]
+
+    points = len(maf_scale)
+    index = np.concatenate((lower, np.minimum(lower + 1, points - 1)))
+    weight = np.concatenate((1.0 - upper_weight, upper_weight))
+    values = np.concatenate((correction, correction))
+    volts = np.concatenate((voltage, voltage))
+
+    total_weight = np.bincount(index, weights=weight, minlength=points)
+    samples = np.bincount(index[weight > 0], minlength=points)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_correction = np.bincount(index, weights=weight * values, minlength=points) / total_weight
+        mean_voltage = np.bincount(index, weights=weight * volts, minlength=points) / total_weight
+
+    breakpoint = np.flatnonzero((total_weight >= min_samples) & (total_weight > 0))
+    summary = pd.DataFrame(
+        {
+            "breakpoint": breakpoint,
+            "voltage": voltage_axis[breakpoint] if voltage_axis is not None else mean_voltage[breakpoint],
+            "samples": samples[breakpoint],
+            "weight": total_weight[breakpoint],
+            "current_maf_scale": maf_scale[breakpoint],
+            "mean_correction_pct": (mean_correction[breakpoint] - 1.0) * 100.0,
+            "suggested_maf_scale": maf_scale[breakpoint] * mean_correction[breakpoint],
+        }
+    )
+    return summary.sort_values(by="mean_correction_pct", key=lambda col: col.abs(), ascending=False)
+
+
+def analyze_maf(
+    logs: pd.DataFrame,
+    maf_scale: np.ndarray,
+    min_samples: float,
+    voltage_axis: Optional[np.ndarray] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Open-loop (lambda ratio) and closed-loop (combined trim) MAF summaries of prepared logs."""
+    open_rows, closed_rows = split_loop_rows(logs)
+    open_summary = summarize_maf(
+        open_rows,
+        open_rows["lambda_ratio"].to_numpy(dtype=float) if not open_rows.empty else np.zeros(0),
+        maf_scale,
+        min_samples,
+        voltage_axis,
+    )
+    closed_summary = summarize_maf(
+        closed_rows,
+        1.0 + closed_rows["combined_trim"].to_numpy(dtype=float) / 100.0,
+        maf_scale,
+        min_samples,
+        voltage_axis,
+    )
+    return open_summary, closed_summary
+
+
+def generate_maf_report(
+    open_summary: pd.DataFrame,
+    closed_summary: pd.DataFrame,
+    output_path: Optional[Path],
+) -> None:
+    def _format(df: pd.DataFrame) -> str:
+        if df.empty:
+            return "_No data available._"
+        return df.to_string(index=False, float_format=lambda val: f"{val:.3f}")
+
+    open_section = "### Open-Loop MAF Scaling (PE) Summary\n" + _format(open_summary) + "\n"
+    closed_section = "### Closed-Loop MAF Scaling Summary\n" + _format(closed_summary) + "\n"
+
+    if output_path:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(open_section + "\n" + closed_section, encoding="utf-8")
+
+    print(open_section)
+    print(closed_section)
+
+
+def apply_maf_scale_modifications(
+    tune_path: Path,
+    open_summary: pd.DataFrame,
+    closed_summary: pd.DataFrame,
+    output_tune_path: Path,
+    change_limit_pct: float = 5.0,
+    modify_tune_path: Optional[Path] = None,
+    source_tune: Optional[TuneFile] = None,
+) -> None:
+    """
+    Write suggested `maf_scale` values to a new tune file.
+
+    Same semantics as `fueling_analysis.apply_fuel_base_modifications`:
+    open-loop suggestions take precedence, changes are limited to
+    +/-change_limit_pct% of the source tune's values (clamped and reported),
+    and the result only depends on the source tune, so reruns are idempotent.
+    """
+    source_tune = source_tune if source_tune is not None else TuneFile.load(tune_path)
+    source_scale = source_tune.vector("maf_scale")
+
+    # The zero-flow anchor is never rescaled: percent limits leave zero cells alone.
+    corrections = [
+        MapCorrection.from_summary(
+            "maf_scale", summary, "suggested_maf_scale", ("breakpoint",), change_limit_pct, source=source
+        )
+        for source, summary in (("closed", closed_summary), ("open", open_summary))
+    ]
+    update = write_tune(source_tune, corrections, output_tune_path, modify_tune_path)["maf_scale"]
+    modified_scale = update.values[0]
+
+    print(f"\nModified tune file saved to: {output_tune_path}")
+    print(f"Applied {update.requested} maf_scale modifications (limit: +/-{change_limit_pct}% from source).")
+    usable = monotonic_prefix(source_scale)
+    if np.any(np.diff(modified_scale[:usable]) <= 0):
+        print("WARNING: modified maf_scale is no longer strictly increasing; review before flashing.")
+    clamped = np.flatnonzero(update.clamped)
+    if len(clamped):
+        clamped = clamped[np.argsort(update.cols[clamped], kind="stable")]
+        print(f"\nWARNING: {len(clamped)} modifications exceeded the +/-{change_limit_pct}% limit and were clamped:")
+        print("   Point  Original  Suggested  Clamped   Change%  Source")
+        print("   " + "-" * 55)
+        for cell in clamped:
+            print(
+                f"   {update.cols[cell]:5d}  {update.original[cell]:8.2f}  {update.suggested[cell]:9.2f}  "
+                f"{update.written[cell]:7.2f}   {update.change[cell]:6.1f}%  {update.sources[cell]}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Analyze MAF calibration error per maf_scale breakpoint and suggest "
+            "corrected values. See ECU_TUNE_FILE_MODEL.md for map structure details."
+        )
+    )
+    parser.add_argument("--tune", type=Path, required=True, help="Path to the JSON-formatted tune file.")
+    parser.add_argument("--logs", type=Path, nargs="+", required=True, help="One or more CSV datalog files to analyze.")
+    parser.add_argument("--output", type=Path, help="Optional path to save a Markdown summary.")
+    parser.add_argument(
+        "--output-tune",
+        type=Path,
+        help="Optional path to save a modified tune file with updated maf_scale values.",
+    )
+    parser.add_argument(
+        "--modify-tune",
+        type=Path,
+        help="Optional tune file to modify. If not specified, uses --tune file as the source for modifications.",
+    )
+    parser.add_argument(
+        "--min-samples",
+        type=float,
+        default=5,
+        help="Minimum (interpolation-weighted) hits per breakpoint before suggesting a change (default: 5).",
+    )
+    parser.add_argument(
+        "--change-limit",
+        type=float,
+        default=5.0,
+        help="Maximum percent change allowed for maf_scale modifications (default: 5.0%%).",
+    )
+    parser.add_argument(
+        "--voltage-axis",
+        type=float,
+        nargs=2,
+        metavar=("FIRST_V", "LAST_V"),
+        help=(
+            "Bin the MAF voltage channel on evenly spaced breakpoints from FIRST_V to "
+            "LAST_V instead of inverting maf_scale with the logged g/s."
+        ),
+    )
+    parser.add_argument(
+        "--no-glitch-filter",
+        action="store_true",
+        help="Keep sensor glitches (spikes, flatlines, out-of-range values) instead of masking them.",
+    )
+    parser.add_argument(
+        "--log-cache",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory for the parsed-datalog cache (default: {DEFAULT_CACHE_DIR}).",
+    )
+    parser.add_argument(
+        "--no-log-cache",
+        action="store_true",
+        help="Always parse datalog CSVs instead of using the parsed-datalog cache.",
+    )
+
+    args = parser.parse_args()
+
+    tune_file = TuneFile.load(args.tune)
+    tune = load_tune(tune_file)
+    maf_scale = tune_file.vector("maf_scale")
+    voltage_axis = (
+        np.linspace(args.voltage_axis[0], args.voltage_axis[1], len(maf_scale))
+        if args.voltage_axis
+        else None
+    )
+    cache = None if args.no_log_cache else LogCache(args.log_cache, RENAMED_COLUMNS)
+
+    logs = load_logs(args.logs, cache, merge_channels(FUELING_CHANNELS, MAF_CHANNELS))
+    missing = [column for column in (MAF_FLOW_COLUMN, MAF_VOLTAGE_COLUMN) if column not in logs.columns]
+    if missing:
+        raise ValueError(f"Missing MAF columns {missing} in datalogs.")
+    rows = len(logs)
+    logs, glitches = clean_logs(logs, PrepareOptions(reject_glitches=not args.no_glitch_filter))
+    logs = classify_logs(bin_logs(logs, tune), tune)
+    if glitches is not None:
+        print(describe_glitches(glitches, rows))
+
+    open_summary, closed_summary = analyze_maf(logs, maf_scale, args.min_samples, voltage_axis)
+    generate_maf_report(open_summary, closed_summary, args.output)
+
+    if args.output_tune:
+        apply_maf_scale_modifications(
+            args.tune,
+            open_summary,
+            closed_summary,
+            args.output_tune,
+            change_limit_pct=args.change_limit,
+            modify_tune_path=args.modify_tune,
+            source_tune=tune_file,
+        )
+
+
+if __name__ == "__main__":
+    main()
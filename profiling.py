@@ -0,0 +1,267 @@
+"""
+Opt-in per-stage profiling for the analysis scripts (`--profile`).
+
+A `Profiler` times named stages (load, filter, bin, classify, summarize,
+report, tune write) with `with profiler.stage("load") as stage: ...` and
+records for each one the wall time, CPU time (`time.process_time`), rows
+processed (set by the caller on `stage.rows`) and peak RSS. Stages may nest
+and may repeat, e.g. once per chunk in streaming mode; repeats are summed per
+stage name and every call is kept as a trace event.
+
+Peak RSS is per stage on Linux: the kernel's high-water mark is reset through
+`/proc/self/clear_refs` when a stage starts and read from `VmHWM` when it
+ends, and a parent stage's peak includes its children's. Where that is not
+available the process-lifetime peak (`resource.getrusage`) is reported
+instead, and `rss_scope` says which one it is.
+
+`Profiler.write` produces one JSON file with a `stages` summary and
+`traceEvents` in the Chrome trace format, so the same file loads in
+chrome://tracing or Perfetto. `DISABLED` is the profiler used when
+`--profile` is not given: `stage()` returns a shared no-op context manager
+and `iterate()` returns its argument, so instrumented code costs a method
+call per stage.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+_T = TypeVar("_T")
+
+_CLEAR_REFS = Path("/proc/self/clear_refs")
+_STATUS = Path("/proc/self/status")
+
+
+def _read_hwm_bytes() -> Optional[int]:
+    try:
+        with _STATUS.open("r", encoding="ascii") as handle:
+            for line in handle:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_hwm() -> bool:
+    """Reset the kernel's peak-RSS counter; False when this is not supported."""
+    try:
+        with _CLEAR_REFS.open("w", encoding="ascii") as handle:
+            handle.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def _process_peak_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    return int(peak if sys.platform == "darwin" else peak * 1024)
+
+
+@dataclass
+class StageRecord:
+    """One timed call of a stage."""
+
+    name: str
+    start_s: float  # since the profiler was created
+    wall_s: float
+    cpu_s: float
+    rows: Optional[int] = None
+    peak_rss_bytes: Optional[int] = None
+    depth: int = 0
+
+
+class _NullStage:
+    """Stage handle of a disabled profiler; accepts and ignores `rows`."""
+
+    __slots__ = ("rows",)
+
+    def __enter__(self) -> "_NullStage":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> bool:
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """Context manager timing one stage call of an enabled profiler."""
+
+    __slots__ = ("profiler", "name", "rows", "_start", "_cpu", "_child_peak")
+
+    def __init__(self, profiler: "Profiler", name: str, rows: Optional[int]) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.rows = rows
+        self._child_peak: Optional[int] = None
+
+    def __enter__(self) -> "_Stage":
+        stack = self.profiler._stack
+        if self.profiler.rss_scope == "stage":
+            if stack:
+                # Keep the parent's peak so far before the counter is reset.
+                parent = stack[-1]
+                parent._child_peak = max(filter(None, (parent._child_peak, _read_hwm_bytes())), default=None)
+            _reset_hwm()
+        stack.append(self)
+        self._cpu = time.process_time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> bool:
+        wall = time.perf_counter() - self._start
+        cpu = time.process_time() - self._cpu
+        profiler = self.profiler
+        profiler._stack.pop()
+        if profiler.rss_scope == "stage":
+            peak = max(filter(None, (_read_hwm_bytes(), self._child_peak)), default=None)
+            if profiler._stack:
+                parent = profiler._stack[-1]
+                parent._child_peak = max(filter(None, (parent._child_peak, peak)), default=None)
+        else:
+            peak = _process_peak_bytes()
+        profiler.records.append(
+            StageRecord(
+                name=self.name,
+                start_s=self._start - profiler.started,
+                wall_s=wall,
+                cpu_s=cpu,
+                rows=None if self.rows is None else int(self.rows),
+                peak_rss_bytes=peak,
+                depth=len(profiler._stack),
+            )
+        )
+        return False
+
+
+@dataclass
+class Profiler:
+    """Collects `StageRecord`s for named stages; see the module docstring."""
+
+    enabled: bool = True
+    records: List[StageRecord] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        self._stack: List[_Stage] = []
+        self.started = time.perf_counter()
+        self.rss_scope = "stage" if self.enabled and _reset_hwm() and _read_hwm_bytes() else "process"
+
+    def stage(self, name: str, rows: Optional[int] = None) -> Any:
+        """Context manager timing `name`; set `.rows` on the returned handle."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, rows)
+
+    def iterate(self, name: str, items: Iterable[_T]) -> Iterator[_T]:
+        """
+        Yield from `items`, timing each fetch as a call of stage `name` (e.g.
+        parsing the next chunk of a streamed log) with `len(item)` as rows.
+        """
+        if not self.enabled:
+            return iter(items)
+        return self._iterate(name, iter(items))
+
+    def _iterate(self, name: str, items: Iterator[_T]) -> Iterator[_T]:
+        while True:
+            with self.stage(name) as stage:
+                item = next(items, None)
+                stage.rows = len(item) if item is not None and hasattr(item, "__len__") else None
+            if item is None:
+                self.records.pop()  # the exhausted fetch is not a call
+                return
+            yield item
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Per-stage totals in first-call order: nesting depth, calls, wall/CPU time, rows and peak RSS."""
+        totals: Dict[str, Dict[str, Any]] = {}
+        for record in sorted(self.records, key=lambda item: item.start_s):
+            total = totals.setdefault(
+                record.name,
+                {
+                    "stage": record.name,
+                    "depth": record.depth,
+                    "calls": 0,
+                    "wall_s": 0.0,
+                    "cpu_s": 0.0,
+                    "rows": None,
+                    "peak_rss_bytes": None,
+                },
+            )
+            total["calls"] += 1
+            total["wall_s"] += record.wall_s
+            total["cpu_s"] += record.cpu_s
+            if record.rows is not None:
+                total["rows"] = (total["rows"] or 0) + record.rows
+            if record.peak_rss_bytes is not None:
+                total["peak_rss_bytes"] = max(total["peak_rss_bytes"] or 0, record.peak_rss_bytes)
+        return list(totals.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        pid = os.getpid()
+        return {
+            "command": sys.argv,
+            "total_wall_s": time.perf_counter() - self.started,
+            "rss_scope": self.rss_scope,
+            "stages": self.summary(),
+            "traceEvents": [
+                {
+                    "name": record.name,
+                    "cat": "stage",
+                    "ph": "X",
+                    "ts": record.start_s * 1e6,
+                    "dur": record.wall_s * 1e6,
+                    "pid": pid,
+                    "tid": 0,
+                    "args": {
+                        "cpu_s": record.cpu_s,
+                        "rows": record.rows,
+                        "peak_rss_bytes": record.peak_rss_bytes,
+                    },
+                }
+                for record in self.records
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def write(self, path: Path) -> None:
+        """Write the summary and trace events as JSON."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=1) + "\n", encoding="utf-8")
+
+    def format_table(self) -> str:
+        """Plain-text per-stage summary for the console."""
+        lines = [
+            f"Profile (peak RSS per {self.rss_scope}):",
+            f"  {'stage':<18} {'calls':>6} {'wall (s)':>10} {'cpu (s)':>10} {'rows':>10} {'peak RSS MB':>12}",
+        ]
+        for total in self.summary():
+            rows = "-" if total["rows"] is None else str(total["rows"])
+            peak = "-" if total["peak_rss_bytes"] is None else f"{total['peak_rss_bytes'] / 1e6:.1f}"
+            name = "  " * total["depth"] + total["stage"]
+            lines.append(
+                f"  {name:<18} {total['calls']:>6} {total['wall_s']:>10.4f} "
+                f"{total['cpu_s']:>10.4f} {rows:>10} {peak:>12}"
+            )
+        return "\n".join(lines)
+
+
+# Profiler used when profiling is off.
+DISABLED = Profiler(enabled=False)
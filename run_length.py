@@ -0,0 +1,87 @@
+"""
+Vectorized run-length helpers for boolean datalog conditions.
+
+Time-series logic such as ECU delay counters is expressed over runs of
+consecutive samples that satisfy a condition. These helpers compute run
+positions with cumulative maxima and run boundaries with shifted comparisons
+instead of per-row Python loops.
+"""
+
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def run_lengths(
+    mask: np.ndarray,
+    breaks: Optional[np.ndarray] = None,
+    initial: int = 0,
+) -> np.ndarray:
+    """
+    Length of the current run of True samples, counting the sample itself.
+
+    False samples get 0. `breaks` marks samples where any run restarts (for
+    example a new log file or a gap in the time base). `initial` is the run
+    length carried in from a previous chunk and continues into a leading run
+    unless the first sample is a break.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    n = len(mask)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if breaks is None:
+        breaks = np.zeros(n, dtype=bool)
+
+    positions = np.arange(n, dtype=np.int64)
+    previous = np.concatenate(([initial > 0], mask[:-1]))
+    starts = mask & (~previous | breaks)
+    resets = np.where(starts | ~mask, positions, -1)
+    last_reset = np.maximum.accumulate(resets)
+
+    lengths = np.where(last_reset >= 0, positions - last_reset + 1, positions + 1 + initial)
+    return np.where(mask, lengths, 0).astype(np.int64)
+
+
+def run_bounds(
+    mask: np.ndarray, breaks: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Start and end (exclusive) index of every run of True samples.
+
+    This is the run-length encoding of `mask`; `breaks` splits runs at the
+    marked samples in the same way as `run_lengths`.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    n = len(mask)
+    if n == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    if breaks is None:
+        breaks = np.zeros(n, dtype=bool)
+
+    previous = np.concatenate(([False], mask[:-1]))
+    following = np.concatenate((mask[1:], [False]))
+    next_breaks = np.concatenate((breaks[1:], [True]))
+    starts = np.flatnonzero(mask & (~previous | breaks))
+    ends = np.flatnonzero(mask & (~following | next_breaks)) + 1
+    return starts.astype(np.int64), ends.astype(np.int64)
+
+
+def reduce_runs(
+    ufunc: np.ufunc, values: np.ndarray, starts: np.ndarray, ends: np.ndarray
+) -> np.ndarray:
+    """
+    Apply `ufunc.reduce` to `values[start:end]` for every run in one call.
+
+    Runs must be non-empty and non-overlapping (as returned by `run_bounds`).
+    """
+    values = np.asarray(values)
+    if len(starts) == 0:
+        return np.zeros(0, dtype=values.dtype)
+    # reduceat reduces between consecutive indices, so interleave the run
+    # bounds and keep every other result; the padding makes `end == n` valid.
+    padded = np.concatenate((values, values[:1]))
+    bounds = np.column_stack((starts, ends)).ravel()
+    return ufunc.reduceat(padded, bounds)[::2]
@@ -0,0 +1,137 @@
+"""
+Wideband lag estimation and compensation.
+
+The wideband reading (`Air/Fuel Sensor #1 (λ)`) trails the fueling command by
+the exhaust transport and sensor delay, so pairing each lambda sample with the
+same row's RPM/load smears errors into neighbouring cells during transients.
+`estimate_lag` finds that delay by FFT cross-correlation of the differenced
+reference (injector pulse width by default) against the differenced lambda
+signal, and `align_lambda` shifts lambda back onto the rows that caused it.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from cell_binning import MISSING_INDEX, axis_indices
+from data_quality import file_bounds
+
+
+# Longest wideband delay searched for, in log samples (~1 s at typical rates).
+DEFAULT_MAX_LAMBDA_LAG = 20
+
+# Minimum reference samples an RPM band needs for its own lag estimate.
+MIN_BAND_SAMPLES = 200
+
+
+def _whiten(values: np.ndarray) -> np.ndarray:
+    """First difference with NaNs zeroed, so the correlation tracks transients."""
+    diff = np.diff(np.asarray(values, dtype=float), prepend=np.nan)
+    diff[~np.isfinite(diff)] = 0.0
+    return diff - diff.mean() if diff.size else diff
+
+
+def lag_correlation(
+    reference: np.ndarray, response: np.ndarray, max_lag: int
+) -> np.ndarray:
+    """
+    Normalized cross-correlation `sum(reference[t] * response[t + k]) / (n - k)`
+    for k = 0..max_lag, computed with one FFT pair.
+    """
+    n = len(reference)
+    max_lag = min(max_lag, n - 1)
+    if max_lag < 0:
+        return np.zeros(0)
+    nfft = 1 << int(np.ceil(np.log2(max(2 * n, 2))))
+    spectrum = np.conj(np.fft.rfft(reference, nfft)) * np.fft.rfft(response, nfft)
+    correlation = np.fft.irfft(spectrum, nfft)[: max_lag + 1]
+    return correlation / (n - np.arange(max_lag + 1))
+
+
+def estimate_lag(
+    reference: np.ndarray,
+    response: np.ndarray,
+    max_lag: int = DEFAULT_MAX_LAMBDA_LAG,
+    reference_mask: Optional[np.ndarray] = None,
+    inverse: bool = True,
+) -> int:
+    """
+    Delay (in samples) by which `response` follows `reference`.
+
+    With `inverse`, the response is expected to move against the reference
+    (more injector pulse width drives lambda down). `reference_mask` limits the
+    estimate to reference samples of interest, e.g. one RPM band.
+    """
+    ref = _whiten(reference)
+    if reference_mask is not None:
+        ref = np.where(reference_mask, ref, 0.0)
+    correlation = lag_correlation(ref, _whiten(response), max_lag)
+    if correlation.size == 0 or not np.any(correlation):
+        return 0
+    if inverse:
+        correlation = -correlation
+    return int(np.argmax(correlation))
+
+
+def shift_back(values: np.ndarray, lags: np.ndarray) -> np.ndarray:
+    """`result[i] = values[i + lags[i]]`; rows shifted past the end become NaN."""
+    values = np.asarray(values, dtype=float)
+    source = np.arange(len(values)) + np.asarray(lags, dtype=np.int64)
+    result = np.full(len(values), np.nan)
+    valid = source < len(values)
+    result[valid] = values[source[valid]]
+    return result
+
+
+def align_lambda(
+    logs: pd.DataFrame,
+    max_lag: int = DEFAULT_MAX_LAMBDA_LAG,
+    rpm_bands: Optional[Sequence[float]] = None,
+    reference_column: str = "ipw_ms",
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Shift `lambda_actual` back by the estimated wideband delay of each log.
+
+    Returns the aligned lambda column and the lag (samples) applied to each
+    row. With `rpm_bands` (breakpoints, lower-bound binning) a lag is estimated
+    per band from that band's samples, falling back to the log-wide lag for
+    sparse bands. Shifts never cross log file boundaries.
+    """
+    if reference_column not in logs.columns:
+        reference_column = "load_g_rev"
+    lambda_actual = logs["lambda_actual"].to_numpy(dtype=float)
+    reference = logs[reference_column].to_numpy(dtype=float)
+    rpm = logs["rpm"].to_numpy(dtype=float)
+
+    starts, ends = file_bounds(logs)
+
+    aligned = np.full(len(logs), np.nan)
+    lags = np.zeros(len(logs), dtype=np.int64)
+    for start, end in zip(starts, ends):
+        ref = reference[start:end]
+        lam = lambda_actual[start:end]
+        log_lag = estimate_lag(ref, lam, max_lag)
+        row_lags = np.full(end - start, log_lag, dtype=np.int64)
+
+        if rpm_bands is not None:
+            band = axis_indices(rpm[start:end], np.asarray(rpm_bands, dtype=float))
+            for band_idx in np.unique(band[band != MISSING_INDEX]):
+                in_band = band == band_idx
+                if in_band.sum() < MIN_BAND_SAMPLES:
+                    continue
+                row_lags[in_band] = estimate_lag(ref, lam, max_lag, reference_mask=in_band)
+
+        aligned[start:end] = shift_back(lam, row_lags)
+        lags[start:end] = row_lags
+    return aligned, lags
+
+
+def describe_lags(logs: pd.DataFrame) -> Dict[str, float]:
+    """Mean applied lag (samples) per log file, for reporting."""
+    if "lambda_lag" not in logs.columns:
+        return {}
+    grouped = logs.groupby("log_file")["lambda_lag"].mean()
+    return {str(name): float(value) for name, value in grouped.items()}
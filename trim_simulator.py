@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+"""
+Closed-loop trim convergence simulator for proposed `fuel_base` tables.
+
+Replays recorded datalogs against candidate tables instead of waiting for
+another drive. For every logged row the fuel the engine actually needed is
+taken as `fuel_base(row) * (1 + trim / 100)`, with `fuel_base` interpolated
+bilinearly between the four surrounding cells as the ECU does. Under a
+candidate table the same demand implies a new combined trim (closed loop) or a
+rescaled lambda (open loop). Long-term trim learning is then iterated per cell:
+each pass the LTFT moves by `learn_rate` of the mean STFT it leaves behind,
+which predicts where STFT/LTFT settle after the change.
+
+Everything is vectorized over candidate tables (`(k, rpm, load)` arrays), so
+dozens of candidates are evaluated per second.
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from cell_binning import bilinear_cells
+from fueling_analysis import (
+    RENAMED_COLUMNS,
+    PrepareOptions,
+    TuneFuelBase,
+    load_logs,
+    load_tune,
+    prepare_logs,
+    split_loop_rows,
+)
+from log_cache import DEFAULT_CACHE_DIR, LogCache
+from tune_file import TuneFile
+
+
+DEFAULT_ITERATIONS = 5
+DEFAULT_LEARN_RATE = 0.5
+
+# LTFT authority of the ECU (percent); learning saturates here.
+LTFT_LIMIT_PCT = 25.0
+
+
+@dataclass
+class ReplayData:
+    """Logged rows reduced to what the replay needs, shared by all candidates."""
+
+    shape: tuple
+    corners: np.ndarray  # (n, 4) flat indices of the cells the ECU interpolates
+    corner_weights: np.ndarray  # (n, 4) bilinear weights
+    cell: np.ndarray  # (n,) flat lower-breakpoint cell, for per-cell reporting
+    closed: np.ndarray  # (n,) True for closed-loop rows
+    demand: np.ndarray  # (n,) fuel needed, in fuel_base units
+    ltft: np.ndarray  # (n,) logged long-term trim (%)
+    lambda_ratio: np.ndarray  # (n,) logged actual/target lambda (open-loop rows)
+    base_fuel: np.ndarray  # (n,) interpolated fuel_base of the logged tune
+
+    @property
+    def cells(self) -> int:
+        return int(np.prod(self.shape))
+
+
+@dataclass
+class SimulationResult:
+    """Per-candidate predictions; cell arrays are flat `(k, cells)` or `(k, iterations, cells)`."""
+
+    names: List[str]
+    shape: tuple
+    samples: np.ndarray  # (cells,) closed-loop rows per cell
+    combined_trim: np.ndarray  # (k, cells) predicted STFT + LTFT
+    stft: np.ndarray  # (k, iterations + 1, cells)
+    ltft: np.ndarray  # (k, iterations + 1, cells)
+    open_samples: np.ndarray  # (cells,) open-loop rows per cell
+    lambda_error_pct: np.ndarray  # (k, cells) predicted open-loop lambda error
+
+    def score_table(self) -> pd.DataFrame:
+        """Sample-weighted mean absolute trims/errors per candidate."""
+        closed_weights = np.maximum(self.samples, 0)
+        open_weights = np.maximum(self.open_samples, 0)
+
+        def _mean_abs(values: np.ndarray, weights: np.ndarray) -> np.ndarray:
+            if weights.sum() == 0:
+                return np.full(values.shape[0], np.nan)
+            return np.nansum(np.abs(values) * weights, axis=-1) / weights.sum()
+
+        return pd.DataFrame(
+            {
+                "candidate": self.names,
+                "abs_trim_pct": _mean_abs(self.combined_trim, closed_weights),
+                "final_abs_stft_pct": _mean_abs(self.stft[:, -1], closed_weights),
+                "final_abs_ltft_pct": _mean_abs(self.ltft[:, -1], closed_weights),
+                "open_abs_lambda_error_pct": _mean_abs(self.lambda_error_pct, open_weights),
+            }
+        )
+
+    def cell_table(self, candidate: int) -> pd.DataFrame:
+        """Per-cell STFT/LTFT trajectory of one candidate for cells with samples."""
+        rpm_idx, load_idx = np.unravel_index(np.flatnonzero(self.samples), self.shape)
+        flat = np.ravel_multi_index((rpm_idx, load_idx), self.shape)
+        table = pd.DataFrame(
+            {
+                "rpm_idx": rpm_idx,
+                "load_idx": load_idx,
+                "samples": self.samples[flat],
+                "trim": self.combined_trim[candidate, flat],
+            }
+        )
+        for step in range(self.stft.shape[1]):
+            table[f"stft_{step}"] = self.stft[candidate, step, flat]
+            table[f"ltft_{step}"] = self.ltft[candidate, step, flat]
+        return table
+
+
+def interpolate_fuel(tables: np.ndarray, corners: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """ECU-style bilinear `fuel_base` per row for `(k, rpm, load)` tables -> `(k, n)`."""
+    flat = tables.reshape(tables.shape[0], -1)
+    return (flat[:, corners] * weights).sum(axis=-1)
+
+
+def build_replay(logs: pd.DataFrame, tune: TuneFuelBase) -> ReplayData:
+    """Reduce prepared logs (see `fueling_analysis.prepare_logs`) for replay."""
+    open_rows, closed_rows = split_loop_rows(logs)
+    rows = pd.concat([closed_rows, open_rows], ignore_index=True)
+    closed = np.arange(len(rows)) < len(closed_rows)
+
+    rpm_idx, load_idx, weights = bilinear_cells(
+        rows["rpm"].to_numpy(dtype=float),
+        rows["load_g_rev"].to_numpy(dtype=float),
+        tune.rpm_axis,
+        tune.load_axis,
+    )
+    shape = tune.fuel_base.shape
+    corners = np.ravel_multi_index((np.maximum(rpm_idx, 0), np.maximum(load_idx, 0)), shape)
+    base_fuel = interpolate_fuel(tune.fuel_base[None], corners, weights)[0]
+
+    trim = rows["combined_trim"].to_numpy(dtype=float)
+    lambda_ratio = (
+        rows["lambda_ratio"].to_numpy(dtype=float)
+        if "lambda_ratio" in rows.columns
+        else np.full(len(rows), np.nan)
+    )
+    return ReplayData(
+        shape=shape,
+        corners=corners,
+        corner_weights=weights,
+        cell=np.ravel_multi_index(
+            (rows["rpm_idx"].to_numpy(dtype=np.int64), rows["load_idx"].to_numpy(dtype=np.int64)),
+            shape,
+        ),
+        closed=closed,
+        demand=base_fuel * (1.0 + trim / 100.0),
+        ltft=rows["ltft"].to_numpy(dtype=float),
+        lambda_ratio=lambda_ratio,
+        base_fuel=base_fuel,
+    )
+
+
+def _cell_means(values: np.ndarray, cell: np.ndarray, cells: int) -> tuple:
+    """Per-candidate, per-cell means of `(k, n)` values with one bincount."""
+    k = values.shape[0]
+    offsets = (np.arange(k)[:, None] * cells + cell[None, :]).ravel()
+    sums = np.bincount(offsets, weights=values.ravel(), minlength=k * cells).reshape(k, cells)
+    counts = np.bincount(cell, minlength=cells)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts, counts
+
+
+def simulate(
+    replay: ReplayData,
+    candidates: np.ndarray,
+    names: Optional[Sequence[str]] = None,
+    iterations: int = DEFAULT_ITERATIONS,
+    learn_rate: float = DEFAULT_LEARN_RATE,
+) -> SimulationResult:
+    """
+    Predict trims for `candidates` (`(rpm, load)` or `(k, rpm, load)` tables).
+
+    Step 0 of the STFT/LTFT trajectories is the state right after the change
+    (logged LTFT, STFT absorbing the rest); each further iteration moves the
+    per-cell LTFT by `learn_rate` of the mean STFT, within +/-LTFT_LIMIT_PCT.
+    """
+    candidates = np.asarray(candidates, dtype=float)
+    if candidates.ndim == 2:
+        candidates = candidates[None]
+    if candidates.shape[1:] != tuple(replay.shape):
+        raise ValueError(
+            f"Candidate table shape {candidates.shape[1:]} does not match fuel_base {replay.shape}."
+        )
+    names = list(names) if names is not None else [f"candidate_{i}" for i in range(len(candidates))]
+    cells = replay.cells
+
+    new_fuel = interpolate_fuel(candidates, replay.corners, replay.corner_weights)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        predicted_trim = (replay.demand / new_fuel - 1.0) * 100.0
+        predicted_ratio = replay.lambda_ratio * replay.base_fuel / new_fuel
+
+    closed = replay.closed
+    closed_cell = replay.cell[closed]
+    combined, samples = _cell_means(predicted_trim[:, closed], closed_cell, cells)
+    ltft, _ = _cell_means(replay.ltft[closed][None, :], closed_cell, cells)
+    ltft = np.broadcast_to(ltft, combined.shape).copy()
+
+    stft_steps = [combined - ltft]
+    ltft_steps = [ltft.copy()]
+    for _ in range(iterations):
+        ltft = np.clip(ltft + learn_rate * stft_steps[-1], -LTFT_LIMIT_PCT, LTFT_LIMIT_PCT)
+        stft_steps.append(combined - ltft)
+        ltft_steps.append(ltft.copy())
+
+    open_ratio, open_samples = _cell_means(predicted_ratio[:, ~closed], replay.cell[~closed], cells)
+    return SimulationResult(
+        names=names,
+        shape=tuple(replay.shape),
+        samples=samples,
+        combined_trim=combined,
+        stft=np.stack(stft_steps, axis=1),
+        ltft=np.stack(ltft_steps, axis=1),
+        open_samples=open_samples,
+        lambda_error_pct=(open_ratio - 1.0) * 100.0,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Predict closed-loop trims for candidate fuel_base tables by replaying "
+            "recorded datalogs."
+        )
+    )
+    parser.add_argument(
+        "--tune",
+        type=Path,
+        required=True,
+        help="Tune the datalogs were recorded with.",
+    )
+    parser.add_argument(
+        "--logs",
+        type=Path,
+        nargs="+",
+        required=True,
+        help="One or more CSV datalog files to replay.",
+    )
+    parser.add_argument(
+        "--candidates",
+        type=Path,
+        nargs="+",
+        required=True,
+        help="Tune files whose fuel_base tables are evaluated (e.g. --output-tune results).",
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=DEFAULT_ITERATIONS,
+        help=f"LTFT learning iterations to simulate (default: {DEFAULT_ITERATIONS}).",
+    )
+    parser.add_argument(
+        "--learn-rate",
+        type=float,
+        default=DEFAULT_LEARN_RATE,
+        help=f"Fraction of the mean STFT absorbed into LTFT per iteration (default: {DEFAULT_LEARN_RATE}).",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Optional path to save a Markdown report with per-cell trajectories.",
+    )
+    parser.add_argument(
+        "--log-cache",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory for the parsed-datalog cache (default: {DEFAULT_CACHE_DIR}).",
+    )
+    parser.add_argument(
+        "--no-log-cache",
+        action="store_true",
+        help="Always parse datalog CSVs instead of using the parsed-datalog cache.",
+    )
+
+    args = parser.parse_args()
+
+    tune = load_tune(args.tune)
+    cache = None if args.no_log_cache else LogCache(args.log_cache, RENAMED_COLUMNS)
+    replay = build_replay(prepare_logs(load_logs(args.logs, cache), tune, options=PrepareOptions()), tune)
+
+    names = ["(recorded)"] + [path.name for path in args.candidates]
+    tables = [tune.fuel_base] + [TuneFile.load(path).array("fuel_base") for path in args.candidates]
+    result = simulate(replay, np.stack(tables), names, args.iterations, args.learn_rate)
+
+    def _table(df: pd.DataFrame) -> str:
+        return df.to_string(index=False, float_format=lambda val: f"{val:.3f}")
+
+    sections = ["### Predicted Trims by Candidate\n" + _table(result.score_table()) + "\n"]
+    for position, name in enumerate(names[1:], start=1):
+        cells = result.cell_table(position)
+        cells.insert(2, "rpm_axis", tune.rpm_axis[cells["rpm_idx"]].astype(int))
+        cells.insert(3, "load_axis", np.round(tune.load_axis[cells["load_idx"]], 3))
+        sections.append(
+            f"### {name}: Per-Cell STFT/LTFT Trajectory\n"
+            + _table(cells.sort_values("samples", ascending=False))
+            + "\n"
+        )
+    report = "\n".join(sections)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(report, encoding="utf-8")
+    print(sections[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+"""
+Structural diff of tune files.
+
+Compares every map of two or more tunes (see `ECU_TUNE_FILE_MODEL.md`):
+top-level metadata, map presence, units, shapes, axis maps and data arrays.
+Maps whose raw `data` rows are identical are skipped without parsing; the rest
+are compared as whole arrays, producing per-cell deltas and percent changes.
+Intended to replace hand-written comparison documents such as
+`TUNE_COMPARISON_AF041_vs_v7.md`.
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tune_file import TuneFile, discover_tunes
+
+
+# Per-cell rows shown for each changed map in the Markdown report.
+DEFAULT_MAX_CELLS = 20
+
+
+@dataclass
+class MapDiff:
+    """Differences of one map between a base and an other tune."""
+
+    map_id: str
+    status: str  # "added", "removed", "reshaped", "changed", "axes" or "units"
+    units: Tuple[str, str]
+    shape: Tuple[Tuple[int, ...], Tuple[int, ...]]
+    axes_changed: List[str] = field(default_factory=list)
+    cells: pd.DataFrame = field(default_factory=pd.DataFrame)
+
+    @property
+    def changed_cells(self) -> int:
+        return len(self.cells)
+
+    @property
+    def max_abs_delta(self) -> float:
+        return float(self.cells["delta"].abs().max()) if not self.cells.empty else float("nan")
+
+    @property
+    def max_abs_pct(self) -> float:
+        if self.cells.empty:
+            return float("nan")
+        return float(self.cells["pct_change"].abs().max())
+
+
+@dataclass
+class TuneDiff:
+    """All differences between two tunes."""
+
+    base: TuneFile
+    other: TuneFile
+    metadata: List[Tuple[str, Any, Any]]
+    maps: List[MapDiff]
+
+    @property
+    def changed_map_ids(self) -> List[str]:
+        return [diff.map_id for diff in self.maps]
+
+
+def _flatten(payload: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    flat: Dict[str, Any] = {}
+    for key, value in payload.items():
+        if not prefix and key == "maps":
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def diff_metadata(base: TuneFile, other: TuneFile) -> List[Tuple[str, Any, Any]]:
+    """(key, base value, other value) for every differing top-level metadata field."""
+    base_meta, other_meta = _flatten(base.payload), _flatten(other.payload)
+    return [
+        (key, base_meta.get(key), other_meta.get(key))
+        for key in sorted(set(base_meta) | set(other_meta))
+        if base_meta.get(key) != other_meta.get(key)
+    ]
+
+
+def diff_arrays(base: np.ndarray, other: np.ndarray) -> pd.DataFrame:
+    """
+    Per-cell differences of two equally shaped arrays.
+
+    Returns `row`, `col`, `base`, `other`, `delta` and `pct_change` (relative
+    to the base value; NaN where the base is zero) for every differing cell.
+    """
+    base = np.atleast_2d(base)
+    other = np.atleast_2d(other)
+    differs = ~((base == other) | (np.isnan(base) & np.isnan(other)))
+    row, col = np.nonzero(differs)
+    before = base[row, col]
+    after = other[row, col]
+    delta = after - before
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct_change = np.where(before != 0, delta / np.abs(before) * 100.0, np.nan)
+    return pd.DataFrame(
+        {
+            "row": row,
+            "col": col,
+            "base": before,
+            "other": after,
+            "delta": delta,
+            "pct_change": pct_change,
+        }
+    )
+
+
+def diff_tunes(base: TuneFile, other: TuneFile) -> TuneDiff:
+    """Compare every map of `other` against `base`, in `base` map order."""
+    map_ids = base.map_ids + [map_id for map_id in other.map_ids if map_id not in base]
+    maps: List[MapDiff] = []
+    raw_equal: Dict[str, bool] = {}
+    for map_id in map_ids:
+        if map_id in base and map_id in other:
+            raw_equal[map_id] = base.raw(map_id) == other.raw(map_id)
+
+    for map_id in map_ids:
+        if map_id not in other:
+            maps.append(
+                MapDiff(map_id, "removed", (base.units(map_id), ""), (base.array(map_id).shape, ()))
+            )
+            continue
+        if map_id not in base:
+            maps.append(
+                MapDiff(map_id, "added", ("", other.units(map_id)), ((), other.array(map_id).shape))
+            )
+            continue
+
+        units = (base.units(map_id), other.units(map_id))
+        axes_changed = [
+            axis_id
+            for axis_id in base.axes(map_id)
+            if axis_id in base and axis_id in other and not raw_equal.get(axis_id, True)
+        ]
+        if raw_equal[map_id] and units[0] == units[1] and not axes_changed:
+            continue
+
+        before, after = base.array(map_id), other.array(map_id)
+        if before.shape != after.shape:
+            maps.append(
+                MapDiff(map_id, "reshaped", units, (before.shape, after.shape), axes_changed)
+            )
+            continue
+        cells = diff_arrays(before, after)
+        # Identical data under changed axis maps (or units) is not a table edit.
+        if not cells.empty:
+            status = "changed"
+        elif axes_changed:
+            status = "axes"
+        else:
+            status = "units"
+        maps.append(MapDiff(map_id, status, units, (before.shape, after.shape), axes_changed, cells))
+    return TuneDiff(base, other, diff_metadata(base, other), maps)
+
+
+def label_cells(diff: MapDiff, tune: TuneFile) -> pd.DataFrame:
+    """Per-cell deltas with axis breakpoint values (from `tune`) where known."""
+    cells = diff.cells.copy()
+    axes = tune.axes(diff.map_id)
+    shape = diff.shape[1]
+    if len(axes) == 2 and len(shape) == 2:
+        labels = [(axes[0], "row", shape[0]), (axes[1], "col", shape[1])]
+    elif len(axes) == 1 and len(shape) == 2 and shape[0] == 1:
+        labels = [(axes[0], "col", shape[1])]
+    else:
+        labels = []
+    for axis_id, position, length in labels:
+        if axis_id in tune and tune.vector(axis_id).size == length:
+            cells.insert(
+                cells.columns.get_loc(position) + 1,
+                axis_id,
+                tune.vector(axis_id)[cells[position].to_numpy()],
+            )
+    return cells
+
+
+def summary_table(diff: TuneDiff) -> pd.DataFrame:
+    return pd.DataFrame(
+        [
+            {
+                "map": map_diff.map_id,
+                "status": map_diff.status,
+                "units": map_diff.units[1] or map_diff.units[0],
+                "shape": "x".join(str(n) for n in (map_diff.shape[1] or map_diff.shape[0])),
+                "cells_changed": map_diff.changed_cells,
+                "max_abs_delta": map_diff.max_abs_delta,
+                "max_abs_pct": map_diff.max_abs_pct,
+                "axes_changed": ", ".join(map_diff.axes_changed),
+            }
+            for map_diff in diff.maps
+        ]
+    )
+
+
+def render_diff(diff: TuneDiff, max_cells: int = DEFAULT_MAX_CELLS) -> str:
+    def _table(df: pd.DataFrame) -> str:
+        return df.to_string(index=False, float_format=lambda val: f"{val:.3f}")
+
+    lines = [f"## {diff.base.name} -> {diff.other.name}", ""]
+    if diff.metadata:
+        lines.append("### Metadata")
+        for key, before, after in diff.metadata:
+            lines.append(f"- `{key}`: {before!r} -> {after!r}")
+        lines.append("")
+    if not diff.maps:
+        lines.append("_No map differences._")
+        return "\n".join(lines) + "\n"
+
+    lines.extend(["### Changed Maps", _table(summary_table(diff)), ""])
+    for map_diff in diff.maps:
+        if map_diff.cells.empty:
+            continue
+        cells = label_cells(map_diff, diff.other)
+        ordered = cells.reindex(cells["delta"].abs().sort_values(ascending=False).index)
+        shown = ordered.head(max_cells)
+        lines.append(f"#### {map_diff.map_id} ({map_diff.changed_cells} cells)")
+        lines.append(_table(shown))
+        if len(ordered) > len(shown):
+            lines.append(f"... {len(ordered) - len(shown)} more cells")
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def diff_series(tunes: List[TuneFile], against_first: bool = False) -> List[TuneDiff]:
+    """Diff consecutive revisions (or each revision against the first)."""
+    return [
+        diff_tunes(tunes[0] if against_first else tunes[position - 1], tunes[position])
+        for position in range(1, len(tunes))
+    ]
+
+
+def cell_frame(diffs: List[TuneDiff]) -> pd.DataFrame:
+    """Every per-cell delta of every diff in one long table, for CSV export."""
+    frames = []
+    for diff in diffs:
+        for map_diff in diff.maps:
+            if map_diff.cells.empty:
+                continue
+            frames.append(
+                map_diff.cells.assign(
+                    base_tune=diff.base.name, other_tune=diff.other.name, map=map_diff.map_id
+                )
+            )
+    if not frames:
+        return pd.DataFrame()
+    combined = pd.concat(frames, ignore_index=True)
+    leading = ["base_tune", "other_tune", "map"]
+    return combined[leading + [col for col in combined.columns if col not in leading]]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Compare tune files map by map (metadata, axes and data arrays). "
+            "See ECU_TUNE_FILE_MODEL.md for map structure details."
+        )
+    )
+    parser.add_argument(
+        "tunes",
+        type=Path,
+        nargs="+",
+        help="Two or more tune files and/or directories of .tune files, oldest first.",
+    )
+    parser.add_argument(
+        "--against-first",
+        action="store_true",
+        help="Diff every tune against the first one instead of against its predecessor.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Optional path to save the Markdown diff report.",
+    )
+    parser.add_argument(
+        "--cells-csv",
+        type=Path,
+        help="Optional path to save every per-cell delta as CSV.",
+    )
+    parser.add_argument(
+        "--max-cells",
+        type=int,
+        default=DEFAULT_MAX_CELLS,
+        help=f"Largest per-cell changes listed per map (default: {DEFAULT_MAX_CELLS}).",
+    )
+
+    args = parser.parse_args()
+
+    paths = discover_tunes(args.tunes)
+    if len(paths) < 2:
+        raise SystemExit("Need at least two tune files to compare.")
+    diffs = diff_series([TuneFile.load(path) for path in paths], args.against_first)
+
+    report = "# Tune Diff\n\n" + "\n".join(render_diff(diff, args.max_cells) for diff in diffs)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(report, encoding="utf-8")
+    if args.cells_csv:
+        args.cells_csv.parent.mkdir(parents=True, exist_ok=True)
+        cell_frame(diffs).to_csv(args.cells_csv, index=False)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
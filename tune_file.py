@@ -0,0 +1,168 @@
+"""
+Indexed tune file model shared by the analysis scripts.
+
+A tune file is a JSON document whose `maps` array holds every calibration
+table as a list of comma-separated `data` rows (see `ECU_TUNE_FILE_MODEL.md`).
+`TuneFile` indexes the maps by id once, parses a map's rows into a float array
+the first time it is requested and caches the result, and records which index
+maps form the axes of the shared 2D/1D tables.
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# Suffix of tune files, used when a directory of tunes is given.
+TUNE_SUFFIX = ".tune"
+
+# Axis maps for each table, in (row axis, column axis) order. Relationships
+# follow the "Table Index Relationships" section of ECU_TUNE_FILE_MODEL.md.
+MAP_AXES: Dict[str, Tuple[str, ...]] = {
+    "fuel_base": ("base_spark_rpm_index", "base_spark_map_index"),
+    "fuel_base_traction": ("base_spark_rpm_index", "base_spark_map_index"),
+    "base_spark_aet": ("base_spark_rpm_index", "base_spark_map_index"),
+    "base_spark_at": ("base_spark_rpm_index", "base_spark_map_index"),
+    "base_spark_mt": ("base_spark_rpm_index", "base_spark_map_index"),
+    "learned_spark_at": ("base_spark_rpm_index", "base_spark_map_index"),
+    "learned_spark_mt": ("base_spark_rpm_index", "base_spark_map_index"),
+    "pe_initial": ("pe_rpm_index", "pe_load_index"),
+    "pe_final": ("pe_rpm_index", "pe_load_index"),
+    "pe_safe": ("pe_rpm_index", "pe_load_index"),
+    "pe_enable_load": ("base_spark_rpm_index",),
+    "pe_enable_tps": ("base_spark_rpm_index",),
+    "pe_delay": ("pe_delay_index",),
+    "boost_target": ("boost_target_rpm_index", "boost_target_tps_index"),
+    "wg_base": ("wg_rpm_index", "wg_tps_index"),
+    "wg_max": ("wg_rpm_index", "wg_tps_index"),
+    "sd_blend_ratio": ("sd_blend_ratio_index",),
+    "iat_comp_ratio": ("iat_comp_ratio_index",),
+    "coil_dwell_rpm": ("coil_dwell_rpm_index",),
+    "coil_dwell_voltage": ("coil_dwell_voltage_index",),
+    "wideband_cal": ("wideband_cal_index",),
+}
+
+
+def parse_map_rows(rows: Sequence[str]) -> np.ndarray:
+    """Parse comma-separated `data` rows into a 2D float array."""
+    try:
+        return np.loadtxt(list(rows), delimiter=",", ndmin=2, dtype=float)
+    except ValueError:
+        # Ragged rows or trailing separators: fall back to per-item parsing.
+        parsed: List[List[float]] = []
+        for row in rows:
+            numbers = [float(item.strip()) for item in row.split(",") if item.strip()]
+            if numbers:
+                parsed.append(numbers)
+        return np.array(parsed, dtype=float)
+
+
+def format_map_rows(values: np.ndarray, fmt: str = "{:.1f}") -> List[str]:
+    """Format a 1D/2D array back into comma-separated `data` rows."""
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    return [", ".join(fmt.format(val) for val in row) for row in values]
+
+
+class TuneFile:
+    """JSON tune payload with maps indexed by id and lazily parsed arrays."""
+
+    def __init__(self, payload: Dict[str, Any], path: Optional[Path] = None) -> None:
+        self.payload = payload
+        self.path = path
+        self._entries: Dict[str, Dict[str, Any]] = {
+            entry["id"]: entry for entry in payload.get("maps", [])
+        }
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def load(cls, path: Path) -> "TuneFile":
+        with Path(path).open("r", encoding="utf-8") as handle:
+            return cls(json.load(handle), Path(path))
+
+    @property
+    def name(self) -> str:
+        return self.path.name if self.path is not None else "<memory>"
+
+    def __contains__(self, map_id: object) -> bool:
+        return map_id in self._entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def map_ids(self) -> List[str]:
+        return list(self._entries)
+
+    def entry(self, map_id: str) -> Dict[str, Any]:
+        try:
+            return self._entries[map_id]
+        except KeyError as exc:
+            raise KeyError(
+                f"Required map '{map_id}' not found in tune file '{self.name}'."
+            ) from exc
+
+    def raw(self, map_id: str) -> List[str]:
+        """Unparsed `data` rows of a map."""
+        return self.entry(map_id).get("data", [])
+
+    def units(self, map_id: str) -> str:
+        return self.entry(map_id).get("units", "")
+
+    def array(self, map_id: str) -> np.ndarray:
+        """Parsed 2D array of a map (cached, read-only)."""
+        if map_id not in self._arrays:
+            parsed = parse_map_rows(self.raw(map_id))
+            parsed.setflags(write=False)
+            self._arrays[map_id] = parsed
+        return self._arrays[map_id]
+
+    def vector(self, map_id: str) -> np.ndarray:
+        """First row of a map, for 1D tables and axis maps."""
+        return self.array(map_id)[0]
+
+    def scalar(self, map_id: str) -> float:
+        return float(self.array(map_id)[0, 0])
+
+    def axes(self, map_id: str) -> Tuple[str, ...]:
+        """Ids of the axis maps indexing `map_id` (empty when unknown)."""
+        return MAP_AXES.get(map_id, ())
+
+    def axis_arrays(self, map_id: str) -> Tuple[np.ndarray, ...]:
+        return tuple(self.vector(axis_id) for axis_id in self.axes(map_id))
+
+    def set_array(self, map_id: str, values: np.ndarray, fmt: str = "{:.1f}") -> None:
+        """Replace a map's `data` rows; other maps and metadata are untouched."""
+        entry = self.entry(map_id)
+        entry["data"] = format_map_rows(values, fmt)
+        self._arrays.pop(map_id, None)
+
+    def copy(self) -> "TuneFile":
+        return TuneFile(copy.deepcopy(self.payload), self.path)
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as handle:
+            json.dump(self.payload, handle, indent=1, ensure_ascii=False)
+
+
+def discover_tunes(paths: Iterable[Path]) -> List[Path]:
+    """Expand directories to their `.tune` files (sorted by name), dropping duplicates."""
+    found: List[Path] = []
+    seen = set()
+    for path in paths:
+        candidates = sorted(path.glob(f"*{TUNE_SUFFIX}")) if path.is_dir() else [path]
+        for candidate in candidates:
+            resolved = candidate.resolve()
+            if resolved not in seen:
+                seen.add(resolved)
+                found.append(candidate)
+    return found
@@ -0,0 +1,267 @@
+"""
+Write corrections for any number of tune maps in one pass.
+
+Each analyzer produces suggested values for some cells of a map (`fuel_base`,
+`maf_scale`, `wg_base`, the PE enable tables, ...). A `MapCorrection` holds
+them as arrays, and `write_tune` applies every correction at once:
+
+- Values always start from the *source* tune, so writing the same
+  corrections again gives the same file (idempotent), even when the output
+  or template tune was modified by an earlier run.
+- Change limits are applied as array operations, either as a percentage of
+  the source value (`PERCENT`; cells that are zero in the source are left
+  alone) or as an absolute step (`ABSOLUTE`).
+- When several corrections name the same cell, the last one wins. The cell
+  keeps the position of its first appearance, so `[closed, open]` gives
+  open-loop suggestions precedence.
+- Only the corrected maps are rewritten. Every other map comes from the
+  existing output tune, the `modify_tune_path` template or the source tune,
+  in that order, and is shared with the source rather than deep-copied.
+
+The returned `MapUpdate`s carry what was written and which cells were
+clamped, so callers can report in their own format.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tune_file import TuneFile
+
+
+PERCENT = "percent"
+ABSOLUTE = "absolute"
+
+# `data` formatting per map, matching how the tuning software writes them.
+MAP_FORMATS = {
+    "fuel_base": "{:.1f}",
+    "maf_scale": "{:.2f}",
+    "wg_base": "{:.1f}",
+    "pe_enable_load": "{:.2f}",
+    "pe_enable_tps": "{:.2f}",
+}
+
+DEFAULT_FORMAT = "{:.1f}"
+
+
+@dataclass
+class MapCorrection:
+    """
+    Suggested values for cells of one map.
+
+    `rows`/`cols` index the map's 2D array; 1D maps (a single data row) use
+    row 0. `labels` are optional per-cell values (e.g. axis breakpoints) that
+    are passed through to the `MapUpdate` for reporting.
+    """
+
+    map_id: str
+    rows: np.ndarray
+    cols: np.ndarray
+    suggested: np.ndarray
+    limit: float
+    limit_kind: str = PERCENT
+    source: str = ""
+    labels: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    @classmethod
+    def from_summary(
+        cls,
+        map_id: str,
+        summary: pd.DataFrame,
+        value_column: str,
+        index_columns: Sequence[str],
+        limit: float,
+        limit_kind: str = PERCENT,
+        source: str = "",
+        label_columns: Sequence[str] = (),
+    ) -> "MapCorrection":
+        """
+        Correction from an analyzer summary with one row per cell.
+
+        `index_columns` names the row and column index columns, or a single
+        column for 1D maps. An empty summary gives an empty correction.
+        """
+        if summary.empty:
+            empty_index = np.zeros(0, dtype=int)
+            return cls(
+                map_id,
+                empty_index,
+                empty_index,
+                np.zeros(0),
+                limit,
+                limit_kind,
+                source,
+                {column: np.zeros(0) for column in label_columns},
+            )
+        indexes = [summary[column].to_numpy(dtype=int) for column in index_columns]
+        if len(indexes) == 1:
+            indexes.insert(0, np.zeros(len(summary), dtype=int))
+        return cls(
+            map_id,
+            indexes[0],
+            indexes[1],
+            summary[value_column].to_numpy(dtype=float),
+            limit,
+            limit_kind,
+            source,
+            {column: summary[column].to_numpy() for column in label_columns},
+        )
+
+
+@dataclass
+class MapUpdate:
+    """
+    Result of writing one map.
+
+    Per-cell arrays follow the order in which cells first appeared in the
+    corrections. Cells outside the map are dropped, and `requested` counts
+    every distinct cell that was suggested.
+    """
+
+    map_id: str
+    values: np.ndarray  # full written array
+    requested: int
+    rows: np.ndarray
+    cols: np.ndarray
+    original: np.ndarray
+    suggested: np.ndarray
+    written: np.ndarray
+    change: np.ndarray  # percent or absolute change suggested, per the limit kind
+    clamped: np.ndarray  # bool
+    sources: np.ndarray
+    labels: Dict[str, np.ndarray]
+
+
+def limit_changes(
+    original: np.ndarray, suggested: np.ndarray, limit: float, limit_kind: str = PERCENT
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Limit `suggested` to within `limit` of `original`.
+
+    Returns the limited values, the suggested change (percent of the
+    original, or absolute) and a mask of the cells that were clamped.
+    """
+    if limit_kind == PERCENT:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = (suggested - original) / original * 100.0
+        clamped = np.abs(change) > limit
+        limited = np.where(clamped, original * (1.0 + np.sign(change) * limit / 100.0), suggested)
+        # A percentage of zero is meaningless; such cells keep their value.
+        frozen = original == 0
+        limited = np.where(frozen, original, limited)
+        return limited, np.where(frozen, 0.0, change), clamped & ~frozen
+    if limit_kind == ABSOLUTE:
+        limited = np.clip(suggested, original - limit, original + limit)
+        return limited, suggested - original, limited != suggested
+    raise ValueError(f"Unknown change limit kind '{limit_kind}'.")
+
+
+def _merge_cells(corrections: Sequence[MapCorrection]) -> Tuple[np.ndarray, int]:
+    """
+    Positions (into the concatenated corrections) of the last suggestion for
+    each distinct cell, in first-appearance order, and the number of cells.
+    """
+    cells = np.stack(
+        [
+            np.concatenate([correction.rows for correction in corrections]).astype(int),
+            np.concatenate([correction.cols for correction in corrections]).astype(int),
+        ],
+        axis=1,
+    )
+    unique, first = np.unique(cells, axis=0, return_index=True)
+    _, last_reversed = np.unique(cells[::-1], axis=0, return_index=True)
+    last = len(cells) - 1 - last_reversed
+    order = np.argsort(first, kind="stable")
+    return last[order], len(unique)
+
+
+def _apply(source: np.ndarray, corrections: Sequence[MapCorrection]) -> MapUpdate:
+    map_id = corrections[0].map_id
+    values = np.array(source, dtype=float)
+    take, requested = _merge_cells(corrections)
+
+    def _gather(attribute: str) -> np.ndarray:
+        return np.concatenate([np.asarray(getattr(correction, attribute)) for correction in corrections])[take]
+
+    rows, cols, suggested = _gather("rows").astype(int), _gather("cols").astype(int), _gather("suggested")
+    limits = np.concatenate([np.full(len(c.suggested), c.limit, dtype=float) for c in corrections])[take]
+    kinds = np.concatenate([np.full(len(c.suggested), c.limit_kind, dtype=object) for c in corrections])[take]
+    sources = np.concatenate([np.full(len(c.suggested), c.source, dtype=object) for c in corrections])[take]
+    label_names = [name for name in corrections[0].labels if all(name in c.labels for c in corrections)]
+    labels = {
+        name: np.concatenate([np.asarray(c.labels[name]) for c in corrections])[take] for name in label_names
+    }
+
+    inside = (rows >= 0) & (rows < values.shape[0]) & (cols >= 0) & (cols < values.shape[1])
+    rows, cols, suggested, limits, kinds, sources = (
+        array[inside] for array in (rows, cols, suggested, limits, kinds, sources)
+    )
+    labels = {name: array[inside] for name, array in labels.items()}
+
+    original = values[rows, cols]
+    written = np.empty(len(rows))
+    change = np.empty(len(rows))
+    clamped = np.zeros(len(rows), dtype=bool)
+    # Corrections of one map normally share a limit; group in case they do not.
+    for limit, kind in {(limit, kind) for limit, kind in zip(limits, kinds)}:
+        group = (limits == limit) & (kinds == kind)
+        written[group], change[group], clamped[group] = limit_changes(
+            original[group], suggested[group], limit, kind
+        )
+    values[rows, cols] = written
+    return MapUpdate(
+        map_id, values, requested, rows, cols, original, suggested, written, change, clamped, sources, labels
+    )
+
+
+def _detached(tune: TuneFile, map_ids: Sequence[str]) -> TuneFile:
+    """Copy of `tune` whose `map_ids` entries can be rewritten; other entries are shared."""
+    payload = dict(tune.payload)
+    payload["maps"] = [
+        dict(entry) if entry.get("id") in map_ids else entry for entry in tune.payload.get("maps", [])
+    ]
+    return TuneFile(payload, tune.path)
+
+
+def write_tune(
+    source_tune: TuneFile,
+    corrections: Sequence[MapCorrection],
+    output_tune_path: Path,
+    modify_tune_path: Optional[Path] = None,
+    formats: Optional[Mapping[str, str]] = None,
+) -> Dict[str, MapUpdate]:
+    """
+    Apply `corrections` to the source tune's maps and write the output tune.
+
+    Every map named by a correction is rewritten from the source tune's
+    values, even if its corrections are empty. Returns one `MapUpdate` per
+    map, in the order the maps first appear in `corrections`.
+    """
+    by_map: Dict[str, List[MapCorrection]] = {}
+    for correction in corrections:
+        by_map.setdefault(correction.map_id, []).append(correction)
+    for map_id in by_map:
+        if map_id not in source_tune:
+            raise ValueError(f"{map_id} map not found in source tune file '{source_tune.name}'")
+
+    updates = {map_id: _apply(source_tune.array(map_id), items) for map_id, items in by_map.items()}
+
+    if output_tune_path.exists():
+        output_tune = TuneFile.load(output_tune_path)
+    elif modify_tune_path is not None:
+        output_tune = TuneFile.load(modify_tune_path)
+    else:
+        output_tune = _detached(source_tune, list(by_map))
+
+    formats = {**MAP_FORMATS, **(formats or {})}
+    for map_id, update in updates.items():
+        if map_id not in output_tune:
+            raise ValueError(f"{map_id} map not found in output tune file '{output_tune.name}'")
+        output_tune.set_array(map_id, update.values, formats.get(map_id, DEFAULT_FORMAT))
+    output_tune.save(output_tune_path)
+    return updates